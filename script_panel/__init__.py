@@ -23,6 +23,20 @@ def reload_modules():
     from script_panel.ui import hotkey_editor
     from script_panel.ui import config_editor
     from script_panel.ui import snippet_popup
+    from script_panel.ui import run_stats
+    from script_panel.ui import live_mode
+    from script_panel.ui import layout_autosave
+    from script_panel.ui import script_scan
+    from script_panel import script_panel_analysis
+    from script_panel import script_panel_batch
+    from script_panel import script_panel_config
+    from script_panel import script_panel_extensions
+    from script_panel import script_panel_layout_journal
+    from script_panel import script_panel_mirror
+    from script_panel import script_panel_path_checks
+    from script_panel import script_panel_profiling
+    from script_panel import script_panel_roots
+    from script_panel import script_panel_store
     from script_panel import script_panel_settings
     from script_panel import script_panel_utils
     from script_panel import script_panel_ui
@@ -37,9 +51,23 @@ def reload_modules():
     reload(command_palette)
     reload(hotkey_editor)
     reload(config_editor)
+    reload(run_stats)
+    reload(live_mode)
+    reload(layout_autosave)
+    reload(script_scan)
+    reload(script_panel_analysis)
+    reload(script_panel_batch)
+    reload(script_panel_config)
+    reload(script_panel_extensions)
+    reload(script_panel_layout_journal)
+    reload(script_panel_mirror)
+    reload(script_panel_path_checks)
+    reload(script_panel_profiling)
+    reload(script_panel_roots)
     reload(script_panel_dcc_base)
     reload(script_panel_dcc.dcc_module)
     reload(script_panel_dcc)
+    reload(script_panel_store)
     reload(script_panel_settings)
     reload(script_panel_utils)
     reload(script_panel_ui)
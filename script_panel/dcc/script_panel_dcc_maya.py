@@ -5,6 +5,9 @@ from maya import cmds
 from maya import mel
 
 from . import script_panel_dcc_base
+from . import script_panel_mel_cache
+
+mel_script_cache = script_panel_mel_cache.MelScriptCache(eval_func=mel.eval)
 
 
 class MayaInterface(script_panel_dcc_base.BaseInterface):
@@ -106,9 +109,10 @@ def hookup_tab_signals(cmd_exec):
 
 
 def run_mel_script(script_path):
-    with open(script_path, "r") as fp:
-        mel_script = fp.read()
-    return mel.eval(mel_script)
+    """
+    Scripts are sourced once per session, later triggers only run the top level code until the file changes
+    """
+    return mel_script_cache.run(script_path)
 
 
 def setup_maya_hotkey(shortcut_name, shortcut, command_str, category="Custom"):
@@ -1,9 +1,20 @@
+import atexit
 import os
 import subprocess
 
 from . import script_panel_dcc_base
 
 
+class LocalConstants:
+    # number of isolated worker processes to run python scripts in, 0 runs scripts inside the panel
+    worker_count_env_key = "SCRIPT_PANEL_WORKER_COUNT"
+
+
+lk = LocalConstants
+
+_worker_pool = None
+
+
 class StandaloneInterface(script_panel_dcc_base.BaseInterface):
     name = "Standalone"
 
@@ -11,6 +22,15 @@ class StandaloneInterface(script_panel_dcc_base.BaseInterface):
     def open_script(script_path):
         return open_script(script_path)
 
+    @staticmethod
+    def get_dcc_extension_map():
+        extension_map = dict()
+        if get_worker_pool_size():
+            # start the workers as soon as the backend is registered, so they're warm by the first click
+            get_worker_pool()
+            extension_map[".py"] = run_script_in_worker_pool
+        return extension_map
+
 
 def open_script(script_path):
     notepad_plus_path = r"C:\Program Files\Notepad++\notepad++.exe"
@@ -19,3 +39,26 @@ def open_script(script_path):
     else:
         editor_path = r"C:\Windows\System32\notepad.exe"
     subprocess.Popen([editor_path, script_path])
+
+
+def get_worker_pool_size():
+    try:
+        return int(os.environ.get(lk.worker_count_env_key, 0))
+    except ValueError:
+        return 0
+
+
+def get_worker_pool():
+    global _worker_pool
+    if _worker_pool is None:
+        from . import script_panel_worker_pool
+        _worker_pool = script_panel_worker_pool.WorkerPool(size=get_worker_pool_size())
+        atexit.register(_worker_pool.shutdown)
+    return _worker_pool
+
+
+def run_script_in_worker_pool(script_path):
+    """
+    Run the script in an isolated worker process, output and exit status are streamed back to the panel
+    """
+    return get_worker_pool().submit(script_path)
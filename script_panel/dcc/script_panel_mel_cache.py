@@ -0,0 +1,167 @@
+"""
+Source-once execution of .mel scripts.
+
+The first trigger evaluates the whole file, which defines its procs. Until the file changes on disk,
+later triggers only evaluate the top level code of the file (usually a call to its entry proc),
+so the global procs aren't re-parsed and redefined on every click.
+
+Kept free of maya imports so it can be used with a stand-in for maya.mel.eval
+"""
+import os
+import re
+
+
+class LocalConstants:
+    proc_regex = re.compile(r"\b(global\s+)?proc\s+(?:[\w\[\]]+\s+)?(\w+)\s*\(")
+    single_call_regex = re.compile(r"^(\w+)\s*(\([^;]*\))?\s*;?$")
+
+
+lk = LocalConstants
+
+
+def strip_mel_comments(mel_script):
+    """
+    Remove // and /* */ comments, while leaving string contents alone
+    """
+    output = []
+    i = 0
+    script_length = len(mel_script)
+    while i < script_length:
+        char = mel_script[i]
+        next_two = mel_script[i:i + 2]
+
+        if char == '"':
+            end = i + 1
+            while end < script_length and mel_script[end] != '"':
+                end += 2 if mel_script[end] == "\\" else 1
+            output.append(mel_script[i:end + 1])
+            i = end + 1
+        elif next_two == "//":
+            end = mel_script.find("\n", i)
+            i = script_length if end == -1 else end
+        elif next_two == "/*":
+            end = mel_script.find("*/", i + 2)
+            i = script_length if end == -1 else end + 2
+        else:
+            output.append(char)
+            i += 1
+
+    return "".join(output)
+
+
+def find_block_end(mel_script, open_brace_index):
+    depth = 0
+    i = open_brace_index
+    script_length = len(mel_script)
+    while i < script_length:
+        char = mel_script[i]
+        if char == '"':
+            i += 1
+            while i < script_length and mel_script[i] != '"':
+                i += 2 if mel_script[i] == "\\" else 1
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return -1
+
+
+def split_procs_from_top_level(mel_script):
+    """
+    :return: list of (proc_name, is_global) and the top level code with all proc definitions removed.
+             Returns None for the top level code if the script could not be split
+    """
+    mel_script = strip_mel_comments(mel_script)
+
+    procs = []
+    top_level_parts = []
+    position = 0
+    while True:
+        proc_match = lk.proc_regex.search(mel_script, position)
+        if not proc_match:
+            break
+
+        open_brace_index = mel_script.find("{", proc_match.end())
+        block_end = find_block_end(mel_script, open_brace_index) if open_brace_index != -1 else -1
+        if block_end == -1:
+            return procs, None
+
+        procs.append((proc_match.group(2), bool(proc_match.group(1))))
+        top_level_parts.append(mel_script[position:proc_match.start()])
+        position = block_end + 1
+
+    top_level_parts.append(mel_script[position:])
+    return procs, "".join(top_level_parts).strip()
+
+
+def get_rerun_command(mel_script):
+    """
+    Get the MEL that needs to be evaluated when the already sourced script is triggered again.
+    Returns an empty string if there's nothing to run, and None if the whole file needs to be evaluated again.
+    """
+    procs, top_level_code = split_procs_from_top_level(mel_script)
+    if top_level_code is None:
+        return None
+
+    if not top_level_code:
+        return ""
+
+    # local procs are only visible to code in the same file, so the top level code can't be evaluated on its own
+    if all(is_global for __, is_global in procs):
+        return top_level_code
+
+    # unless all it does is call a global entry proc
+    call_match = lk.single_call_regex.match(top_level_code)
+    global_proc_names = [name for name, is_global in procs if is_global]
+    if call_match and call_match.group(1) in global_proc_names:
+        return top_level_code
+
+    return None
+
+
+class MelCacheEntry(object):
+    def __init__(self, mtime, contents):
+        self.mtime = mtime
+        self.contents = contents
+        self.rerun_command = get_rerun_command(contents)
+
+
+class MelScriptCache(object):
+    def __init__(self, eval_func):
+        """
+        :param eval_func: function that evaluates a MEL string, ex: maya.mel.eval
+        """
+        self.eval_func = eval_func
+        self._entries = {}
+
+    def clear(self):
+        self._entries.clear()
+
+    def is_sourced(self, script_path):
+        entry = self._entries.get(script_path)
+        return bool(entry) and entry.mtime == os.path.getmtime(script_path)
+
+    def run(self, script_path):
+        script_mtime = os.path.getmtime(script_path)
+
+        entry = self._entries.get(script_path)  # type: MelCacheEntry
+        if entry and entry.mtime == script_mtime:
+            if entry.rerun_command is None:
+                return self.eval_func(entry.contents)
+            if entry.rerun_command:
+                return self.eval_func(entry.rerun_command)
+            return None
+
+        with open(script_path, "r") as fp:
+            contents = fp.read()
+
+        entry = MelCacheEntry(script_mtime, contents)
+        self._entries.pop(script_path, None)
+        result = self.eval_func(contents)
+
+        # only remember the script once it has been sourced successfully
+        self._entries[script_path] = entry
+        return result
@@ -1,6 +1,60 @@
+import atexit
+
 import skyhook.client
 
+from . import skyhook_client_pool
+from ..ui.ui_utils import QtCore, QtWidgets
+
+_client_pool = None
+_callback_relay = None
+
+
+class RequestCallbackRelay(QtCore.QObject):
+    """
+    Requests are answered on the pool's dispatch threads, this hands their callbacks over to the UI thread
+    """
+    request_finished = QtCore.Signal(object, object)  # callback, request
+
+    def __init__(self, parent=None):
+        super(RequestCallbackRelay, self).__init__(parent)
+        self.request_finished.connect(self._call_callback)
+
+        app = QtWidgets.QApplication.instance()
+        if app:
+            self.moveToThread(app.thread())
+
+    def wrap(self, callback):
+        if not callback:
+            return callback
+
+        def emit_finished(request):
+            self.request_finished.emit(callback, request)
+
+        return emit_finished
+
+    @staticmethod
+    def _call_callback(callback, request):
+        callback(request)
+
+
+def get_callback_relay():
+    global _callback_relay
+    if _callback_relay is None:
+        _callback_relay = RequestCallbackRelay()
+    return _callback_relay
+
+
+def get_client_pool():
+    global _client_pool
+    if _client_pool is None:
+        _client_pool = skyhook_client_pool.SkyhookClientPool(client_factory=skyhook.client.BlenderClient)
+        atexit.register(_client_pool.shutdown)
+    return _client_pool
+
 
-def run_script_in_blender(script_path):
-    client = skyhook.client.BlenderClient()
-    client.execute("run_script", parameters={"script_path": script_path})
+def run_script_in_blender(script_path, callback=skyhook_client_pool.print_request_result):
+    """
+    Queue the script to run in blender, returns straight away with a request that can be waited on.
+    The callback is called on the UI thread once blender has answered.
+    """
+    return get_client_pool().submit(script_path, callback=get_callback_relay().wrap(callback))
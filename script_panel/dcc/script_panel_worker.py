@@ -0,0 +1,105 @@
+"""
+Worker process used by script_panel_worker_pool
+
+Started with the preload module names as arguments, reads one json request per line from stdin
+and streams json messages about the run back on stdout.
+
+This file is executed directly by the interpreter, so it must only depend on the standard library.
+"""
+import json
+import os
+import runpy
+import sys
+import traceback
+
+# keep private handles to the protocol pipes, so scripts that write to or read from
+# the raw file descriptors can't corrupt the communication with the panel
+_protocol_in = os.fdopen(os.dup(0), "r")
+_protocol_out = os.fdopen(os.dup(1), "w")
+os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+os.dup2(2, 1)
+sys.stdin = open(os.devnull, "r")
+
+
+def send_message(message):
+    _protocol_out.write(json.dumps(message) + "\n")
+    _protocol_out.flush()
+
+
+class StreamForwarder(object):
+    """
+    Stand-in for sys.stdout / sys.stderr that forwards everything written to the panel
+    """
+
+    def __init__(self, run_id, stream_name):
+        self.run_id = run_id
+        self.stream_name = stream_name
+
+    def write(self, text):
+        if text:
+            send_message({"id": self.run_id, "stream": self.stream_name, "text": text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def preload_modules(module_names):
+    for module_name in module_names:
+        try:
+            __import__(module_name)
+        except Exception as e:
+            sys.stderr.write("script_panel worker failed to preload {}: {}\n".format(module_name, e))
+
+
+def run_request(request):
+    run_id = request.get("id")
+    script_path = request.get("script_path")
+
+    exit_code = 0
+    error = None
+
+    sys.stdout = StreamForwarder(run_id, "stdout")
+    sys.stderr = StreamForwarder(run_id, "stderr")
+    sys.argv = [script_path]
+    try:
+        runpy.run_path(script_path, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            sys.stderr.write("{}\n".format(e.code))
+            exit_code = 1
+    except BaseException:
+        exit_code = 1
+        error = traceback.format_exc()
+    finally:
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+
+    send_message({"id": run_id, "exit": exit_code, "error": error})
+
+
+def main():
+    preload_modules(sys.argv[1:])
+    send_message({"ready": True, "pid": os.getpid()})
+
+    for line in iter(_protocol_in.readline, ""):
+        line = line.strip()
+        if not line:
+            continue
+
+        request = json.loads(line)
+        if request.get("shutdown"):
+            break
+
+        run_request(request)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Pool of pre-started python processes for running scripts outside of the panel process.
+
+Each worker boots once, preloads a set of common modules and then waits for scripts to run,
+so a crashing or leaking script can't take the panel down with it and a click doesn't pay for interpreter startup.
+"""
+import itertools
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+if sys.version_info.major < 3:
+    import Queue as queue
+else:
+    import queue
+
+
+class LocalConstants:
+    worker_script_path = os.path.join(os.path.dirname(__file__), "script_panel_worker.py")
+    default_preload_modules = ["collections", "json", "os", "re", "shutil", "subprocess"]
+    max_pool_size = 4
+
+    # workers are recycled after this many runs to keep leaks from piling up
+    max_runs_per_worker = 20
+
+    # seconds to wait for a worker to finish its run and exit before it's killed
+    shutdown_timeout = 5.0
+    poll_interval = 0.05
+
+
+lk = LocalConstants
+
+
+def get_default_pool_size():
+    try:
+        cpu_count = multiprocessing.cpu_count()
+    except NotImplementedError:
+        cpu_count = 1
+    return max(1, min(lk.max_pool_size, cpu_count - 1))
+
+
+def wait_for_process(process, timeout):
+    """
+    Popen.wait() only takes a timeout on python 3
+
+    :return: exit code, None if the process is still running after the timeout
+    """
+    end_time = time.time() + timeout
+    while process.poll() is None:
+        if time.time() >= end_time:
+            return None
+        time.sleep(lk.poll_interval)
+    return process.returncode
+
+
+def print_script_output(script_run, stream_name, text):
+    stream = sys.stderr if stream_name == "stderr" else sys.stdout
+    stream.write(text)
+
+
+def print_script_result(script_run):
+    if script_run.error:
+        sys.stderr.write(script_run.error)
+
+    if script_run.exit_code:
+        sys.stderr.write("Script exited with status {}: {}\n".format(script_run.exit_code, script_run.script_path))
+
+
+class ScriptRun(object):
+    """
+    Handle for a script that has been submitted to the pool
+    """
+
+    def __init__(self, run_id, script_path, on_output=None, on_finished=None):
+        self.run_id = run_id
+        self.script_path = script_path
+        self.on_output = on_output
+        self.on_finished = on_finished
+
+        self.exit_code = None
+        self.error = None
+        self._done_event = threading.Event()
+        self._done_callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def is_done(self):
+        return self._done_event.is_set()
+
+    def wait(self, timeout=None):
+        self._done_event.wait(timeout)
+        return self.exit_code
+
+    def output_received(self, stream_name, text):
+        if self.on_output:
+            self._call_safely(self.on_output, self, stream_name, text)
+
+    def add_done_callback(self, callback):
+        """
+        callback(script_run) once the run has finished, straight away if it already has.
+        Called from the pool thread
+        """
+        with self._callbacks_lock:
+            if not self.is_done():
+                self._done_callbacks.append(callback)
+                return
+        self._call_safely(callback, self)
+
+    def finish(self, exit_code, error=None):
+        self.exit_code = exit_code
+        self.error = error
+        with self._callbacks_lock:
+            self._done_event.set()
+            done_callbacks, self._done_callbacks = self._done_callbacks, []
+
+        if self.on_finished:
+            self._call_safely(self.on_finished, self)
+        for callback in done_callbacks:
+            self._call_safely(callback, self)
+
+    @staticmethod
+    def _call_safely(callback, *args):
+        # a broken callback must not take down the pool thread running the script
+        try:
+            callback(*args)
+        except Exception:
+            traceback.print_exc()
+
+
+class WorkerProcess(object):
+    def __init__(self, preload_modules=None):
+        self.run_count = 0
+        self.process = subprocess.Popen(
+            [sys.executable, "-u", lk.worker_script_path] + list(preload_modules or []),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            bufsize=1,
+        )
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def wait_until_ready(self):
+        message = self._read_message()
+        return bool(message and message.get("ready"))
+
+    def execute(self, script_run):
+        """
+        Run the script in this worker and stream the messages back to the script_run.
+        Returns False if the worker process died during the run
+        """
+        self.run_count += 1
+        try:
+            self._send_message({"id": script_run.run_id, "script_path": script_run.script_path})
+        except (IOError, OSError):
+            script_run.finish(self.process.wait(), "Worker process is no longer running\n")
+            return False
+
+        while True:
+            try:
+                message = self._read_message()
+            except ValueError as e:
+                # something other than the worker wrote to the protocol pipe, the rest of the stream can't be trusted
+                self.kill()
+                script_run.finish(1, "Unreadable message from worker process: {}\n".format(e))
+                return False
+
+            if message is None:
+                exit_code = self.process.wait()
+                script_run.finish(exit_code, "Worker process exited unexpectedly with status {}\n".format(exit_code))
+                return False
+
+            if "stream" in message:
+                script_run.output_received(message.get("stream"), message.get("text", ""))
+            elif "exit" in message:
+                script_run.finish(message.get("exit"), message.get("error"))
+                return True
+
+    def shutdown(self, timeout=lk.shutdown_timeout):
+        if not self.is_alive():
+            return
+        try:
+            self._send_message({"shutdown": True})
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+        if wait_for_process(self.process, timeout) is None:
+            self.kill()
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait()
+        except OSError:
+            pass  # already gone
+
+    def _send_message(self, message):
+        self.process.stdin.write(json.dumps(message) + "\n")
+        self.process.stdin.flush()
+
+    def _read_message(self):
+        """
+        :return: None once the worker has exited, raises ValueError for lines that aren't protocol messages
+        """
+        line = self.process.stdout.readline()
+        if not line:
+            return None
+        message = json.loads(line)
+        if not isinstance(message, dict):
+            raise ValueError("Not a message: {!r}".format(line))
+        return message
+
+
+class WorkerPool(object):
+    def __init__(self, size=None, preload_modules=None, max_runs_per_worker=lk.max_runs_per_worker,
+                 shutdown_timeout=lk.shutdown_timeout):
+        self.size = size or get_default_pool_size()
+        self.preload_modules = lk.default_preload_modules if preload_modules is None else preload_modules
+        self.max_runs_per_worker = max_runs_per_worker
+        self.shutdown_timeout = shutdown_timeout
+
+        self._run_ids = itertools.count()
+        self._queue = queue.Queue()
+        self._workers = {}  # {pool thread index: current worker process}
+        self._threads = []
+        for i in range(self.size):
+            thread = threading.Thread(target=self._worker_loop, args=(i,), name="script_panel_worker_{}".format(i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, script_path, on_output=print_script_output, on_finished=print_script_result):
+        script_run = ScriptRun(
+            run_id=next(self._run_ids),
+            script_path=script_path,
+            on_output=on_output,
+            on_finished=on_finished,
+        )
+        self._queue.put(script_run)
+        return script_run
+
+    def shutdown(self):
+        """
+        Runs that haven't started are cancelled, runs still going after the shutdown timeout are killed
+        """
+        while True:
+            try:
+                script_run = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if script_run is not None:
+                script_run.finish(1, "Worker pool was shut down before the script ran\n")
+
+        for __ in self._threads:
+            self._queue.put(None)
+
+        end_time = time.time() + self.shutdown_timeout
+        for thread in self._threads:
+            thread.join(max(0.0, end_time - time.time()))
+
+        # a hung script, its run finishes with an error once the process is gone
+        for worker in list(self._workers.values()):
+            if worker and worker.is_alive():
+                worker.kill()
+        self._threads = []
+
+    def _spawn_worker(self):
+        """
+        :return: a ready worker, None if it couldn't be started
+        """
+        try:
+            worker = WorkerProcess(self.preload_modules)
+            if not worker.wait_until_ready():
+                worker.kill()
+                return None
+        except (OSError, ValueError):
+            traceback.print_exc()
+            return None
+        return worker
+
+    def _worker_loop(self, worker_index):
+        worker = self._spawn_worker()
+        self._workers[worker_index] = worker
+        while True:
+            script_run = self._queue.get()
+            if script_run is None:
+                if worker:
+                    worker.shutdown(self.shutdown_timeout)
+                return
+
+            if worker is None or not worker.is_alive():
+                worker = self._spawn_worker()
+                self._workers[worker_index] = worker
+            if worker is None:
+                script_run.finish(1, "Worker process could not be started\n")
+                continue
+
+            try:
+                worker_survived = worker.execute(script_run)
+            except Exception:
+                worker.kill()
+                worker_survived = False
+                if not script_run.is_done():
+                    script_run.finish(1, traceback.format_exc())
+
+            # replace the worker straight away, so the next script gets a warm process
+            if not worker_survived or worker.run_count >= self.max_runs_per_worker:
+                worker.shutdown(self.shutdown_timeout)
+                worker = self._spawn_worker()
+                self._workers[worker_index] = worker
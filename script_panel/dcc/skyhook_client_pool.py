@@ -0,0 +1,183 @@
+"""
+Long-lived skyhook clients with a non-blocking dispatch queue.
+
+Scripts are queued from the panel and sent from background threads. Each thread keeps one client alive
+for the whole session. Clients that support it get several queued scripts in a single round trip.
+
+Doesn't import skyhook itself, the client class is passed in, so it can be used with skyhook_standin offline.
+"""
+import itertools
+import sys
+import threading
+import traceback
+
+if sys.version_info.major < 3:
+    import Queue as queue
+else:
+    import queue
+
+
+class LocalConstants:
+    run_script_command = "run_script"
+
+    # only sent to clients with a truthy 'supports_batching' attribute
+    run_scripts_command = "run_scripts"
+    max_batch_size = 16
+
+
+lk = LocalConstants
+
+
+def print_request_result(request):
+    if request.error:
+        sys.stderr.write("Skyhook failed to run {}:\n{}\n".format(request.script_path, request.error))
+
+
+class SkyhookRequest(object):
+    def __init__(self, request_id, script_path, callback=None):
+        self.request_id = request_id
+        self.script_path = script_path
+        self.callback = callback
+
+        self.result = None
+        self.error = None
+        self._done_event = threading.Event()
+        self._done_callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def is_done(self):
+        return self._done_event.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Block until the request has been answered, returns a non-zero status if it failed
+        """
+        self._done_event.wait(timeout)
+        return 1 if self.error else 0
+
+    def add_done_callback(self, callback):
+        """
+        callback(request) once the request has been answered, straight away if it already has
+        """
+        with self._callbacks_lock:
+            if not self.is_done():
+                self._done_callbacks.append(callback)
+                return
+        callback(self)
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        with self._callbacks_lock:
+            self._done_event.set()
+            done_callbacks, self._done_callbacks = self._done_callbacks, []
+
+        for callback in [self.callback] + done_callbacks:
+            if not callback:
+                continue
+            try:
+                callback(self)
+            except Exception:
+                traceback.print_exc()
+
+
+class SkyhookClientPool(object):
+    def __init__(self, client_factory, client_count=1, max_batch_size=lk.max_batch_size):
+        """
+        :param client_factory: callable creating a client with an execute(command, parameters) method
+        """
+        self.client_factory = client_factory
+        self.max_batch_size = max_batch_size
+
+        self._request_ids = itertools.count()
+        self._queue = queue.Queue()
+        self._threads = []
+        for i in range(client_count):
+            thread = threading.Thread(target=self._dispatch_loop, name="script_panel_skyhook_{}".format(i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, script_path, callback=print_request_result):
+        """
+        Queue the script to run, returns straight away with a request that can be waited on
+        """
+        request = SkyhookRequest(next(self._request_ids), script_path, callback=callback)
+        self._queue.put(request)
+        return request
+
+    def shutdown(self):
+        for __ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _get_next_batch(self, client):
+        requests = [self._queue.get()]
+        if requests[0] is None:
+            return None
+
+        max_batch_size = self.max_batch_size if getattr(client, "supports_batching", False) else 1
+        while len(requests) < max_batch_size:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if request is None:
+                self._queue.put(None)  # let the loop pick up the shutdown after this batch
+                break
+            requests.append(request)
+
+        return requests
+
+    def _dispatch_loop(self):
+        client = None
+        while True:
+            if client is None:
+                try:
+                    client = self.client_factory()
+                except Exception:
+                    traceback.print_exc()
+                    client = None
+
+            requests = self._get_next_batch(client)
+            if requests is None:
+                return
+
+            if client is None:
+                for request in requests:
+                    request.finish(error="Could not create a skyhook client")
+                continue
+
+            try:
+                self._send_requests(client, requests)
+            except Exception:
+                error = traceback.format_exc()
+                for request in requests:
+                    if not request.is_done():
+                        request.finish(error=error)
+
+                # the connection might be in a bad state, start fresh for the next batch
+                client = None
+
+    @staticmethod
+    def _send_requests(client, requests):
+        if len(requests) == 1:
+            request = requests[0]
+            result = client.execute(lk.run_script_command, parameters={"script_path": request.script_path})
+            request.finish(result=result)
+            return
+
+        results = client.execute(
+            lk.run_scripts_command,
+            parameters={"script_paths": [request.script_path for request in requests]},
+        )
+        results = results if isinstance(results, (list, tuple)) else [results] * len(requests)
+        for request, result in zip(requests, results):
+            error = result.get("error") if isinstance(result, dict) else None
+            request.finish(result=result, error=error)
+
+        for request in requests[len(results):]:
+            request.finish(error="No result returned for this script in the batch")
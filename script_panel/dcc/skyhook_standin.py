@@ -0,0 +1,175 @@
+"""
+Local stand-in for a skyhook server and client, to test and benchmark the skyhook dispatch path offline.
+
+The server runs the scripts with runpy in its own process and speaks json over keep-alive http.
+
+Benchmark with:
+python -m script_panel.dcc.skyhook_standin
+"""
+import json
+import runpy
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+if sys.version_info.major < 3:
+    import httplib as http_client
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+else:
+    import http.client as http_client
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+class LocalConstants:
+    host = "127.0.0.1"
+
+
+lk = LocalConstants
+
+
+def run_script(script_path):
+    runpy.run_path(script_path, run_name="__main__")
+    return {"script_path": script_path, "error": None}
+
+
+def run_scripts(script_paths):
+    results = []
+    for script_path in script_paths:
+        try:
+            results.append(run_script(script_path))
+        except Exception:
+            results.append({"script_path": script_path, "error": traceback.format_exc()})
+    return results
+
+
+SERVER_COMMANDS = {
+    "run_script": run_script,
+    "run_scripts": run_scripts,
+    "echo": lambda **kwargs: kwargs,
+}
+
+
+class StandinRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive between requests
+
+    def do_POST(self):
+        content_length = int(self.headers.get("Content-Length", 0))
+        request_data = json.loads(self.rfile.read(content_length).decode("utf-8"))
+
+        command = SERVER_COMMANDS.get(request_data.get("FunctionName"))
+        try:
+            if command is None:
+                raise ValueError("Unknown command: {}".format(request_data.get("FunctionName")))
+            response = {"Success": True, "ReturnValue": command(**request_data.get("Parameters", {}))}
+        except Exception:
+            response = {"Success": False, "ReturnValue": traceback.format_exc()}
+
+        response_body = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandinServer(object):
+    def __init__(self, port=0, latency=0.0):
+        """
+        :param port: 0 picks a free port
+        :param latency: seconds added to every request, to simulate a remote or busy DCC
+        """
+        latency_handler = type("LatencyRequestHandler", (StandinRequestHandler,), {})
+        if latency:
+            def do_post_with_latency(handler_self):
+                time.sleep(latency)
+                StandinRequestHandler.do_POST(handler_self)
+
+            latency_handler.do_POST = do_post_with_latency
+
+        self.server = HTTPServer((lk.host, port), latency_handler)
+        self.port = self.server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="skyhook_standin_server")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StandinClient(object):
+    """
+    Same execute() interface as skyhook.client.BlenderClient, on a single persistent connection
+    """
+    supports_batching = True
+
+    def __init__(self, port, host=lk.host):
+        self.connection = http_client.HTTPConnection(host, port)
+
+    def execute(self, command, parameters=None):
+        request_body = json.dumps({"FunctionName": command, "Parameters": parameters or {}})
+        self.connection.request("POST", "/", body=request_body, headers={"Content-Type": "application/json"})
+        response = json.loads(self.connection.getresponse().read().decode("utf-8"))
+        if not response.get("Success"):
+            raise RuntimeError(response.get("ReturnValue"))
+        return response.get("ReturnValue")
+
+
+class OneShotStandinClient(StandinClient):
+    """Behaves like the old per-click client, a fresh connection for every request and no batching"""
+    supports_batching = False
+
+    def __init__(self, port, host=lk.host):
+        super(OneShotStandinClient, self).__init__(port, host)
+        self.port = port
+        self.host = host
+
+    def execute(self, command, parameters=None):
+        self.connection = http_client.HTTPConnection(self.host, self.port)
+        try:
+            return super(OneShotStandinClient, self).execute(command, parameters)
+        finally:
+            self.connection.close()
+
+
+def benchmark(script_count=200, latency=0.002):
+    from script_panel.dcc import skyhook_client_pool
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as fp:
+        fp.write("value = 1\n")
+        script_path = fp.name
+
+    server = StandinServer(latency=latency).start()
+    try:
+        start_time = time.time()
+        for __ in range(script_count):
+            OneShotStandinClient(server.port).execute("run_script", {"script_path": script_path})
+        blocking_time = time.time() - start_time
+
+        client_pool = skyhook_client_pool.SkyhookClientPool(lambda: StandinClient(server.port))
+        start_time = time.time()
+        requests = [client_pool.submit(script_path) for __ in range(script_count)]
+        dispatch_time = time.time() - start_time
+        failed_count = sum(request.wait() for request in requests)
+        pooled_time = time.time() - start_time
+        client_pool.shutdown()
+    finally:
+        server.stop()
+
+    print("{} scripts, {}s simulated latency per round trip".format(script_count, latency))
+    print("client per click (blocking): {:.3f}s".format(blocking_time))
+    print("pooled + batched:            {:.3f}s ({:.4f}s until the panel was free again, {} failed)".format(
+        pooled_time, dispatch_time, failed_count))
+
+
+if __name__ == "__main__":
+    benchmark()
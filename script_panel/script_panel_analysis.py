@@ -0,0 +1,289 @@
+"""
+Static analysis of script files, cached by modification time so every script is only parsed once.
+"""
+import ast
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+
+if sys.version_info.major < 3:
+    import imp
+else:
+    import importlib.machinery
+    import importlib.util
+
+
+class LocalConstants:
+    default_prefetch_time_budget = 2.0  # seconds
+
+    # DCC and Qt packages aren't safe to import off the main thread, they're imported on the UI thread at idle time
+    main_thread_packages = (
+        "maya", "pymel", "mayaUsd", "hou", "bpy", "pymxs", "MaxPlus", "unreal", "nuke", "c4d",
+        "PySide", "PySide2", "PySide6", "shiboken", "shiboken2", "shiboken6", "PyQt4", "PyQt5", "PyQt6",
+    )
+
+    # scripts declare that they can run in parallel with other scripts in a batch with this header comment
+    independent_marker_regex = re.compile(r"^\s*(#|//)\s*script_panel:\s*independent\s*$", re.IGNORECASE)
+    header_line_count = 20
+
+    imports_cache_namespace = "script_imports"
+
+
+lk = LocalConstants
+
+_script_imports_cache = {}
+_script_independent_cache = {}
+_script_code_cache = {}
+
+# optional cache that survives between sessions, with get_cached(namespace, key) and set_cached(namespace, key, value)
+_persistent_cache = None
+
+
+def set_persistent_cache(cache):
+    global _persistent_cache
+    _persistent_cache = cache
+
+
+def get_script_imports(script_path):
+    """
+    Get the absolute module names imported by a python script, without running it
+    """
+    try:
+        script_mtime = os.path.getmtime(script_path)
+    except OSError:
+        return tuple()
+
+    cached = _script_imports_cache.get(script_path)
+    if cached and cached[0] == script_mtime:
+        return cached[1]
+
+    if _persistent_cache is not None:
+        stored = _persistent_cache.get_cached(lk.imports_cache_namespace, script_path)
+        if stored and stored[0] == script_mtime:
+            module_names = tuple(stored[1])
+            _script_imports_cache[script_path] = (script_mtime, module_names)
+            return module_names
+
+    module_names = []
+    try:
+        with open(script_path, "r") as fp:
+            script_tree = ast.parse(fp.read(), filename=script_path)
+    except (SyntaxError, ValueError, IOError, OSError):
+        script_tree = None
+
+    if script_tree is not None:
+        for node in ast.walk(script_tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+
+            for name in names:
+                if name not in module_names:
+                    module_names.append(name)
+
+    module_names = tuple(module_names)
+    _script_imports_cache[script_path] = (script_mtime, module_names)
+    if _persistent_cache is not None:
+        try:
+            _persistent_cache.set_cached(lk.imports_cache_namespace, script_path, [script_mtime, module_names])
+        except Exception:
+            traceback.print_exc()
+    return module_names
+
+
+def is_script_independent(script_path):
+    """
+    Check the header of the script for the independent marker, ex:
+    # script_panel: independent
+    """
+    try:
+        script_mtime = os.path.getmtime(script_path)
+    except OSError:
+        return False
+
+    cached = _script_independent_cache.get(script_path)
+    if cached and cached[0] == script_mtime:
+        return cached[1]
+
+    is_independent = False
+    try:
+        with open(script_path, "r") as fp:
+            for i, line in enumerate(fp):
+                if i >= lk.header_line_count:
+                    break
+                if lk.independent_marker_regex.match(line):
+                    is_independent = True
+                    break
+    except (IOError, OSError, ValueError):
+        pass
+
+    _script_independent_cache[script_path] = (script_mtime, is_independent)
+    return is_independent
+
+
+def compile_script(script_path):
+    """
+    Get the compiled code object of a python script, only recompiled when the file has changed.
+    Raises SyntaxError if the script doesn't compile
+    """
+    script_stat = os.stat(script_path)
+    cache_key = (script_stat.st_mtime, script_stat.st_size)
+
+    cached = _script_code_cache.get(script_path)
+    if cached and cached[0] == cache_key:
+        return cached[1]
+
+    with open(script_path, "r") as fp:
+        script_code = compile(fp.read(), script_path, "exec")
+
+    _script_code_cache[script_path] = (cache_key, script_code)
+    return script_code
+
+
+def get_imports_for_scripts(script_paths):
+    """
+    :return: [(module name, folder of the script importing it)]
+    """
+    script_imports = []
+    for script_path in script_paths:
+        if not script_path.endswith(".py"):
+            continue
+        script_folder = os.path.dirname(os.path.abspath(script_path))
+        for module_name in get_script_imports(script_path):
+            if (module_name, script_folder) not in script_imports:
+                script_imports.append((module_name, script_folder))
+    return script_imports
+
+
+def is_module_in_folder(module_name, folder):
+    """
+    Check if the top level package of the module is a file or package directly in the folder
+    """
+    top_name = module_name.split(".")[0]
+    try:
+        if sys.version_info.major < 3:
+            module_file = imp.find_module(top_name, [folder])[0]
+            if module_file:
+                module_file.close()
+            return True
+        return importlib.machinery.PathFinder.find_spec(top_name, [folder]) is not None
+    except ImportError:
+        return False
+
+
+def is_module_importable(module_name):
+    """
+    Check if the top level package of the module can be found from sys.path, without importing anything
+    """
+    top_name = module_name.split(".")[0]
+    try:
+        if sys.version_info.major < 3:
+            module_file = imp.find_module(top_name)[0]
+            if module_file:
+                module_file.close()
+            return True
+        return importlib.util.find_spec(top_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def is_main_thread_module(module_name):
+    return module_name.split(".")[0] in lk.main_thread_packages
+
+
+def should_prefetch_module(module_name, script_folder):
+    sys_path_folders = set(os.path.normcase(os.path.abspath(path)) for path in sys.path if path)
+    if os.path.normcase(script_folder) not in sys_path_folders and is_module_in_folder(module_name, script_folder):
+        # a helper next to the script, prefetching the module of the same name from sys.path would import the wrong one
+        return False
+
+    return is_module_importable(module_name)
+
+
+class ImportPrefetcher(object):
+    """
+    Imports modules one at a time on a worker thread, so the UI doesn't wait on slow imports.
+    Modules that have to be imported on the main thread (see lk.main_thread_packages) are left for
+    prefetch_next_on_main_thread(), which the caller spreads over idle time.
+    Stops once the time budget, shared by both, has been spent.
+    """
+
+    def __init__(self, script_imports, time_budget=lk.default_prefetch_time_budget):
+        """
+        :param script_imports: [(module name, folder of the script importing it)]
+        """
+        script_imports = [(name, folder) for name, folder in script_imports if name not in sys.modules]
+        self.pending_modules = [entry for entry in script_imports if not is_main_thread_module(entry[0])]
+        self.main_thread_modules = [entry for entry in script_imports if is_main_thread_module(entry[0])]
+        self.time_budget = time_budget
+        self.time_spent = 0.0
+        self.imported_modules = []
+
+        self._stopped = False
+        self._thread = None
+        self._time_lock = threading.Lock()
+
+    def is_out_of_time(self):
+        return self._stopped or self.time_spent >= self.time_budget
+
+    def is_done(self):
+        return self.is_out_of_time() or not self.pending_modules
+
+    def start(self):
+        if self._thread is not None or self.is_done():
+            return
+        self._thread = threading.Thread(target=self._prefetch_loop, name="script_panel_import_prefetch")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Don't start any more imports, the one in progress still finishes
+        """
+        self._stopped = True
+
+    def _prefetch_loop(self):
+        while self.prefetch_next():
+            pass
+
+    def prefetch_next(self):
+        """
+        Import the next module, returns False when there's nothing more to do
+        """
+        if self.is_done():
+            return False
+
+        self._prefetch_module(*self.pending_modules.pop(0))
+        return not self.is_done()
+
+    def prefetch_next_on_main_thread(self):
+        """
+        Import the next main thread only module, returns False when there's nothing more to do
+        """
+        if self.is_out_of_time() or not self.main_thread_modules:
+            return False
+
+        self._prefetch_module(*self.main_thread_modules.pop(0))
+        return not self.is_out_of_time() and bool(self.main_thread_modules)
+
+    def _prefetch_module(self, module_name, script_folder):
+        start_time = time.time()
+        try:
+            if module_name in sys.modules or not should_prefetch_module(module_name, script_folder):
+                return
+            __import__(module_name)
+            self.imported_modules.append(module_name)
+        except Exception:
+            # a broken import will show up properly when the script is run
+            pass
+        except SystemExit:
+            traceback.print_exc()
+        finally:
+            with self._time_lock:
+                self.time_spent += time.time() - start_time
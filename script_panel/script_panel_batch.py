@@ -0,0 +1,237 @@
+"""
+Run a list of scripts back to back and collect a combined timing and error report.
+
+Scripts run in the given order, on the calling thread. Consecutive scripts that declare themselves independent
+(see script_panel_analysis.is_script_independent) are submitted together when the trigger function runs them
+out of process (like the standalone worker pool or skyhook), so they run concurrently there.
+Scripts running inside the panel process always run one after another, they share __main__, sys.argv and the DCC.
+BatchRunner runs a batch one step at a time, so the panel can drive it from a timer without blocking its UI.
+"""
+import os
+import sys
+import time
+import traceback
+
+from script_panel import script_panel_analysis
+
+
+class LocalConstants:
+    poll_interval = 0.05  # seconds between checks while waiting on out of process runs
+
+
+lk = LocalConstants
+
+
+class BatchStage(object):
+    def __init__(self, script_paths, parallel=False):
+        self.script_paths = script_paths
+        self.parallel = parallel
+
+
+class BatchResult(object):
+    def __init__(self, script_path, stage_index, parallel=False):
+        self.script_path = script_path
+        self.stage_index = stage_index
+        self.parallel = parallel
+        self.start_time = 0.0
+        self.wall_time = 0.0
+        self.error = None
+        self.skipped = False
+
+    @property
+    def succeeded(self):
+        return not self.error and not self.skipped
+
+
+class BatchReport(object):
+    def __init__(self):
+        self.results = []  # type: list[BatchResult]
+        self.total_time = 0.0
+
+    def get_failed_results(self):
+        return [result for result in self.results if result.error]
+
+    def get_summary_text(self):
+        failed_count = len(self.get_failed_results())
+        lines = [
+            "Batch run: {} scripts, {} failed, {:.2f}s total".format(len(self.results), failed_count, self.total_time),
+            "",
+        ]
+        for result in self.results:
+            if result.skipped:
+                status = "SKIPPED"
+            elif result.error:
+                status = "FAILED"
+            else:
+                status = "OK"
+            lines.append("[{}] {:>8.3f}s {}{}  (stage {})".format(
+                status,
+                result.wall_time,
+                os.path.basename(result.script_path),
+                " *" if result.parallel else "",
+                result.stage_index + 1,
+            ))
+
+        if failed_count:
+            lines.append("")
+            for result in self.get_failed_results():
+                lines.append("--- {}".format(result.script_path))
+                lines.append(result.error.rstrip())
+
+        return "\n".join(lines)
+
+
+def get_batch_stages(script_paths):
+    """
+    Group the scripts into stages, consecutive independent scripts share a parallel stage
+    """
+    stages = []
+    for script_path in script_paths:
+        is_independent = script_panel_analysis.is_script_independent(script_path)
+        if is_independent and stages and stages[-1].parallel:
+            stages[-1].script_paths.append(script_path)
+        else:
+            stages.append(BatchStage([script_path], parallel=is_independent))
+    return stages
+
+
+def start_script_for_batch(trigger_func, result):
+    """
+    :return: the run to wait on if trigger_func runs the script out of process, None if it already ran
+    """
+    result.start_time = time.time()
+    try:
+        trigger_output = trigger_func(result.script_path)
+
+        # asynchronous backends (like the standalone worker pool) hand back a run to wait on
+        if hasattr(trigger_output, "wait"):
+            return trigger_output
+    except SystemExit as e:
+        if e.code:
+            result.error = "Exited with status {}".format(e.code)
+    except Exception:
+        result.error = traceback.format_exc()
+
+    result.wall_time = time.time() - result.start_time
+    return None
+
+
+def finish_script_for_batch(script_run, result):
+    try:
+        exit_code = script_run.wait()
+        if exit_code:
+            result.error = getattr(script_run, "error", None) or "Exited with status {}".format(exit_code)
+    finally:
+        result.wall_time = time.time() - result.start_time
+    return result
+
+
+class BatchRunner(object):
+    """
+    Runs a batch one step at a time, so the caller can drive it from its event loop
+    instead of blocking it, or running the event loop in the middle of a script.
+    """
+
+    def __init__(self, script_paths, trigger_func, stop_on_error=False):
+        """
+        :param script_paths: scripts to run, in order
+        :param trigger_func: function that runs a single script path, ex: script_panel_utils.file_triggered
+        :param stop_on_error: skip the remaining scripts once a script has failed
+        """
+        self.trigger_func = trigger_func
+        self.stop_on_error = stop_on_error
+        self.stages = get_batch_stages(script_paths)
+        self.report = BatchReport()
+
+        self._stage_index = -1
+        self._queued_results = []  # results of the current stage that haven't started yet
+        self._pending_runs = []  # [(out of process run, result)] of the current stage
+        self._has_failed = False
+        self._start_time = None
+
+    def is_done(self):
+        return self._stage_index >= len(self.stages)
+
+    def is_waiting(self):
+        """
+        Only waiting on out of process runs, nothing to start until one of them finishes
+        """
+        if not self._pending_runs:
+            return False
+        stage = self.stages[self._stage_index]
+        return not (stage.parallel and self._queued_results)
+
+    def step(self):
+        """
+        Start the next script, or check on the out of process runs of the current stage
+
+        :return: False once the whole batch is done
+        """
+        if self.is_done():
+            return False
+        if self._start_time is None:
+            self._start_time = time.time()
+
+        if self._pending_runs:
+            self._pending_runs = [(script_run, result) for script_run, result in self._pending_runs
+                                  if not self._finish_if_done(script_run, result)]
+            if self.is_waiting():
+                return True
+
+        if self._queued_results:
+            self._start_next()
+            return True
+
+        if self._pending_runs:
+            return True
+
+        # in a parallel stage, every script is started before waiting on any of them
+        self._stage_index += 1
+        if self.is_done():
+            self.report.total_time = time.time() - self._start_time
+            return False
+
+        stage = self.stages[self._stage_index]
+        self._queued_results = [BatchResult(p, self._stage_index) for p in stage.script_paths]
+        self.report.results.extend(self._queued_results)
+        return True
+
+    def _start_next(self):
+        result = self._queued_results.pop(0)
+        if self._has_failed and self.stop_on_error:
+            result.skipped = True
+            return
+
+        script_run = start_script_for_batch(self.trigger_func, result)
+        if script_run is None:
+            self._has_failed = self._has_failed or bool(result.error)
+            return
+
+        stage = self.stages[self._stage_index]
+        result.parallel = stage.parallel and len(stage.script_paths) > 1
+        self._pending_runs.append((script_run, result))
+
+    def _finish_if_done(self, script_run, result):
+        if hasattr(script_run, "is_done") and not script_run.is_done():
+            return False
+        finish_script_for_batch(script_run, result)
+        self._has_failed = self._has_failed or bool(result.error)
+        return True
+
+
+def run_batch(script_paths, trigger_func, stop_on_error=False):
+    """
+    Run the whole batch right away, blocking until it's done
+
+    :rtype: BatchReport
+    """
+    batch_runner = BatchRunner(script_paths, trigger_func, stop_on_error=stop_on_error)
+    while batch_runner.step():
+        if batch_runner.is_waiting():
+            time.sleep(lk.poll_interval)
+    print_batch_report(batch_runner.report)
+    return batch_runner.report
+
+
+def print_batch_report(report):
+    sys.stdout.write(report.get_summary_text() + "\n")
@@ -0,0 +1,237 @@
+"""
+Cached access to the config files, with change notifications.
+
+Each config file is parsed once and kept until its modification time changes.
+Listeners are told which top level config keys changed, so they only rebuild what they need to.
+
+Config files can be layered (ex: studio, show, user). Layers are merged in order, later layers win:
+- a file's "include" list is loaded before the file itself, paths are relative to the including file
+- "paths" lists are combined, an entry with the same root_dir as an earlier one replaces it
+- dictionaries (like "snippets") are merged key by key
+- any other value is replaced
+"""
+import collections
+import json
+import os
+import sys
+import threading
+import traceback
+import weakref
+
+from script_panel.script_panel_path_checks import WeakMethod
+
+if sys.version_info.major < 3:
+    string_types = basestring  # noqa: F821
+else:
+    string_types = str
+
+
+class LocalConstants:
+    include = "include"
+    this_file_token = "__THIS_FILE__"
+
+    # {list key: identifying key of the entries in that list}
+    merged_list_keys = {"paths": "root_dir"}
+
+    # only the values of these keys get environment variables expanded, snippets and commands are left as written
+    path_keys = ("root_dir", "include", "icon", "icon_path")
+
+
+lk = LocalConstants
+
+
+def expand_config_tokens(data, config_path, expand_vars=False):
+    """
+    Replace __THIS_FILE__ with the config path, and expand environment variables in the values of path keys,
+    in a single walk over the data
+    """
+    if isinstance(data, dict):
+        return collections.OrderedDict(
+            (key, expand_config_tokens(value, config_path, expand_vars=key in lk.path_keys))
+            for key, value in data.items()
+        )
+    if isinstance(data, list):
+        return [expand_config_tokens(value, config_path, expand_vars) for value in data]
+    if isinstance(data, string_types):
+        if lk.this_file_token in data:
+            data = data.replace(lk.this_file_token, config_path)
+        if expand_vars and ("$" in data or "%" in data):
+            data = os.path.expandvars(data)
+    return data
+
+
+def merge_config_layers(layers, merged_list_keys=None):
+    """
+    :param layers: config dictionaries, from lowest to highest precedence
+    :rtype: collections.OrderedDict
+    """
+    merged_list_keys = lk.merged_list_keys if merged_list_keys is None else merged_list_keys
+
+    merged = collections.OrderedDict()
+    for layer in layers:
+        for key, value in layer.items():
+            if key == lk.include:
+                continue
+
+            existing_value = merged.get(key)
+            if key in merged_list_keys and isinstance(value, list):
+                merged[key] = merge_config_lists(existing_value or [], value, merged_list_keys[key])
+            elif isinstance(value, dict) and isinstance(existing_value, dict):
+                merged_dict = collections.OrderedDict(existing_value)
+                merged_dict.update(value)
+                merged[key] = merged_dict
+            else:
+                merged[key] = value
+    return merged
+
+
+def merge_config_lists(base_list, override_list, id_key):
+    merged_list = list(base_list)
+    entry_indices = dict((entry.get(id_key), i) for i, entry in enumerate(merged_list) if isinstance(entry, dict))
+    for entry in override_list:
+        entry_id = entry.get(id_key) if isinstance(entry, dict) else None
+        if entry_id is not None and entry_id in entry_indices:
+            merged_list[entry_indices[entry_id]] = entry
+        else:
+            entry_indices[entry_id] = len(merged_list)
+            merged_list.append(entry)
+    return merged_list
+
+
+class ConfigService(object):
+    def __init__(self):
+        self._json_cache = {}
+        self._value_cache = {}
+        self._layered_cache = {}
+        self._listeners = []
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def read_json(self, json_path, transform=None):
+        """
+        Parsed contents of a json file, cached until the file changes on disk.
+        The returned data is shared between callers, so it must not be modified.
+
+        :param transform: function applied to the parsed data once, the transformed result is what gets cached
+        :return: None if the file doesn't exist
+        """
+        return self._read_json_with_key(json_path, transform)[1]
+
+    def _read_json_with_key(self, json_path, transform=None):
+        try:
+            file_stat = os.stat(json_path)
+        except OSError:
+            self._json_cache.pop(json_path, None)
+            return None, None
+
+        cache_key = (file_stat.st_mtime, file_stat.st_size, transform)
+        cached = self._json_cache.get(json_path)
+        if cached and cached[0] == cache_key:
+            return cached
+
+        with open(json_path, "r") as fp:
+            data = json.load(fp, object_pairs_hook=collections.OrderedDict)
+
+        if transform:
+            data = transform(data, json_path)
+
+        with self._lock:
+            self._json_cache[json_path] = (cache_key, data)
+        return cache_key, data
+
+    def read_config_layers(self, config_paths):
+        """
+        Merged contents of the config files and everything they include, from lowest to highest precedence.
+        The merge is cached until any of the files involved changes. Don't modify the returned data.
+        """
+        layer_keys = []
+        layers = []
+        for config_path in config_paths:
+            self._collect_layers(os.path.abspath(config_path), layer_keys, layers, visited=set())
+
+        cache_key = tuple(layer_keys)
+        cached = self._layered_cache.get(tuple(config_paths))
+        if cached and cached[0] == cache_key:
+            return cached[1]
+
+        merged_data = merge_config_layers(layers)
+        self._layered_cache[tuple(config_paths)] = (cache_key, merged_data)
+        return merged_data
+
+    def _collect_layers(self, config_path, layer_keys, layers, visited):
+        if config_path in visited:
+            return  # include loop
+        visited.add(config_path)
+
+        file_key, data = self._read_json_with_key(config_path, transform=expand_config_tokens)
+        if data is None:
+            print("Config file could not be found: {}".format(config_path))
+            return
+
+        include_paths = data.get(lk.include, [])
+        if not isinstance(include_paths, list):
+            include_paths = [include_paths]
+        for include_path in include_paths:
+            include_path = os.path.join(os.path.dirname(config_path), include_path)
+            self._collect_layers(os.path.abspath(include_path), layer_keys, layers, visited)
+
+        layer_keys.append((config_path, file_key))
+        layers.append(data)
+
+    def get_cached_value(self, key, func):
+        """
+        Compute a value once per key, ex: data parsed from an environment variable string
+        """
+        if key not in self._value_cache:
+            self._value_cache[key] = func()
+        return self._value_cache[key]
+
+    def clear(self):
+        self._json_cache.clear()
+        self._value_cache.clear()
+        self._layered_cache.clear()
+
+    def subscribe(self, callback):
+        """
+        :param callback: called with the set of top level config keys that changed.
+                         Only weakly referenced, so listeners don't need to unsubscribe when they're deleted
+        """
+        if hasattr(callback, "__self__"):
+            callback_ref = WeakMethod(callback)
+        else:
+            callback_ref = weakref.ref(callback)
+        self._listeners.append(callback_ref)
+
+    def unsubscribe(self, callback):
+        self._listeners = [ref for ref in self._listeners if ref() not in (None, callback)]
+
+    def notify_if_changed(self, snapshot):
+        """
+        Compare the config against the previous snapshot and notify the listeners about the keys that changed.
+        The first snapshot is only recorded.
+
+        :param snapshot: {top level config key: value}
+        :return: set of changed keys
+        """
+        previous_snapshot = self._snapshot
+        self._snapshot = snapshot
+        if previous_snapshot is None:
+            return set()
+
+        changed_keys = set()
+        for key in set(previous_snapshot.keys()) | set(snapshot.keys()):
+            if previous_snapshot.get(key) != snapshot.get(key):
+                changed_keys.add(key)
+
+        if changed_keys:
+            for callback_ref in list(self._listeners):
+                callback = callback_ref()
+                if callback is None:
+                    self._listeners.remove(callback_ref)
+                    continue
+                try:
+                    callback(changed_keys)
+                except Exception:
+                    traceback.print_exc()
+
+        return changed_keys
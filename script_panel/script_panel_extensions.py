@@ -0,0 +1,215 @@
+"""
+Registry of the functions that run each script file extension.
+
+Handlers can be registered directly as functions, or lazily as "module.path:function_name" strings.
+Lazy handlers are declared through the "script_panel.extensions" entry point group of installed packages,
+or through the "extension_handlers" key in the config, and their module is only imported
+the first time a file with that extension is triggered.
+"""
+import importlib
+import os
+import sys
+import threading
+import traceback
+
+if sys.version_info.major < 3:
+    from collections import MutableMapping
+else:
+    from collections.abc import MutableMapping
+
+try:
+    from importlib import metadata as importlib_metadata
+except ImportError:
+    try:
+        import importlib_metadata
+    except ImportError:
+        importlib_metadata = None
+
+
+class LocalConstants:
+    entry_point_group = "script_panel.extensions"
+
+
+lk = LocalConstants
+
+
+def undefined_extension_func(file_path):
+    file_ext = os.path.splitext(file_path)[-1]
+    print("Action needed for extension: {}".format(file_ext))
+
+
+def import_handler_from_spec(handler_spec):
+    """
+    Import the function from a "module.path:function_name" (or "module.path.function_name") string
+    """
+    if ":" in handler_spec:
+        module_name, func_name = handler_spec.split(":", 1)
+    else:
+        module_name, __, func_name = handler_spec.rpartition(".")
+
+    handler = importlib.import_module(module_name)
+    for attr_name in func_name.split("."):
+        handler = getattr(handler, attr_name)
+    return handler
+
+
+def get_entry_point_specs(group=lk.entry_point_group):
+    """
+    Get {extension: handler_spec} from the installed entry points, without importing anything
+    """
+    if importlib_metadata is None:
+        return {}
+
+    try:
+        all_entry_points = importlib_metadata.entry_points()
+        if hasattr(all_entry_points, "select"):
+            group_entry_points = all_entry_points.select(group=group)
+        else:
+            group_entry_points = all_entry_points.get(group, [])
+    except Exception:
+        traceback.print_exc()
+        return {}
+
+    return dict((entry_point.name, entry_point.value) for entry_point in group_entry_points)
+
+
+class ExtensionRegistry(object):
+    def __init__(self, discover_entry_points=True):
+        self._handlers = {}
+        self._handler_specs = {}  # {extension: "module.path:function_name"} the handler was registered from
+        self._config_specs = {}  # {extension: handler spec} set by set_config_handlers
+        self._config_replaced_handlers = {}  # {extension: handler the config spec replaced}
+        self._suffixes = frozenset()
+        self._lock = threading.Lock()
+        self._entry_points_pending = discover_entry_points
+
+    @property
+    def suffixes(self):
+        """Precomputed set of registered extensions, for quick lookups while scanning folders"""
+        self._ensure_entry_points()
+        return self._suffixes
+
+    def register(self, extension, handler):
+        """
+        :param extension: file extension including the dot, ex: ".py"
+        :param handler: function taking the script path, or a "module.path:function_name" string
+        """
+        with self._lock:
+            self._handlers[extension] = handler
+            if callable(handler):
+                self._handler_specs.pop(extension, None)
+            else:
+                self._handler_specs[extension] = handler
+            self._suffixes = frozenset(self._handlers.keys())
+
+    def unregister(self, extension):
+        with self._lock:
+            self._handlers.pop(extension, None)
+            self._handler_specs.pop(extension, None)
+            self._suffixes = frozenset(self._handlers.keys())
+
+    def register_lazy_handlers(self, handler_specs, overwrite=False):
+        """
+        :param handler_specs: {extension: "module.path:function_name"}
+        :param overwrite: replace handlers that have already been registered,
+                          unless they were registered from the same spec (keeps the already imported handler)
+        """
+        for extension, handler_spec in (handler_specs or {}).items():
+            if extension in self._handlers:
+                if not overwrite or self._handler_specs.get(extension) == handler_spec:
+                    continue
+            self.register(extension, handler_spec)
+
+    def set_config_handlers(self, handler_specs):
+        """
+        Replace the handlers that came from the config with these.
+        Extensions that were removed from the config go back to the handler they had before, if any.
+
+        :param handler_specs: {extension: "module.path:function_name"}
+        """
+        handler_specs = handler_specs or {}
+        self._ensure_entry_points()  # so entry points can't replace config handlers later on
+
+        for extension, previous_spec in list(self._config_specs.items()):
+            if extension in handler_specs:
+                continue
+            del self._config_specs[extension]
+            replaced_handler = self._config_replaced_handlers.pop(extension, None)
+            if self._handler_specs.get(extension) != previous_spec:
+                continue  # registered over since, leave it alone
+            if replaced_handler is None:
+                self.unregister(extension)
+            else:
+                self.register(extension, replaced_handler)
+
+        for extension, handler_spec in handler_specs.items():
+            if self._handler_specs.get(extension) == handler_spec:
+                self._config_specs[extension] = handler_spec
+                continue  # unchanged, keeps the already imported handler
+            if extension not in self._config_specs and extension in self._handlers:
+                self._config_replaced_handlers[extension] = self._handlers[extension]
+            self.register(extension, handler_spec)
+            self._config_specs[extension] = handler_spec
+
+    def is_registered(self, extension):
+        self._ensure_entry_points()
+        return extension in self._handlers
+
+    def get_extensions(self):
+        self._ensure_entry_points()
+        return list(self._handlers.keys())
+
+    def get_handler(self, extension):
+        self._ensure_entry_points()
+        handler = self._handlers.get(extension)
+        if handler is None:
+            return undefined_extension_func
+
+        if callable(handler):
+            return handler
+
+        try:
+            resolved_handler = import_handler_from_spec(handler)
+        except Exception:
+            print("Failed to import handler for {} from: {}".format(extension, handler))
+            traceback.print_exc()
+            return undefined_extension_func
+
+        with self._lock:
+            if self._handlers.get(extension) == handler:
+                self._handlers[extension] = resolved_handler
+        return resolved_handler
+
+    def _ensure_entry_points(self):
+        if not self._entry_points_pending:
+            return
+        self._entry_points_pending = False
+        self.register_lazy_handlers(get_entry_point_specs())
+
+
+class ExtensionMap(MutableMapping):
+    """
+    Dictionary view of a registry, for code that still reads or edits the old EXTENSION_MAP directly
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def __getitem__(self, extension):
+        if not self.registry.is_registered(extension):
+            raise KeyError(extension)
+        return self.registry.get_handler(extension)
+
+    def __setitem__(self, extension, handler):
+        self.registry.register(extension, handler)
+
+    def __delitem__(self, extension):
+        if not self.registry.is_registered(extension):
+            raise KeyError(extension)
+        self.registry.unregister(extension)
+
+    def __iter__(self):
+        return iter(self.registry.get_extensions())
+
+    def __len__(self):
+        return len(self.registry.get_extensions())
@@ -0,0 +1,208 @@
+"""
+Append-only history of palette layouts.
+
+Every saved version of a layout is appended to that layout's journal as the difference to the previous version,
+so a save only writes what changed. Once the journal holds twice as many versions as it should keep,
+it's compacted down to a snapshot of the oldest kept version followed by the changes after it.
+"""
+import copy
+import json
+import os
+import threading
+import time
+
+from script_panel.script_panel_profiling import replace_file
+
+
+class LocalConstants:
+    file_extension = ".journal"
+    max_versions = 30
+
+    # entry keys
+    version = "version"
+    time = "time"
+    snapshot = "snapshot"
+    set_values = "set"
+    removed_keys = "remove"
+
+
+lk = LocalConstants
+
+
+def get_layout_diff(old_data, new_data, key_path=()):
+    """
+    :return: ([[key path, new value]], [removed key paths]), key paths are lists of nested dictionary keys
+    """
+    set_values = []
+    removed_keys = []
+    for key, new_value in new_data.items():
+        old_value = old_data.get(key)
+        child_path = key_path + (key,)
+        if isinstance(new_value, dict) and isinstance(old_value, dict):
+            child_set_values, child_removed_keys = get_layout_diff(old_value, new_value, child_path)
+            set_values.extend(child_set_values)
+            removed_keys.extend(child_removed_keys)
+        elif key not in old_data or old_value != new_value:
+            set_values.append([list(child_path), new_value])
+
+    for key in old_data:
+        if key not in new_data:
+            removed_keys.append(list(key_path + (key,)))
+
+    return set_values, removed_keys
+
+
+def apply_layout_diff(data, set_values, removed_keys):
+    for key_path in removed_keys:
+        parent = data
+        for key in key_path[:-1]:
+            parent = parent.get(key, {})
+        parent.pop(key_path[-1], None)
+
+    for key_path, value in set_values:
+        parent = data
+        for key in key_path[:-1]:
+            parent = parent.setdefault(key, {})
+        parent[key_path[-1]] = copy.deepcopy(value)
+    return data
+
+
+class LayoutJournal(object):
+    def __init__(self, journal_folder, max_versions=lk.max_versions):
+        self.journal_folder = journal_folder
+        self.max_versions = max_versions
+
+        self._entries = {}  # {layout name: [entries]}, loaded on first use
+        self._current_layouts = {}  # {layout name: latest version of the layout}
+        self._lock = threading.Lock()
+
+    def get_journal_path(self, layout_name):
+        return os.path.join(self.journal_folder, layout_name + lk.file_extension)
+
+    def _get_entries(self, layout_name):
+        entries = self._entries.get(layout_name)
+        if entries is not None:
+            return entries
+
+        entries = []
+        needs_repair = False
+        journal_path = self.get_journal_path(layout_name)
+        if os.path.exists(journal_path):
+            with open(journal_path, "r") as fp:
+                for line in fp:
+                    try:
+                        if not line.endswith("\n"):
+                            raise ValueError("Incomplete line")
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # the last write was interrupted, everything before it is still good
+                        needs_repair = True
+                        break
+
+        # a journal has to start from a snapshot to be replayed
+        while entries and lk.snapshot not in entries[0]:
+            entries.pop(0)
+            needs_repair = True
+
+        # drop the broken part, otherwise the next entry would be appended onto it and be lost too
+        if needs_repair:
+            self._write_entries(layout_name, entries)
+
+        self._entries[layout_name] = entries
+        self._current_layouts[layout_name] = self._replay(entries, len(entries))
+        return entries
+
+    @staticmethod
+    def _replay(entries, entry_count):
+        layout_data = {}
+        for entry in entries[:entry_count]:
+            if lk.snapshot in entry:
+                layout_data = copy.deepcopy(entry[lk.snapshot])
+            else:
+                apply_layout_diff(layout_data, entry.get(lk.set_values, []), entry.get(lk.removed_keys, []))
+        return layout_data
+
+    def record(self, layout_name, layout_data):
+        """
+        Append the changes since the last recorded version of this layout
+        """
+        # compare what would be read back from disk, tuples turn into lists and so on
+        layout_data = json.loads(json.dumps(layout_data))
+
+        with self._lock:
+            entries = self._get_entries(layout_name)
+
+            entry = {
+                lk.version: entries[-1][lk.version] + 1 if entries else 0,
+                lk.time: time.time(),
+            }
+            if entries:
+                set_values, removed_keys = get_layout_diff(self._current_layouts[layout_name], layout_data)
+                if not set_values and not removed_keys:
+                    return
+                entry[lk.set_values] = set_values
+                entry[lk.removed_keys] = removed_keys
+            else:
+                entry[lk.snapshot] = layout_data
+
+            entries.append(entry)
+            self._current_layouts[layout_name] = layout_data
+
+            if not os.path.exists(self.journal_folder):
+                os.makedirs(self.journal_folder)
+            with open(self.get_journal_path(layout_name), "a") as fp:
+                fp.write(json.dumps(entry) + "\n")
+
+            if len(entries) >= self.max_versions * 2:
+                self._compact(layout_name)
+
+    def _compact(self, layout_name):
+        entries = self._entries[layout_name]
+        first_kept_index = len(entries) - self.max_versions
+
+        first_kept_entry = entries[first_kept_index]
+        snapshot_entry = {
+            lk.version: first_kept_entry[lk.version],
+            lk.time: first_kept_entry[lk.time],
+            lk.snapshot: self._replay(entries, first_kept_index + 1),
+        }
+        compacted_entries = [snapshot_entry] + entries[first_kept_index + 1:]
+        self._write_entries(layout_name, compacted_entries)
+        self._entries[layout_name] = compacted_entries
+
+    def _write_entries(self, layout_name, entries):
+        """
+        Replace the whole journal file with these entries
+        """
+        journal_path = self.get_journal_path(layout_name)
+        temp_path = journal_path + ".tmp"
+        with open(temp_path, "w") as fp:
+            for entry in entries:
+                fp.write(json.dumps(entry) + "\n")
+        replace_file(temp_path, journal_path)
+
+    def get_versions(self, layout_name):
+        """
+        :return: [(version, timestamp)] from oldest to newest
+        """
+        with self._lock:
+            return [(entry[lk.version], entry[lk.time]) for entry in self._get_entries(layout_name)]
+
+    def get_layout_version(self, layout_name, version):
+        """
+        :return: the layout as it was saved in that version, None if the version isn't in the journal anymore
+        """
+        with self._lock:
+            entries = self._get_entries(layout_name)
+            for i, entry in enumerate(entries):
+                if entry[lk.version] == version:
+                    return self._replay(entries, i + 1)
+        return None
+
+    def remove(self, layout_name):
+        with self._lock:
+            self._entries.pop(layout_name, None)
+            self._current_layouts.pop(layout_name, None)
+            journal_path = self.get_journal_path(layout_name)
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
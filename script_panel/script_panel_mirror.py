@@ -0,0 +1,305 @@
+"""
+Local mirrors of network script roots.
+
+Network shares can be slow enough to stall a refresh or a script click. A background thread keeps a local copy of
+each mirrored network root in sync, only copying files whose size or modification time changed.
+Mirroring is opt-in per root. The whole root is copied, scripts often load files sitting next to their __file__.
+The panel scans and runs scripts from the copy, while the share paths stay the ones shown in the panel.
+The share is used directly when the mirror is missing, hasn't been synced in a while,
+or the script on the share has changed since its copy was made.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import traceback
+
+from script_panel.script_panel_profiling import replace_file
+
+
+class LocalConstants:
+    manifest_suffix = "_manifest.json"  # stored next to the mirror folder, so it never shows up in a scan
+    sync_interval = 60  # seconds between background syncs, runs check their own script against the share too
+    max_age = 60 * 60 * 24  # seconds since the last successful sync before the mirror counts as stale
+
+    # manifest keys
+    share_root = "share_root"
+    synced_at = "synced_at"
+    files = "files"
+
+
+lk = LocalConstants
+
+
+def normalize_path(path):
+    return os.path.normcase(os.path.abspath(path)).replace("\\", "/")
+
+
+class RootMirror(object):
+    def __init__(self, share_root, mirror_root, max_age=lk.max_age, is_file_mirrored=None, share_latency=0.0):
+        """
+        :param is_file_mirrored: func(file_name) -> True for files to copy, everything is copied if it's not set
+        :param share_latency: seconds added to every file system call on the share, to simulate a slow file server
+        """
+        self.share_root = share_root
+        self.mirror_root = mirror_root
+        self.max_age = max_age
+        self.is_file_mirrored = is_file_mirrored
+        self.share_latency = share_latency
+
+        self.manifest_path = mirror_root + lk.manifest_suffix
+        self.manifest = self._load_manifest()
+        self._sync_lock = threading.Lock()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r") as fp:
+                return json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _save_manifest(self, manifest):
+        if not os.path.exists(self.mirror_root):
+            os.makedirs(self.mirror_root)
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w") as fp:
+            json.dump(manifest, fp)
+        replace_file(temp_path, self.manifest_path)
+
+    def _share_call(self, func, *args):
+        if self.share_latency:
+            time.sleep(self.share_latency)
+        return func(*args)
+
+    def is_usable(self):
+        """
+        The mirror has been synced recently enough to scan and run scripts from it
+        """
+        manifest = self.manifest
+        if not manifest:
+            return False
+        return time.time() - manifest.get(lk.synced_at, 0) < self.max_age
+
+    def sync(self):
+        """
+        Bring the mirror up to date with the share, only copying what changed
+
+        :return: number of files copied or removed, None if the share couldn't be reached
+        """
+        with self._sync_lock:
+            try:
+                return self._sync()
+            except (IOError, OSError):
+                traceback.print_exc()
+                return None
+
+    def _sync(self):
+        if not self._share_call(os.path.isdir, self.share_root):
+            return None
+
+        previous_files = (self.manifest or {}).get(lk.files, {})
+        synced_files = {}
+        change_count = 0
+
+        # the walk is iterated inside the share call, listing the folders is where the time goes
+        walk_results = self._share_call(lambda share_root: list(os.walk(share_root)), self.share_root)
+        for folder, __, file_names in walk_results:
+            for file_name in file_names:
+                if self.is_file_mirrored and not self.is_file_mirrored(file_name):
+                    continue
+                share_path = os.path.join(folder, file_name)
+                relative_path = os.path.relpath(share_path, self.share_root).replace("\\", "/")
+                file_stat = self._share_call(os.stat, share_path)
+                file_key = [file_stat.st_size, file_stat.st_mtime]
+
+                mirror_path = os.path.join(self.mirror_root, relative_path)
+                if previous_files.get(relative_path) != file_key or not os.path.exists(mirror_path):
+                    self._copy_to_mirror(share_path, mirror_path)
+                    change_count += 1
+                synced_files[relative_path] = file_key
+
+        for relative_path in set(previous_files) - set(synced_files):
+            mirror_path = os.path.join(self.mirror_root, relative_path)
+            if os.path.exists(mirror_path):
+                os.remove(mirror_path)
+            change_count += 1
+
+        manifest = {
+            lk.share_root: self.share_root,
+            lk.synced_at: time.time(),
+            lk.files: synced_files,
+        }
+        self._save_manifest(manifest)
+        self.manifest = manifest
+        return change_count
+
+    def _copy_to_mirror(self, share_path, mirror_path):
+        mirror_folder = os.path.dirname(mirror_path)
+        if not os.path.exists(mirror_folder):
+            os.makedirs(mirror_folder)
+
+        # copy next to the destination and swap it in, so a script is never run half-written
+        temp_path = mirror_path + ".tmp"
+        self._share_call(shutil.copy2, share_path, temp_path)
+        replace_file(temp_path, mirror_path)
+
+    def update_file(self, share_path):
+        """
+        Copy a single mirrored file straight away if it changed, for files that are being edited
+
+        :return: path of the mirrored file, None if it should be run from the share
+        """
+        with self._sync_lock:
+            if not self.is_usable():
+                return None
+
+            relative_path = self.get_relative_path(share_path)
+            synced_files = self.manifest.get(lk.files, {})
+            if relative_path is None or relative_path not in synced_files:
+                return None
+
+            mirror_path = os.path.join(self.mirror_root, relative_path)
+            try:
+                file_stat = self._share_call(os.stat, share_path)
+                file_key = [file_stat.st_size, file_stat.st_mtime]
+                if synced_files.get(relative_path) != file_key or not os.path.exists(mirror_path):
+                    self._copy_to_mirror(share_path, mirror_path)
+                    synced_files[relative_path] = file_key
+                    self._save_manifest(self.manifest)
+            except (IOError, OSError):
+                traceback.print_exc()
+                return None
+            return mirror_path
+
+    def get_relative_path(self, share_path):
+        normalized_root = normalize_path(self.share_root)
+        normalized_path = normalize_path(share_path)
+        if not normalized_path.startswith(normalized_root + "/"):
+            return None
+        return normalized_path[len(normalized_root) + 1:]
+
+    def get_share_path(self, mirror_path):
+        relative_path = os.path.relpath(mirror_path, self.mirror_root)
+        return os.path.join(self.share_root, relative_path)
+
+    def get_mirror_path(self, share_path):
+        """
+        :return: path of the mirrored file, None if it should be run from the share
+        """
+        if not self.is_usable():
+            return None
+
+        relative_path = self.get_relative_path(share_path)
+        synced_files = self.manifest.get(lk.files, {})
+        if relative_path is None or relative_path not in synced_files:
+            return None
+
+        mirror_path = os.path.join(self.mirror_root, relative_path)
+        if not os.path.exists(mirror_path):
+            return None
+
+        # a single stat on the share, so a script edited since the last sync is never run from an older copy
+        try:
+            file_stat = self._share_call(os.stat, share_path)
+        except (IOError, OSError):
+            return mirror_path  # the share isn't answering, the copy is the best there is
+        if [file_stat.st_size, file_stat.st_mtime] != synced_files[relative_path]:
+            return None
+        return mirror_path
+
+
+class MirrorManager(object):
+    def __init__(self, mirrors_folder, sync_interval=lk.sync_interval, max_age=lk.max_age, is_file_mirrored=None,
+                 share_latency=0.0):
+        self.mirrors_folder = mirrors_folder
+        self.sync_interval = sync_interval
+        self.max_age = max_age
+        self.is_file_mirrored = is_file_mirrored
+        self.share_latency = share_latency
+
+        self.mirrors = {}
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def get_mirror(self, share_root):
+        mirror_key = normalize_path(share_root)
+        with self._lock:
+            root_mirror = self.mirrors.get(mirror_key)
+            if root_mirror is None:
+                path_hash = hashlib.md5(mirror_key.encode("utf-8")).hexdigest()[:10]
+                folder_name = "{}_{}".format(os.path.basename(mirror_key) or "root", path_hash)
+                root_mirror = RootMirror(
+                    share_root,
+                    os.path.join(self.mirrors_folder, folder_name),
+                    max_age=self.max_age,
+                    is_file_mirrored=self.is_file_mirrored,
+                    share_latency=self.share_latency,
+                )
+                self.mirrors[mirror_key] = root_mirror
+        return root_mirror
+
+    def start(self):
+        """
+        Start syncing the mirrors in the background, does nothing if it's already running
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sync_loop, name="script_panel_mirror_sync")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def request_sync(self):
+        self._wake_event.set()
+
+    def sync_all(self):
+        with self._lock:
+            mirrors = list(self.mirrors.values())
+        for root_mirror in mirrors:
+            if self._stop_event.is_set():
+                return
+            root_mirror.sync()
+
+    def _sync_loop(self):
+        while not self._stop_event.is_set():
+            self.sync_all()
+            self._wake_event.wait(self.sync_interval)
+            self._wake_event.clear()
+
+    def get_updated_run_path(self, script_path):
+        """
+        Like get_run_path, but the mirrored copy is brought up to date with the share first
+        """
+        with self._lock:
+            mirrors = list(self.mirrors.values())
+        for root_mirror in mirrors:
+            mirror_path = root_mirror.update_file(script_path)
+            if mirror_path:
+                return mirror_path
+        return script_path
+
+    def get_run_path(self, script_path):
+        """
+        Path to run the script from, the mirrored copy if there's an up to date one
+        """
+        with self._lock:
+            mirrors = list(self.mirrors.values())
+        for root_mirror in mirrors:
+            mirror_path = root_mirror.get_mirror_path(script_path)
+            if mirror_path:
+                return mirror_path
+
+            if root_mirror.get_relative_path(script_path) is not None:
+                self.request_sync()  # out of date or missing, catch the rest of the root up too
+        return script_path
@@ -0,0 +1,191 @@
+"""
+Check whether palette scripts still exist, without blocking the UI.
+
+Paths are checked on background threads, grouped by folder so every folder is listed once
+instead of touching every file on its own. A few folders are listed at the same time, each with a deadline,
+so a folder on a dead mount doesn't hold up the others. Listeners are told about the paths whose state changed,
+one folder at a time, so results come in as they're found.
+"""
+import collections
+import os
+import sys
+import threading
+import weakref
+from functools import partial
+
+from script_panel import script_panel_roots
+
+if sys.version_info.major < 3:
+    import Queue as queue
+else:
+    import queue
+
+
+class LocalConstants:
+    check_timeout = 5.0  # seconds a folder gets to answer before its paths are assumed to exist
+    max_check_threads = 4
+
+
+lk = LocalConstants
+
+
+if hasattr(weakref, "WeakMethod"):
+    WeakMethod = weakref.WeakMethod
+else:
+    class WeakMethod(object):
+        """
+        Python 2 stand-in for weakref.WeakMethod, a plain weakref to a bound method dies straight away
+        """
+
+        def __init__(self, method):
+            self._self_ref = weakref.ref(method.__self__)
+            self._func = method.__func__
+
+        def __call__(self):
+            method_self = self._self_ref()
+            if method_self is None:
+                return None
+            return self._func.__get__(method_self, type(method_self))
+
+
+def list_folder(folder):
+    return set(os.path.normcase(file_name) for file_name in os.listdir(folder or "."))
+
+
+class ScriptExistenceChecker(object):
+    def __init__(self, is_path_skipped=None, run_with_deadline=None, check_timeout=lk.check_timeout,
+                 max_check_threads=lk.max_check_threads):
+        """
+        :param is_path_skipped: func(path) -> True for paths that shouldn't be touched, like ones on roots
+                                that aren't responding. Those are assumed to exist.
+        :param run_with_deadline: func(folder, func, timeout) like RootCircuitBreaker.run_with_deadline,
+                                  raising RootScanTimeout for folders that didn't answer in time.
+                                  Folders are listed without a deadline if it's not set.
+        """
+        self.is_path_skipped = is_path_skipped
+        self.run_with_deadline = run_with_deadline
+        self.check_timeout = check_timeout
+        self.max_check_threads = max_check_threads
+
+        self._known = {}  # {script path: exists}
+        self._pending = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """
+        :param callback: called from the worker thread with {script path: exists} of the paths that changed.
+                         Only weakly referenced, so listeners don't need to unsubscribe when they're deleted
+        """
+        if hasattr(callback, "__self__"):
+            callback_ref = WeakMethod(callback)
+        else:
+            callback_ref = weakref.ref(callback)
+        self._listeners.append(callback_ref)
+
+    def unsubscribe(self, callback):
+        self._listeners = [ref for ref in self._listeners if ref() not in (None, callback)]
+
+    def get_known(self, script_path):
+        """
+        :return: result of the last check, None if the path hasn't been checked yet
+        """
+        with self._lock:
+            return self._known.get(script_path)
+
+    def request(self, script_paths, recheck=False):
+        """
+        Queue the paths for a check, the ones with a known result are skipped unless recheck is set
+        """
+        with self._lock:
+            for script_path in script_paths:
+                if recheck or script_path not in self._known:
+                    self._pending.add(script_path)
+            if not self._pending:
+                return
+
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._check_loop, name="script_panel_script_checks")
+            self._thread.daemon = True
+            self._thread.start()
+        self._wake_event.set()
+
+    def _check_loop(self):
+        while True:
+            self._wake_event.wait()
+            self._wake_event.clear()
+            with self._lock:
+                pending, self._pending = self._pending, set()
+            if pending:
+                self.check_paths(pending)
+
+    def check_paths(self, script_paths):
+        paths_by_folder = collections.defaultdict(list)
+        for script_path in script_paths:
+            paths_by_folder[os.path.dirname(script_path)].append(script_path)
+
+        folder_queue = queue.Queue()
+        for folder, folder_paths in paths_by_folder.items():
+            folder_queue.put((folder, folder_paths))
+
+        check_threads = []
+        for __ in range(min(self.max_check_threads, len(paths_by_folder))):
+            check_thread = threading.Thread(
+                target=self._check_queued_folders,
+                args=(folder_queue,),
+                name="script_panel_folder_checks",
+            )
+            check_thread.daemon = True
+            check_thread.start()
+            check_threads.append(check_thread)
+
+        for check_thread in check_threads:
+            check_thread.join()
+
+    def _check_queued_folders(self, folder_queue):
+        while True:
+            try:
+                folder, folder_paths = folder_queue.get_nowait()
+            except queue.Empty:
+                return
+
+            results = self.check_folder(folder, folder_paths)
+
+            changed_results = {}
+            with self._lock:
+                for script_path, exists in results.items():
+                    if self._known.get(script_path) != exists:
+                        changed_results[script_path] = exists
+                    self._known[script_path] = exists
+
+            if changed_results:
+                self._notify(changed_results)
+
+    def check_folder(self, folder, script_paths):
+        """
+        :return: {script path: exists}
+        """
+        if self.is_path_skipped and self.is_path_skipped(folder):
+            return dict((script_path, True) for script_path in script_paths)
+
+        try:
+            if self.run_with_deadline:
+                file_names = self.run_with_deadline(folder, partial(list_folder, folder), timeout=self.check_timeout)
+            else:
+                file_names = list_folder(folder)
+        except script_panel_roots.RootScanTimeout:
+            # the folder is skipped until its cool-down is over, don't flag scripts as missing meanwhile
+            return dict((script_path, True) for script_path in script_paths)
+        except OSError:
+            file_names = set()  # the folder is gone too
+
+        return dict((script_path, os.path.normcase(os.path.basename(script_path)) in file_names)
+                    for script_path in script_paths)
+
+    def _notify(self, changed_results):
+        for callback_ref in list(self._listeners):
+            callback = callback_ref()
+            if callback is not None:
+                callback(changed_results)
@@ -0,0 +1,313 @@
+"""
+Timing, cpu and memory instrumentation for triggered scripts.
+
+Every run is appended to a bounded history on disk, optionally with a cProfile capture saved next to it.
+Scripts that run out of process (worker pool, skyhook) are recorded once they finish, with their wall time and errors.
+"""
+import cProfile
+import collections
+import json
+import os
+import threading
+import time
+import traceback
+from functools import partial
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+get_cpu_time = getattr(time, "process_time", None) or time.clock
+replace_file = getattr(os, "replace", os.rename)
+
+
+class LocalConstants:
+    max_history_records = 2000
+
+    # record keys
+    script_path = "script_path"
+    timestamp = "timestamp"
+    wall_time = "wall_time"
+    cpu_time = "cpu_time"
+    peak_memory = "peak_memory"
+    profile_path = "profile_path"
+    error = "error"
+    out_of_process = "out_of_process"  # cpu time and memory of the panel process don't apply to these
+
+    # stats keys
+    runs = "runs"
+    p50 = "p50"
+    p95 = "p95"
+    mean_cpu_time = "mean_cpu_time"
+    max_peak_memory = "max_peak_memory"
+
+
+lk = LocalConstants
+
+
+def get_percentile(sorted_values, percentile):
+    """Nearest rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = int(round(percentile / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+class RunHistory(object):
+    """
+    Ring of the latest run records, stored as json lines on disk.
+
+    Runs are appended to the file, which is only rewritten once it holds twice the max amount of records.
+    """
+
+    def __init__(self, history_path, max_records=lk.max_history_records):
+        self.history_path = history_path
+        self.max_records = max_records
+        self._records = None
+        self._lines_on_disk = 0
+        self._lock = threading.Lock()
+
+    def get_records(self, script_path=None):
+        with self._lock:
+            records = list(self._load_records())
+        if script_path:
+            records = [r for r in records if r.get(lk.script_path) == script_path]
+        return records
+
+    def add_record(self, record):
+        with self._lock:
+            records = self._load_records()
+            if len(records) == records.maxlen:
+                self._remove_profile_file(records[0])
+            records.append(record)
+
+            try:
+                if self._lines_on_disk >= self.max_records * 2:
+                    self._write_all_records()
+                else:
+                    self._append_record(record)
+            except (IOError, OSError):
+                traceback.print_exc()
+
+    def get_script_stats(self):
+        """
+        Latency percentiles and resource usage per script
+        """
+        wall_times = collections.defaultdict(list)
+        cpu_times = collections.defaultdict(list)
+        peak_memory = collections.defaultdict(int)
+        for record in self.get_records():
+            script_path = record.get(lk.script_path)
+            wall_times[script_path].append(record.get(lk.wall_time, 0.0))
+            if record.get(lk.cpu_time) is not None:
+                cpu_times[script_path].append(record.get(lk.cpu_time))
+            peak_memory[script_path] = max(peak_memory[script_path], record.get(lk.peak_memory) or 0)
+
+        script_stats = collections.OrderedDict()
+        for script_path in sorted(wall_times.keys()):
+            sorted_wall_times = sorted(wall_times[script_path])
+            script_cpu_times = cpu_times[script_path]
+            script_stats[script_path] = {
+                lk.runs: len(sorted_wall_times),
+                lk.p50: get_percentile(sorted_wall_times, 50),
+                lk.p95: get_percentile(sorted_wall_times, 95),
+                lk.mean_cpu_time: sum(script_cpu_times) / len(script_cpu_times) if script_cpu_times else 0.0,
+                lk.max_peak_memory: peak_memory[script_path],
+            }
+        return script_stats
+
+    def _load_records(self):
+        if self._records is not None:
+            return self._records
+
+        self._records = collections.deque(maxlen=self.max_records)
+        if os.path.exists(self.history_path):
+            with open(self.history_path, "r") as fp:
+                for line in fp:
+                    try:
+                        self._records.append(json.loads(line))
+                    except ValueError:
+                        continue  # partially written line
+                    self._lines_on_disk += 1
+        return self._records
+
+    def _append_record(self, record):
+        self._ensure_folder()
+        with open(self.history_path, "a") as fp:
+            fp.write(json.dumps(record) + "\n")
+        self._lines_on_disk += 1
+
+    def _write_all_records(self):
+        self._ensure_folder()
+        temp_path = self.history_path + ".tmp"
+        with open(temp_path, "w") as fp:
+            for record in self._records:
+                fp.write(json.dumps(record) + "\n")
+        replace_file(temp_path, self.history_path)
+        self._lines_on_disk = len(self._records)
+
+    def _ensure_folder(self):
+        history_folder = os.path.dirname(self.history_path)
+        if not os.path.exists(history_folder):
+            os.makedirs(history_folder)
+
+    @staticmethod
+    def _remove_profile_file(record):
+        profile_path = record.get(lk.profile_path)
+        if profile_path and os.path.exists(profile_path):
+            try:
+                os.remove(profile_path)
+            except OSError:
+                pass
+
+
+class StoreRunHistory(RunHistory):
+    """
+    Run history kept in a ScriptPanelStore, indexed by script path and shared between sessions
+    """
+
+    def __init__(self, store, max_records=lk.max_history_records):
+        super(StoreRunHistory, self).__init__(history_path=None, max_records=max_records)
+        self.store = store
+
+    def get_records(self, script_path=None):
+        return self.store.get_run_records(script_path)
+
+    def add_record(self, record):
+        try:
+            dropped_records = self.store.add_run_record(
+                record.get(lk.script_path),
+                record.get(lk.timestamp),
+                record,
+                max_records=self.max_records,
+            )
+        except Exception:
+            traceback.print_exc()
+            return
+
+        for dropped_record in dropped_records:
+            self._remove_profile_file(dropped_record)
+
+
+class RunTracker(object):
+    """
+    Measures wall time, cpu time and peak memory of script runs and stores them in a RunHistory
+    """
+
+    def __init__(self, history, profiles_folder=None, capture_profile=False, track_memory=False):
+        """
+        :param track_memory: measure peak memory with tracemalloc, slows down every allocation while a script runs
+        """
+        self.history = history  # type: RunHistory
+        self.profiles_folder = profiles_folder
+        self.capture_profile = capture_profile
+        self.track_memory = track_memory
+
+        self._tracemalloc_lock = threading.Lock()
+        self._tracemalloc_users = 0
+        self._tracemalloc_started_here = False
+
+    def run(self, func, script_path):
+        record = {
+            lk.script_path: script_path,
+            lk.timestamp: time.time(),
+            lk.error: None,
+        }
+
+        profiler = cProfile.Profile() if self.capture_profile and self.profiles_folder else None
+        start_memory = self._start_memory_tracking() if self.track_memory else None
+        start_cpu_time = get_cpu_time()
+        start_wall_time = time.time()
+
+        is_out_of_process = False
+        if profiler:
+            profiler.enable()
+        try:
+            run_output = func(script_path)
+
+            # out of process backends hand back a run, it's recorded once that has finished
+            if hasattr(run_output, "add_done_callback"):
+                is_out_of_process = True
+                run_output.add_done_callback(partial(self._record_finished_run, record, start_wall_time))
+            return run_output
+        except Exception as e:
+            record[lk.error] = "{}: {}".format(type(e).__name__, e)
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+            peak_memory = self._stop_memory_tracking(start_memory) if start_memory is not None else None
+
+            if not is_out_of_process:
+                record[lk.wall_time] = time.time() - start_wall_time
+                record[lk.cpu_time] = get_cpu_time() - start_cpu_time
+                record[lk.peak_memory] = peak_memory
+
+                if profiler:
+                    record[lk.profile_path] = self._save_profile(profiler, script_path, record[lk.timestamp])
+
+                self.history.add_record(record)
+
+    def _record_finished_run(self, record, start_wall_time, script_run):
+        """
+        Called from the backend's thread once an out of process run has finished
+        """
+        record[lk.wall_time] = time.time() - start_wall_time
+        record[lk.cpu_time] = None
+        record[lk.peak_memory] = None
+        record[lk.out_of_process] = True
+
+        error = getattr(script_run, "error", None)
+        exit_code = script_run.wait(0)
+        if error:
+            record[lk.error] = error.strip().splitlines()[-1] if error.strip() else error
+        elif exit_code:
+            record[lk.error] = "Exited with status {}".format(exit_code)
+
+        self.history.add_record(record)
+
+    def _start_memory_tracking(self):
+        if tracemalloc is None:
+            return 0
+
+        with self._tracemalloc_lock:
+            if self._tracemalloc_users == 0:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._tracemalloc_started_here = True
+                elif hasattr(tracemalloc, "reset_peak"):
+                    tracemalloc.reset_peak()
+            self._tracemalloc_users += 1
+            return tracemalloc.get_traced_memory()[0]
+
+    def _stop_memory_tracking(self, start_memory):
+        """
+        Peak memory allocated during the run in bytes.
+        Overlapping runs share the tracer, so their peaks are measured for the whole overlap.
+        """
+        if tracemalloc is None:
+            return None
+
+        with self._tracemalloc_lock:
+            peak_memory = max(tracemalloc.get_traced_memory()[1] - start_memory, 0)
+            self._tracemalloc_users -= 1
+            if self._tracemalloc_users == 0 and self._tracemalloc_started_here:
+                tracemalloc.stop()
+                self._tracemalloc_started_here = False
+            return peak_memory
+
+    def _save_profile(self, profiler, script_path, timestamp):
+        try:
+            if not os.path.exists(self.profiles_folder):
+                os.makedirs(self.profiles_folder)
+
+            script_name = os.path.splitext(os.path.basename(script_path))[0]
+            profile_path = os.path.join(
+                self.profiles_folder,
+                "{}_{}.pstats".format(script_name, int(timestamp * 1000)),
+            )
+            profiler.dump_stats(profile_path)
+            return profile_path
+        except (IOError, OSError):
+            traceback.print_exc()
@@ -0,0 +1,125 @@
+"""
+Keep unreachable script roots from freezing the panel.
+
+Roots are scanned on a background thread with a deadline. A root that misses its deadline is marked unavailable
+and skipped until its cool-down has passed, then the next scan tries it again.
+"""
+import os
+import threading
+import time
+
+
+class LocalConstants:
+    scan_timeout = 10.0  # seconds
+    cooldown = 120.0  # seconds an unavailable root is skipped for
+
+
+lk = LocalConstants
+
+
+class RootScanTimeout(Exception):
+    pass
+
+
+def normalize_root(path):
+    return os.path.normcase(os.path.abspath(path)).replace("\\", "/").rstrip("/")
+
+
+class RootStatus(object):
+    def __init__(self, reason, retry_time):
+        self.reason = reason
+        self.retry_time = retry_time
+
+    def get_display_text(self):
+        seconds_left = max(0, int(self.retry_time - time.time()))
+        return "{}, retrying in {}s".format(self.reason, seconds_left)
+
+
+class RootCircuitBreaker(object):
+    def __init__(self, cooldown=lk.cooldown):
+        self.cooldown = cooldown
+
+        self._statuses = {}  # {normalized root: RootStatus}
+        self._pending_scans = {}  # {normalized root: thread still stuck on the root}
+        self._lock = threading.Lock()
+
+    def get_status(self, root_folder):
+        """
+        :return: RootStatus if the root is currently being skipped, otherwise None
+        :rtype: RootStatus
+        """
+        root_key = normalize_root(root_folder)
+        with self._lock:
+            status = self._statuses.get(root_key)
+            if status and time.time() >= status.retry_time:
+                # cool-down is over, allow a new attempt
+                del self._statuses[root_key]
+                status = None
+            return status
+
+    def is_available(self, root_folder):
+        return self.get_status(root_folder) is None
+
+    def record_failure(self, root_folder, reason):
+        with self._lock:
+            self._statuses[normalize_root(root_folder)] = RootStatus(reason, time.time() + self.cooldown)
+
+    def record_success(self, root_folder):
+        with self._lock:
+            self._statuses.pop(normalize_root(root_folder), None)
+
+    def is_path_on_unavailable_root(self, path):
+        """
+        Cheap check for paths that live on a skipped root, so they don't need to be touched on disk
+        """
+        with self._lock:
+            if not self._statuses:
+                return False
+            root_keys = list(self._statuses.keys())
+
+        normalized_path = normalize_root(path)
+        for root_key in root_keys:
+            if normalized_path == root_key or normalized_path.startswith(root_key + "/"):
+                return not self.is_available(root_key)
+        return False
+
+    def run_with_deadline(self, root_folder, func, timeout=lk.scan_timeout):
+        """
+        Run func on a background thread and wait at most timeout seconds for it.
+        A thread stuck on a dead mount can't be killed, so no new one is started for the root until it returns.
+
+        :raises RootScanTimeout: if the deadline passed, the root is marked unavailable as well
+        """
+        root_key = normalize_root(root_folder)
+        with self._lock:
+            pending_thread = self._pending_scans.get(root_key)
+        if pending_thread and pending_thread.is_alive():
+            self.record_failure(root_folder, "Still waiting on the previous scan")
+            raise RootScanTimeout(root_folder)
+
+        result = {}
+
+        def run_func():
+            try:
+                result["value"] = func()
+            except Exception as e:
+                result["error"] = e
+
+        scan_thread = threading.Thread(target=run_func, name="script_panel_root_scan")
+        scan_thread.daemon = True
+        scan_thread.start()
+        scan_thread.join(timeout)
+
+        if scan_thread.is_alive():
+            with self._lock:
+                self._pending_scans[root_key] = scan_thread
+            self.record_failure(root_folder, "No response after {}s".format(timeout))
+            raise RootScanTimeout(root_folder)
+
+        with self._lock:
+            self._pending_scans.pop(root_key, None)
+
+        if "error" in result:
+            raise result["error"]
+        self.record_success(root_folder)
+        return result.get("value")
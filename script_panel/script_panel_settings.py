@@ -1,13 +1,20 @@
 __author__ = "Richard Brenick"
 
 # Standard
+import collections
+import copy
 import json
+import marshal
 import os
-import shutil
+import pickle
+import threading
 import time
 import traceback
 
 from script_panel import dcc
+from script_panel import script_panel_layout_journal
+from script_panel import script_panel_store
+from script_panel.script_panel_profiling import replace_file
 from script_panel.ui import ui_utils
 from script_panel.ui.ui_utils import QtCore
 
@@ -17,13 +24,29 @@ dcc_name = dcc_interface.name.lower()
 
 class SettingsConstants:
     default_layout_name = "-user-"
-    backup_folder_name = "_BACKUPS"
+    backup_folder_name = "_BACKUPS"  # deprecated, replaced by the layout journal
+    journal_folder_name = "_JOURNAL"
     active_layout = "active_layout"
     settings_version = "settings_version"
 
     run_script_on_click = "Run Script on Double Click"
     edit_script_on_click = "Edit Script on Double Click"
 
+    autosave_layout = "Autosave Layout"
+    manual_save_layout = "Save Layout Manually"
+    json_layout_format = "Save Layouts as JSON"
+    compact_layout_format = "Save Layouts Compact"
+    adaptive_render_quality = "Lower Quality While Panning"
+    full_render_quality = "Always Full Quality"
+    no_item_cache = "Don't Cache Palette Items"
+    device_item_cache = "Cache Palette Items"
+    painted_palette_buttons = "Painted Palette Buttons"
+    widget_palette_buttons = "Widget Palette Buttons"
+
+    json_layout_extension = ".json"
+    compact_layout_extension = ".layout"  # pickle, faster to load for big palettes
+    pickle_protocol = 2  # the newest protocol python 2 can still read
+
     # layout keys
     layouts = "layouts"
     meta_data = "__meta_data__"
@@ -34,17 +57,161 @@ class SettingsConstants:
     # snippet keys
     snippets = "snippets"
 
-    max_backup_count = 30
+    layout_version = 2
+
+    max_layout_versions = 30
+    layout_version_interval = 60 * 5  # seconds between journal versions recorded by autosaves
+    layout_cache_size = 20
     user_config_json_path = os.path.join(
         os.environ.get("APPDATA"),
         "script_panel",
         "user_config_{}.json".format(dcc_name)
     )
+    run_history_path = os.path.join(
+        os.environ.get("APPDATA"),
+        "script_panel",
+        "run_history_{}.jsonl".format(dcc_name)
+    )
+    run_profiles_folder = os.path.join(
+        os.environ.get("APPDATA"),
+        "script_panel",
+        "run_profiles_{}".format(dcc_name)
+    )
+    sqlite_store_path = os.path.join(
+        os.environ.get("APPDATA"),
+        "script_panel",
+        "script_panel_{}.sqlite3".format(dcc_name)
+    )
+    network_mirrors_folder = os.path.join(
+        os.environ.get("APPDATA"),
+        "script_panel",
+        "network_mirrors_{}".format(dcc_name)
+    )
 
 
 sk = SettingsConstants
 
 
+class LayoutCache(object):
+    """
+    Parsed layout files kept in memory, a layout is read again once its file changes on disk.
+    The least recently used layouts are dropped once there are more than max_size.
+    """
+
+    def __init__(self, max_size=sk.layout_cache_size):
+        self.max_size = max_size
+        self._layouts = collections.OrderedDict()  # {layout path: (file key, layout data)}
+        self._lock = threading.Lock()
+
+    def get(self, layout_path, load_func):
+        """
+        :return: cached layout data, shared between callers so it must not be modified.
+                 None if the file doesn't exist
+        """
+        try:
+            file_stat = os.stat(layout_path)
+        except OSError:
+            self.discard(layout_path)
+            return None
+
+        file_key = (file_stat.st_mtime, file_stat.st_size)
+        with self._lock:
+            cached = self._layouts.pop(layout_path, None)
+            if cached and cached[0] == file_key:
+                self._layouts[layout_path] = cached  # move to the most recently used end
+                return cached[1]
+
+        layout_data = load_func(layout_path)
+
+        with self._lock:
+            self._layouts[layout_path] = (file_key, layout_data)
+            while len(self._layouts) > self.max_size:
+                self._layouts.popitem(last=False)
+        return layout_data
+
+    def discard(self, layout_path):
+        with self._lock:
+            self._layouts.pop(layout_path, None)
+
+
+def upgrade_layout_from_0_to_1(layout_info):
+    """
+    Combine scripts_display and palette_layout
+    """
+    scripts_display = layout_info.get(sk.scripts_display)
+    palette_layout = layout_info.get(sk.palette_layout, dict())
+
+    path_file_mapping = {}
+    for script_path, display_info in scripts_display.items():
+        path_file_mapping[os.path.basename(script_path)] = script_path
+
+    upgraded_palette_layout = {}
+    for script_name, palette_item_info in palette_layout.items():
+        script_path = path_file_mapping.get(script_name)
+        upgraded_item_info = dict(palette_item_info)
+        upgraded_item_info["display_info"] = scripts_display.get(script_path)
+        upgraded_palette_layout[script_path] = upgraded_item_info
+
+    layout_info = dict(layout_info)
+    layout_info[sk.palette_layout] = upgraded_palette_layout
+    return layout_info
+
+
+def upgrade_layout_from_1_to_2(layout_info):
+    # version 2 only added the user to the meta data
+    return layout_info
+
+
+# {version: function upgrading a layout from that version to the next one}
+LAYOUT_UPGRADES = {
+    0: upgrade_layout_from_0_to_1,
+    1: upgrade_layout_from_1_to_2,
+}
+
+
+def upgrade_layout_to_latest(layout_info):
+    """
+    Run the layout through every upgrade after its version. layout_info itself is never modified.
+    Layouts without a version are treated as up to date.
+
+    :return: (layout_info, was_upgraded)
+    """
+    layout_metadata = layout_info.get(sk.meta_data, {})
+    layout_version = layout_metadata.get("version", sk.layout_version)
+    if layout_version >= sk.layout_version:
+        return layout_info, False
+
+    while layout_version < sk.layout_version:
+        layout_info = LAYOUT_UPGRADES[layout_version](layout_info)
+        layout_version += 1
+
+    layout_info = dict(layout_info)
+    layout_info[sk.meta_data] = dict(layout_metadata, version=layout_version)
+    return layout_info, True
+
+
+def get_user_layouts_folder(qsettings):
+    return os.path.join(os.path.dirname(qsettings.fileName()), "{}_layouts".format(dcc_name))
+
+
+def get_store():
+    """
+    The SQLite store if it's enabled, see script_panel_store. The file based data is copied into it on first use.
+
+    :rtype: script_panel_store.ScriptPanelStore
+    """
+    store = script_panel_store.get_store(sk.sqlite_store_path)
+    if store and not store.get_meta(script_panel_store.lk.meta_migrated):
+        qsettings = QtCore.QSettings(QtCore.QSettings.IniFormat, QtCore.QSettings.UserScope,
+                                     "script_panel", "script_panel_{}".format(dcc_name))
+        store.migrate_from_files(
+            layouts_folder=get_user_layouts_folder(qsettings),
+            qsettings=qsettings,
+            run_history_path=sk.run_history_path,
+        )
+    return store
+
+
 class ScriptPanelSettings(ui_utils.BaseSettings):
     __settings_version__ = "1.00.00"
     k_version = "settings_version"
@@ -53,6 +220,14 @@ class ScriptPanelSettings(ui_utils.BaseSettings):
     k_double_click_action = "double_click_action"
     k_skyhook_enabled = "skyhook_enabled"
     k_main_splitter_sizes = "main_splitter_sizes"
+    k_capture_run_profiles = "capture_run_profiles"
+    k_track_run_memory = "track_run_memory"
+    k_pipelines = "pipelines"
+    k_layout_save_mode = "layout_save_mode"
+    k_layout_format = "layout_format"
+    k_render_quality = "palette_render_quality"
+    k_item_cache = "palette_item_cache"
+    k_palette_button_type = "palette_button_type"
 
     def __init__(self, *args, **kwargs):
         super(ScriptPanelSettings, self).__init__(
@@ -61,14 +236,26 @@ class ScriptPanelSettings(ui_utils.BaseSettings):
             "script_panel", "script_panel_{}".format(dcc_name),
             *args, **kwargs)
 
+        # settings and layouts are kept in the SQLite store instead, if it's enabled
+        self.store = get_store()
+
         self.active_layout = self.get_value(sk.active_layout, default=sk.default_layout_name)
 
-        self.user_layouts_folder = os.path.join(os.path.dirname(self.fileName()), "{}_layouts".format(dcc_name))
-        self.layout_backups_folder = os.path.join(self.user_layouts_folder, sk.backup_folder_name)
+        # QSettings can only be read from the UI thread, layouts are also written from the autosave thread
+        self._compact_layout_format = self._read_compact_layout_format()
+
+        self.user_layouts_folder = get_user_layouts_folder(self)
         if not os.path.exists(self.user_layouts_folder):
             os.makedirs(self.user_layouts_folder)
-        if not os.path.exists(self.layout_backups_folder):
-            os.makedirs(self.layout_backups_folder)
+        self._layout_write_lock = threading.Lock()  # layouts can be autosaved from a worker thread
+        self.layout_cache = LayoutCache()
+        self._layout_prefetch_thread = None
+
+        self.layout_journal = script_panel_layout_journal.LayoutJournal(
+            os.path.join(self.user_layouts_folder, sk.journal_folder_name),
+            max_versions=sk.max_layout_versions,
+        )
+        self._layout_version_times = {}  # {layout name: time the last journal version was recorded}
 
         loaded_settings_version = self.get_value(self.k_version, "0")
 
@@ -79,55 +266,215 @@ class ScriptPanelSettings(ui_utils.BaseSettings):
         # stamp version info
         self.setValue(self.k_version, self.__settings_version__)
 
+    def value(self, key, defaultValue=None, *args, **kwargs):
+        if self.store:
+            return self.store.get_setting(key, defaultValue)
+        return super(ScriptPanelSettings, self).value(key, defaultValue, *args, **kwargs)
+
+    def setValue(self, key, value):
+        if self.store:
+            self.store.set_setting(key, value)
+        else:
+            super(ScriptPanelSettings, self).setValue(key, value)
+
+        if key == self.k_layout_format:
+            self._compact_layout_format = self._read_compact_layout_format()
+
+    def remove(self, key):
+        if self.store:
+            self.store.remove_setting(key)
+            return
+        super(ScriptPanelSettings, self).remove(key)
+
+    def sync(self):
+        if self.store:
+            return  # every store write is already committed
+        super(ScriptPanelSettings, self).sync()
+        self._compact_layout_format = self._read_compact_layout_format()
+
     def set_active_layout(self, layout_name):
         self.setValue(sk.active_layout, layout_name)
         self.active_layout = layout_name
 
     def get_layout(self, key):
-        layout_path = os.path.join(self.user_layouts_folder, "{}.json".format(key))
-        return self.get_layout_from_path(layout_path) if os.path.exists(layout_path) else {}
+        """
+        Layouts are served from memory until their file changes. Don't modify the returned data.
+        Layouts from older versions are upgraded and saved back, so they're only upgraded once.
+        """
+        if self.store:
+            layout_data = self.store.get_layout(key)
+        else:
+            layout_data = None
+            for layout_path in self.get_layout_paths(key):
+                layout_data = self.layout_cache.get(layout_path, self.get_layout_from_path)
+                if layout_data is not None:
+                    break
+
+        if layout_data is None:
+            return {}
+
+        layout_data, was_upgraded = upgrade_layout_to_latest(layout_data)
+        if was_upgraded:
+            self.update_layout(key, layout_data)
+        return layout_data
+
+    def is_compact_layout_format(self):
+        """
+        Safe to call from any thread, the setting is only read on the UI thread when it changes
+        """
+        return self._compact_layout_format
+
+    def _read_compact_layout_format(self):
+        return self.get_value(self.k_layout_format, default=sk.json_layout_format) == sk.compact_layout_format
+
+    def get_layout_paths(self, key):
+        """
+        Possible paths of the layout file, the one in the current save format first
+        """
+        extensions = [sk.json_layout_extension, sk.compact_layout_extension]
+        if self.is_compact_layout_format():
+            extensions.reverse()
+        return [os.path.join(self.user_layouts_folder, key + extension) for extension in extensions]
+
+    def export_layout(self, key, export_path):
+        """
+        Write the layout as json, whatever format it's saved in
+        """
+        with open(export_path, "w") as fp:
+            json.dump(self.get_layout(key), fp, indent=2)
+
+    def start_layout_prefetch(self):
+        """
+        Read all layouts into the layout cache on a background thread, so switching between them is instant.
+        Called from the UI thread, the layout paths are worked out here and the thread only reads files.
+        """
+        if self.store or (self._layout_prefetch_thread and self._layout_prefetch_thread.is_alive()):
+            return
+
+        layout_paths = []
+        for layout_name in self.get_layout_names()[:self.layout_cache.max_size]:
+            layout_paths.append(self.get_layout_paths(layout_name))
+
+        self._layout_prefetch_thread = threading.Thread(
+            target=self._prefetch_layouts,
+            args=(layout_paths,),
+            name="script_panel_layouts",
+        )
+        self._layout_prefetch_thread.daemon = True
+        self._layout_prefetch_thread.start()
+
+    def _prefetch_layouts(self, layout_paths):
+        """
+        Only fills the cache, layouts that need an upgrade are upgraded and saved by get_layout on the UI thread
+        """
+        for possible_paths in layout_paths:
+            for layout_path in possible_paths:
+                try:
+                    if self.layout_cache.get(layout_path, self.get_layout_from_path) is not None:
+                        break
+                except Exception:
+                    traceback.print_exc()
 
     @staticmethod
     def get_layout_from_path(path):
+        if path.endswith(sk.compact_layout_extension):
+            with open(path, "rb") as fp:
+                layout_bytes = fp.read()
+            if layout_bytes.startswith(b"\x80"):
+                return pickle.loads(layout_bytes)
+            return marshal.loads(layout_bytes)  # written by older versions, replaced the next time it's saved
+
         with open(path, "r") as fp:
             layout_data = json.load(fp)
         return layout_data
 
-    def update_layout(self, key, new_info=None):
+    def update_layout(self, key, new_info=None, record_version=False):
+        """
+        :param record_version: always add a journal version, otherwise it's only recorded every few minutes
+        """
+        new_info = new_info or dict()
+        if self.store:
+            self.store.set_layout(key, new_info)
+            self._record_layout_version(key, new_info, force=record_version)
+            return
+
+        layout_path, other_format_path = self.get_layout_paths(key)
+        if layout_path.endswith(sk.compact_layout_extension):
+            layout_bytes = pickle.dumps(new_info, sk.pickle_protocol)
+        else:
+            layout_bytes = json.dumps(new_info, indent=2).encode("utf-8")
+
+        # write next to the layout and swap it in, so a crash mid-write can't corrupt it
+        with self._layout_write_lock:
+            temp_path = layout_path + ".tmp"
+            with open(temp_path, "wb") as fp:
+                fp.write(layout_bytes)
+            replace_file(temp_path, layout_path)
+            self.layout_cache.discard(layout_path)
+
+            # the save format was switched, don't leave the old file around to be read instead
+            if os.path.exists(other_format_path):
+                os.remove(other_format_path)
+                self.layout_cache.discard(other_format_path)
+
+        self._record_layout_version(key, new_info, force=record_version)
+
+    def record_layout_version(self, key, new_info):
+        """
+        Add a journal version straight away, for explicit saves
+        """
+        self._record_layout_version(key, new_info, force=True)
+
+    def _record_layout_version(self, key, new_info, force=False):
+        # autosaves run every few seconds while editing, recording each of them would bury the older versions
+        last_record_time = self._layout_version_times.get(key)
+        if not force and last_record_time and time.time() - last_record_time < sk.layout_version_interval:
+            return
+
         try:
-            self.make_layout_backup(key)
+            self.layout_journal.record(key, new_info)
+            self._layout_version_times[key] = time.time()
         except Exception as e:
             traceback.print_exc()
 
-        new_info = new_info or dict()
-        layout_path = os.path.join(self.user_layouts_folder, "{}.json".format(key))
-        with open(layout_path, "w+") as fp:
-            json.dump(new_info, fp, indent=2)
+    def is_layout_autosave_enabled(self):
+        return self.get_value(self.k_layout_save_mode, default=sk.autosave_layout) == sk.autosave_layout
 
-    def make_layout_backup(self, key):
-        layout_path = os.path.join(self.user_layouts_folder, "{}.json".format(key))
-        if not os.path.exists(layout_path):
-            return
+    def is_adaptive_render_quality_enabled(self):
+        return self.get_value(self.k_render_quality, default=sk.adaptive_render_quality) == sk.adaptive_render_quality
+
+    def is_palette_item_cache_enabled(self):
+        return self.get_value(self.k_item_cache, default=sk.no_item_cache) == sk.device_item_cache
 
-        target_backup_folder = os.path.join(self.layout_backups_folder, key)
-        if not os.path.exists(target_backup_folder):
-            os.makedirs(target_backup_folder)
+    def is_painted_palette_buttons_enabled(self):
+        return self.get_value(self.k_palette_button_type,
+                              default=sk.painted_palette_buttons) == sk.painted_palette_buttons
 
-        existing_backups = os.listdir(target_backup_folder)
-        if len(existing_backups) > sk.max_backup_count:
-            old_backup_path = os.path.join(target_backup_folder, existing_backups[0])
-            if os.path.exists(old_backup_path):
-                os.remove(old_backup_path)
+    def get_layout_versions(self, key):
+        """
+        :return: [(version, timestamp)] of the saved versions of this layout, from oldest to newest
+        """
+        return self.layout_journal.get_versions(key)
 
-        backup_path = os.path.join(target_backup_folder, "LAYOUT_BACKUP_{}_{}".format(key, int(time.time())))
-        shutil.copy(layout_path, backup_path)
+    def restore_layout_version(self, key, version):
+        layout_info = self.layout_journal.get_layout_version(key, version)
+        if layout_info is None:
+            return False
+        self.update_layout(key, layout_info, record_version=True)
+        return True
 
     def get_layout_names(self):
-        names = []
-        for file_name in os.listdir(self.user_layouts_folder):
-            if file_name == sk.backup_folder_name:
-                continue
-            names.append(os.path.splitext(file_name)[0])
+        if self.store:
+            names = self.store.get_layout_names()
+        else:
+            names = []
+            for file_name in os.listdir(self.user_layouts_folder):
+                # skips the journal and old backup folders as well
+                layout_name, extension = os.path.splitext(file_name)
+                if extension not in (sk.json_layout_extension, sk.compact_layout_extension):
+                    continue
+                if layout_name not in names:
+                    names.append(layout_name)
 
         # make sure the default layout is there
         if sk.default_layout_name not in names:
@@ -135,8 +482,27 @@ class ScriptPanelSettings(ui_utils.BaseSettings):
 
         return names
 
+    def get_pipelines(self):
+        """
+        Saved lists of scripts to run as a batch, stored as a json string to keep the order intact
+        """
+        pipelines_str = self.get_value(self.k_pipelines, default="")
+        if not pipelines_str:
+            return collections.OrderedDict()
+        return json.loads(pipelines_str, object_pairs_hook=collections.OrderedDict)
+
+    def save_pipeline(self, pipeline_name, script_paths):
+        pipelines = self.get_pipelines()
+        pipelines[pipeline_name] = list(script_paths)
+        self.setValue(self.k_pipelines, json.dumps(pipelines))
+
+    def remove_pipeline(self, pipeline_name):
+        pipelines = self.get_pipelines()
+        pipelines.pop(pipeline_name, None)
+        self.setValue(self.k_pipelines, json.dumps(pipelines))
+
     def remove_script_from_active_layout(self, script_path):
-        layout_info = self.get_layout(self.active_layout)
+        layout_info = copy.deepcopy(self.get_layout(self.active_layout))
 
         scripts_display = layout_info.get(sk.scripts_display, dict())
         if script_path in list(scripts_display.keys()):
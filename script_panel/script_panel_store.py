@@ -0,0 +1,267 @@
+"""
+Single file SQLite store for layouts, UI settings, run history and caches.
+
+The database runs in WAL mode, so several DCC sessions can read while one of them writes.
+Every thread gets its own connection, and writes are done in short transactions.
+
+Enable it with the SCRIPT_PANEL_SQLITE_STORE environment variable, set to 1 for the default location
+or to the path of the database file. The existing layout files, QSettings and run history are copied in
+the first time the store is opened.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+
+class LocalConstants:
+    env_key = "SCRIPT_PANEL_SQLITE_STORE"
+    busy_timeout_ms = 5000
+    schema_version = 1
+
+    # meta keys
+    meta_schema_version = "schema_version"
+    meta_migrated = "migrated_from_files"
+
+
+lk = LocalConstants
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS layouts (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    modified REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS run_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    script_path TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS run_records_script_path ON run_records (script_path);
+CREATE TABLE IF NOT EXISTS caches (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+
+class ScriptPanelStore(object):
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        db_folder = os.path.dirname(db_path)
+        if db_folder and not os.path.exists(db_folder):
+            os.makedirs(db_folder)
+
+        connection = self.get_connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)  # can't run inside a transaction, it commits first
+        with self.transaction() as cursor:
+            cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                           (lk.meta_schema_version, str(lk.schema_version)))
+
+    def get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # autocommit mode, transactions are started explicitly in transaction()
+            connection = sqlite3.connect(self.db_path, timeout=lk.busy_timeout_ms / 1000.0, isolation_level=None)
+            connection.execute("PRAGMA busy_timeout={}".format(lk.busy_timeout_ms))
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def transaction(self):
+        return StoreTransaction(self.get_connection())
+
+    def _fetch_one(self, query, parameters=()):
+        return self.get_connection().execute(query, parameters).fetchone()
+
+    ###########################################################################
+    # meta
+    def get_meta(self, key):
+        row = self._fetch_one("SELECT value FROM meta WHERE key = ?", (key,))
+        return row[0] if row else None
+
+    ###########################################################################
+    # layouts
+    def get_layout(self, name):
+        row = self._fetch_one("SELECT data FROM layouts WHERE name = ?", (name,))
+        return json.loads(row[0]) if row else None
+
+    def set_layout(self, name, layout_data):
+        layout_str = json.dumps(layout_data)
+        with self.transaction() as cursor:
+            cursor.execute("INSERT OR REPLACE INTO layouts (name, data, modified) VALUES (?, ?, ?)",
+                           (name, layout_str, time.time()))
+
+    def remove_layout(self, name):
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM layouts WHERE name = ?", (name,))
+
+    def get_layout_names(self):
+        return [row[0] for row in self.get_connection().execute("SELECT name FROM layouts ORDER BY name")]
+
+    ###########################################################################
+    # settings
+    def get_setting(self, key, default=None):
+        row = self._fetch_one("SELECT value FROM settings WHERE key = ?", (key,))
+        return json.loads(row[0]) if row else default
+
+    def set_setting(self, key, value):
+        with self.transaction() as cursor:
+            cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def remove_setting(self, key):
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM settings WHERE key = ?", (key,))
+
+    def get_setting_keys(self):
+        return [row[0] for row in self.get_connection().execute("SELECT key FROM settings")]
+
+    ###########################################################################
+    # run history
+    def add_run_record(self, script_path, timestamp, record, max_records=None):
+        """
+        :param max_records: drop the oldest records past this amount
+        :return: the records that were dropped
+        """
+        dropped_records = []
+        with self.transaction() as cursor:
+            cursor.execute("INSERT INTO run_records (script_path, timestamp, data) VALUES (?, ?, ?)",
+                           (script_path, timestamp, json.dumps(record)))
+            if max_records:
+                last_id = cursor.lastrowid
+                for row in cursor.execute("SELECT data FROM run_records WHERE id <= ?", (last_id - max_records,)):
+                    dropped_records.append(json.loads(row[0]))
+                cursor.execute("DELETE FROM run_records WHERE id <= ?", (last_id - max_records,))
+        return dropped_records
+
+    def get_run_records(self, script_path=None):
+        if script_path:
+            rows = self.get_connection().execute(
+                "SELECT data FROM run_records WHERE script_path = ? ORDER BY id", (script_path,))
+        else:
+            rows = self.get_connection().execute("SELECT data FROM run_records ORDER BY id")
+        return [json.loads(row[0]) for row in rows]
+
+    ###########################################################################
+    # caches
+    def get_cached(self, namespace, key):
+        row = self._fetch_one("SELECT value FROM caches WHERE namespace = ? AND key = ?", (namespace, key))
+        return json.loads(row[0]) if row else None
+
+    def set_cached(self, namespace, key, value):
+        with self.transaction() as cursor:
+            cursor.execute("INSERT OR REPLACE INTO caches (namespace, key, value) VALUES (?, ?, ?)",
+                           (namespace, key, json.dumps(value)))
+
+    def clear_cache(self, namespace):
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM caches WHERE namespace = ?", (namespace,))
+
+    ###########################################################################
+    # migration
+    def migrate_from_files(self, layouts_folder=None, qsettings=None, run_history_path=None):
+        """
+        Copy the existing file based data into the store, only done once per database
+
+        :type qsettings: QtCore.QSettings
+        :return: True if the migration ran
+        """
+        with self.transaction() as cursor:
+            # checked inside the write transaction, so two sessions starting at once don't both migrate
+            cursor.execute("SELECT value FROM meta WHERE key = ?", (lk.meta_migrated,))
+            if cursor.fetchone():
+                return False
+
+            if layouts_folder and os.path.exists(layouts_folder):
+                for file_name in os.listdir(layouts_folder):
+                    if not file_name.endswith(".json"):
+                        continue
+                    layout_path = os.path.join(layouts_folder, file_name)
+                    try:
+                        with open(layout_path, "r") as fp:
+                            layout_str = json.dumps(json.load(fp))
+                    except (IOError, OSError, ValueError):
+                        traceback.print_exc()
+                        continue
+                    cursor.execute("INSERT OR REPLACE INTO layouts (name, data, modified) VALUES (?, ?, ?)",
+                                   (os.path.splitext(file_name)[0], layout_str, os.path.getmtime(layout_path)))
+
+            if qsettings is not None:
+                for key in qsettings.allKeys():
+                    try:
+                        value_str = json.dumps(qsettings.value(key))
+                    except (TypeError, ValueError):
+                        continue  # not json serializable, like QByteArray window geometry
+                    cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value_str))
+
+            if run_history_path and os.path.exists(run_history_path):
+                with open(run_history_path, "r") as fp:
+                    for line in fp:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        cursor.execute("INSERT INTO run_records (script_path, timestamp, data) VALUES (?, ?, ?)",
+                                       (record.get("script_path", ""), record.get("timestamp", 0.0), line.strip()))
+
+            cursor.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (lk.meta_migrated, str(time.time())))
+        return True
+
+
+class StoreTransaction(object):
+    """
+    BEGIN IMMEDIATE takes the write lock straight away, other sessions wait for it up to the busy timeout
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = None
+
+    def __enter__(self):
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("BEGIN IMMEDIATE")
+        return self.cursor
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type is None:
+            self.cursor.execute("COMMIT")
+        else:
+            self.cursor.execute("ROLLBACK")
+        self.cursor.close()
+        return False
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(default_db_path):
+    """
+    The shared store if it's enabled via the environment variable, otherwise None
+    """
+    global _store
+    env_value = os.environ.get(lk.env_key, "")
+    if not env_value or env_value == "0":
+        return None
+
+    with _store_lock:
+        if _store is None:
+            db_path = default_db_path if env_value == "1" else env_value
+            _store = ScriptPanelStore(db_path)
+    return _store
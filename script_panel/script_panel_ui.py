@@ -6,13 +6,21 @@ import os.path
 import stat
 import subprocess
 import sys
+import time
 from functools import partial
 
 from script_panel import dcc
+from script_panel import script_panel_analysis as spa
+from script_panel import script_panel_batch as spb
+from script_panel import script_panel_profiling as spp
 from script_panel import script_panel_settings as sps
 from script_panel import script_panel_utils as spu
 from script_panel.ui import command_palette
 from script_panel.ui import folder_model
+from script_panel.ui import layout_autosave
+from script_panel.ui import live_mode
+from script_panel.ui import script_scan
+from script_panel.ui import run_stats
 from script_panel.ui import snippet_popup
 from script_panel.ui import ui_utils
 from script_panel.ui.ui_utils import QtCore, QtWidgets, QtGui
@@ -38,10 +46,24 @@ folder_types = spu.FolderTypes
 BACKGROUND_COLOR_FORM = "background-color:rgb({0}, {1}, {2})"
 BACKGROUND_COLOR_GREEN = BACKGROUND_COLOR_FORM.format(46, 113, 46)
 BACKGROUND_COLOR_RED = BACKGROUND_COLOR_FORM.format(161, 80, 55)
-BACKGROUND_COLOR_WARNING_RED = BACKGROUND_COLOR_FORM.format(255, 50, 50)
+MISSING_SCRIPT_COLOR = (255, 50, 50)
+BACKGROUND_COLOR_WARNING_RED = BACKGROUND_COLOR_FORM.format(*MISSING_SCRIPT_COLOR)
+UNAVAILABLE_ROOT_COLOR = "#a15037"
+
+# imports of pinned and most used scripts are preloaded once the panel has been idle for a bit
+PREFETCH_START_DELAY_MS = 2000
+PREFETCH_MOST_USED_COUNT = 10
+
+LAYOUT_HISTORY_MENU_COUNT = 15
+
+# palette scripts are checked again in the background, so moved or deleted scripts get flagged without a reload
+BATCH_POLL_INTERVAL_MS = 50  # checks on out of process batch runs while there's nothing to start
+SCRIPT_REVALIDATE_INTERVAL_MS = 60 * 1000
 
 
 class ScriptPanelWidget(QtWidgets.QWidget):
+    script_checks_received = QtCore.Signal(object)  # {script path: exists}, sent from the checker thread
+
     def __init__(self, *args, **kwargs):
         super(ScriptPanelWidget, self).__init__(*args, **kwargs)
 
@@ -50,6 +72,8 @@ class ScriptPanelWidget(QtWidgets.QWidget):
 
         self.config_data = spu.ConfigurationData()
         self.default_expand_depth = self.config_data.default_expand_depth
+        spu.check_for_config_changes()  # record the starting point for config change notifications
+        spu.config_service.subscribe(self.config_changed)
 
         # palette chooser
         self.ui.palette_chooser.addItems(self.settings.get_layout_names())
@@ -61,6 +85,13 @@ class ScriptPanelWidget(QtWidgets.QWidget):
         self.ui.scripts_TV.setModel(self.proxy)
         self.ui.scripts_TV.setSortingEnabled(True)
         self._model_folders = {}
+        self._model_script_paths = set()
+
+        # script roots are scanned on worker threads, results from refreshes that have been replaced are dropped
+        self.script_scanner = script_scan.ScriptScanner(self)
+        self.script_scanner.root_scanned.connect(self._root_scripts_scanned)
+        self.script_scanner.scan_finished.connect(self._script_scan_finished)
+        self._script_scan_id = None
 
         # connect signals
         self.ui.search_LE.textChanged.connect(self.filter_scripts)
@@ -72,6 +103,30 @@ class ScriptPanelWidget(QtWidgets.QWidget):
         self.ui.add_palette_BTN.clicked.connect(self.add_palette_layout)
         self.ui.save_palette_BTN.clicked.connect(self.save_favorites_layout)
         self.ui.load_palette_BTN.clicked.connect(self.load_current_layout)
+        self.ui.bottom_tab_widget.currentChanged.connect(self._bottom_tab_changed)
+        self.ui.run_stats_widget.capture_profiles_toggled.connect(self.set_capture_run_profiles)
+        self.ui.run_stats_widget.track_memory_toggled.connect(self.set_track_run_memory)
+
+        # layout autosave
+        self.layout_autosaver = layout_autosave.LayoutAutosaver(
+            save_func=self.settings.update_layout,
+            get_layout_func=self._get_current_layout_settings,
+            parent=self,
+        )
+        self.layout_autosaver.layout_saved.connect(self._layout_autosaved)
+        self.layout_autosaver.save_failed.connect(self._layout_autosave_failed)
+        self.ui.layout_save_required_changed.connect(self._layout_save_required_changed)
+        self.ui.command_palette_widget.layout_changed.connect(self._palette_layout_changed)
+        self.layout_autosave_enabled = self.settings.is_layout_autosave_enabled()
+        self.ui.command_palette_widget.widget_factory = self.create_palette_widget
+
+        # missing script checks
+        self.script_checks_received.connect(self._script_checks_done)  # queued over to the UI thread
+        spu.script_checker.subscribe(self._script_checks_received)
+        self._script_revalidate_timer = QtCore.QTimer(self)
+        self._script_revalidate_timer.setInterval(SCRIPT_REVALIDATE_INTERVAL_MS)
+        self._script_revalidate_timer.timeout.connect(self.revalidate_palette_scripts)
+        self._script_revalidate_timer.start()
 
         # right click menus
         self.ui.scripts_TV.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
@@ -80,16 +135,36 @@ class ScriptPanelWidget(QtWidgets.QWidget):
         self.ui.command_palette_widget.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self.ui.command_palette_widget.customContextMenuRequested.connect(self.build_palette_context_menu)
 
+        # live mode
+        self.live_runner = live_mode.LiveScriptRunner(self)
+        self.live_runner.run_finished.connect(self._live_run_finished)
+        self.live_runner.run_failed.connect(self._live_run_failed)
+        self.live_runner.compile_failed.connect(self._live_compile_failed)
+        self.ui.live_stop_BTN.clicked.connect(self.stop_live_mode)
+
         # shortcuts
         self.snippet_shortcut = None
         self.register_snippet_shortcut()
         self.setup_palette_shortcuts()
 
         # build ui
+        self.apply_palette_render_settings()
         self.load_current_layout()
         self.refresh_scripts()
         self.load_settings()
 
+        self._import_prefetcher = None
+        self._prefetch_timer = QtCore.QTimer(self)
+        self._prefetch_timer.setInterval(0)
+        self._prefetch_timer.timeout.connect(self._prefetch_next_main_thread_import)
+        QtCore.QTimer.singleShot(PREFETCH_START_DELAY_MS, self.start_import_prefetch)
+        QtCore.QTimer.singleShot(PREFETCH_START_DELAY_MS, self.settings.start_layout_prefetch)
+
+        self._batch_runner = None
+        self._batch_timer = QtCore.QTimer(self)
+        self._batch_timer.setSingleShot(True)
+        self._batch_timer.timeout.connect(self._run_batch_step)
+
         main_layout = QtWidgets.QVBoxLayout()
         main_layout.setContentsMargins(2, 2, 2, 2)
         main_layout.addWidget(self.ui)
@@ -118,12 +193,13 @@ class ScriptPanelWidget(QtWidgets.QWidget):
         load_layout_hotkey.setContext(QtCore.Qt.WidgetShortcut)
 
     def register_snippet_shortcut(self):
-        # already registered, no need to do it again
+        snippet_key = self.config_data.get_user_data().get(spu.lk.snippet_shortcut) or spu.lk.default_snippet_shortcut
+
+        # already registered, only the key might need updating
         if self.snippet_shortcut:
+            self.snippet_shortcut.setKey(QtGui.QKeySequence(snippet_key))
             return
 
-        snippet_key = self.config_data.get_user_data().get(spu.lk.snippet_shortcut, spu.lk.default_snippet_shortcut)
-
         snippet_shortcut = QtWidgets.QShortcut(
             QtGui.QKeySequence(snippet_key),
             ui_utils.get_app_window(),
@@ -135,6 +211,7 @@ class ScriptPanelWidget(QtWidgets.QWidget):
 
     def build_context_menu(self):
         selected_path = self.ui.scripts_TV.get_selected_script_paths(allow_folders=True)
+        selected_scripts = self.ui.scripts_TV.get_selected_script_paths(allow_folders=False)
 
         # right click menu
         script_panel_context_actions = []
@@ -150,10 +227,26 @@ class ScriptPanelWidget(QtWidgets.QWidget):
                 script_panel_context_actions.extend([
                     {"Run": self.activate_script},
                     {"Edit": self.open_script_in_editor},
+                    {"Live Mode - Rerun on Save": self.start_live_mode},
                     {"Create Hotkey / Shelf button": self.open_hotkey_editor},
                     "-",
                 ])
 
+        if len(selected_scripts) > 1:
+            script_panel_context_actions.extend([
+                {"Run Selected ({})".format(len(selected_scripts)): partial(self.run_scripts_batch, selected_scripts)},
+                {"Save Selected as Pipeline": partial(self.save_pipeline, selected_scripts)},
+                "-",
+            ])
+
+        pipelines = self.settings.get_pipelines()
+        if pipelines:
+            script_panel_context_actions.extend([
+                {"Run Pipeline": [{name: partial(self.run_scripts_batch, paths)} for name, paths in pipelines.items()]},
+                {"Remove Pipeline": [{name: partial(self.settings.remove_pipeline, name)} for name in pipelines]},
+                "-",
+            ])
+
         script_panel_context_actions.extend([
             {"RADIO_SETTING": {"settings": self.settings,
                                "settings_key": self.settings.k_double_click_action,
@@ -169,7 +262,7 @@ class ScriptPanelWidget(QtWidgets.QWidget):
 
         selected_items = self.ui.command_palette_widget.get_selected_items()
         if len(selected_items) == 1:
-            selected_script_widget = selected_items[-1].wrapped_widget  # type: ScriptWidget
+            selected_script_widget = selected_items[-1].wrapped_widget  # type: ScriptDisplayMixin
         else:
             selected_script_widget = None
 
@@ -186,6 +279,41 @@ class ScriptPanelWidget(QtWidgets.QWidget):
                 {"Reset Grid - Color": self.ui.command_palette_widget.reset_grid_color},
                 {"Reset Grid": self.ui.command_palette_widget.reset_grid_display},
             ]},
+            {"Layout History": self.get_layout_history_actions()},
+            {"Layout Saving": [
+                {"RADIO_SETTING": {"settings": self.settings,
+                                   "settings_key": self.settings.k_layout_save_mode,
+                                   "choices": [sps.sk.autosave_layout, sps.sk.manual_save_layout],
+                                   "default": sps.sk.autosave_layout,
+                                   }},
+                "-",
+                {"RADIO_SETTING": {"settings": self.settings,
+                                   "settings_key": self.settings.k_layout_format,
+                                   "choices": [sps.sk.json_layout_format, sps.sk.compact_layout_format],
+                                   "default": sps.sk.json_layout_format,
+                                   }},
+                "-",
+                {"Export Layout as JSON": self.export_layout},
+            ]},
+            {"Rendering": [
+                {"RADIO_SETTING": {"settings": self.settings,
+                                   "settings_key": self.settings.k_render_quality,
+                                   "choices": [sps.sk.adaptive_render_quality, sps.sk.full_render_quality],
+                                   "default": sps.sk.adaptive_render_quality,
+                                   }},
+                "-",
+                {"RADIO_SETTING": {"settings": self.settings,
+                                   "settings_key": self.settings.k_item_cache,
+                                   "choices": [sps.sk.no_item_cache, sps.sk.device_item_cache],
+                                   "default": sps.sk.no_item_cache,
+                                   }},
+                "-",
+                {"RADIO_SETTING": {"settings": self.settings,
+                                   "settings_key": self.settings.k_palette_button_type,
+                                   "choices": [sps.sk.painted_palette_buttons, sps.sk.widget_palette_buttons],
+                                   "default": sps.sk.painted_palette_buttons,
+                                   }},
+            ]},
         ]
 
         if selected_script_widget:
@@ -205,6 +333,63 @@ class ScriptPanelWidget(QtWidgets.QWidget):
             ])
 
         ui_utils.build_menu_from_action_list(action_list, extra_trigger=partial(self.ui.display_layout_save_required))
+        self.layout_autosave_enabled = self.settings.is_layout_autosave_enabled()
+        self.apply_palette_render_settings()
+        self.apply_palette_button_type()
+
+    def apply_palette_render_settings(self):
+        self.ui.command_palette_widget.set_render_settings(
+            adaptive_quality=self.settings.is_adaptive_render_quality_enabled(),
+            cache_items=self.settings.is_palette_item_cache_enabled(),
+        )
+
+    def get_palette_button_cls(self):
+        if self.settings.is_painted_palette_buttons_enabled():
+            return ScriptButtonItem
+        return ScriptWidget
+
+    def apply_palette_button_type(self):
+        """
+        Rebuild the palette if its buttons aren't of the chosen type, unsaved edits are kept
+        """
+        button_cls = self.get_palette_button_cls()
+        if any(type(w) is not button_cls for w in self.ui.command_palette_widget.scene_widgets):
+            self.ui.command_palette_widget.recreate_widgets()
+
+    def export_layout(self):
+        current_layout = self.ui.palette_chooser.currentText()
+        export_path, __ = QtWidgets.QFileDialog.getSaveFileName(
+            self,
+            "Export Layout",
+            "{}.json".format(current_layout),
+            "JSON (*.json)",
+        )
+        if not export_path:
+            return
+
+        self.layout_autosaver.flush()
+        self.settings.export_layout(current_layout, export_path)
+        print("Command Palette - layout: '{}' exported to {}".format(current_layout, export_path))
+
+    def get_layout_history_actions(self):
+        current_layout = self.ui.palette_chooser.currentText()
+        layout_versions = self.settings.get_layout_versions(current_layout)
+
+        history_actions = []
+        for version, timestamp in reversed(layout_versions[-LAYOUT_HISTORY_MENU_COUNT:]):
+            version_label = "Restore - {}".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)))
+            history_actions.append({version_label: partial(self.restore_layout_version, current_layout, version)})
+        return history_actions
+
+    def restore_layout_version(self, layout_name, version):
+        # don't let a pending autosave overwrite the restored version
+        self.layout_autosaver.cancel()
+        self.layout_autosaver.flush()
+
+        if not self.settings.restore_layout_version(layout_name, version):
+            return
+        self.load_layout_settings(layout_name)
+        print("Command Palette - layout: '{}' restored to version {}".format(layout_name, version))
 
     def open_snippet_popup(self):
         snippet_data = self.config_data.user_snippets.copy()
@@ -221,23 +406,119 @@ class ScriptPanelWidget(QtWidgets.QWidget):
             skyhook_enabled = self.settings.get_value(self.settings.k_skyhook_enabled, default=False)
             self.ui.skyhook_blender_BTN.setChecked(skyhook_enabled)
 
+        capture_profiles = self.settings.get_value(self.settings.k_capture_run_profiles, default=False)
+        self.ui.run_stats_widget.set_capture_profiles(capture_profiles)
+
+        track_memory = self.settings.get_value(self.settings.k_track_run_memory, default=False)
+        self.ui.run_stats_widget.set_track_memory(track_memory)
+
     def save_settings(self):
+        if self._import_prefetcher:
+            self._import_prefetcher.stop()
+            self._prefetch_timer.stop()
+        self.layout_autosaver.flush()
         self.settings.setValue(self.settings.k_main_splitter_sizes, self.ui.main_splitter.sizes())
         self.settings.setValue(self.settings.k_skyhook_enabled, self.ui.skyhook_blender_BTN.isChecked())
 
+    def shutdown(self):
+        """
+        Called when the panel closes, pending layout saves are written before it goes
+        """
+        self._batch_timer.stop()  # scripts of a batch that haven't started yet won't run
+        self._batch_runner = None
+        self.save_settings()
+        self.layout_autosaver.shutdown()
+
+    def set_capture_run_profiles(self, state):
+        spu.run_tracker.capture_profile = state
+        self.settings.setValue(self.settings.k_capture_run_profiles, state)
+
+    def set_track_run_memory(self, state):
+        spu.run_tracker.track_memory = state
+        self.settings.setValue(self.settings.k_track_run_memory, state)
+
+    def _bottom_tab_changed(self):
+        if self.ui.bottom_tab_widget.currentWidget() == self.ui.run_stats_widget:
+            self.ui.run_stats_widget.refresh()
+
+    def start_import_prefetch(self):
+        """
+        Preload modules imported by the pinned and most used scripts on a worker thread,
+        DCC packages that have to be imported on the UI thread get one import per idle event loop pass
+        """
+        script_imports = spa.get_imports_for_scripts(self.get_prefetch_script_paths())
+        self._import_prefetcher = spa.ImportPrefetcher(
+            script_imports,
+            time_budget=self.config_data.prefetch_time_budget,
+        )
+        self._import_prefetcher.start()
+        self._prefetch_timer.start()
+
+    def _prefetch_next_main_thread_import(self):
+        if not self._import_prefetcher.prefetch_next_on_main_thread():
+            self._prefetch_timer.stop()
+
+    def get_prefetch_script_paths(self):
+        script_paths = self.ui.command_palette_widget.get_palette_ids()
+
+        script_stats = spu.run_tracker.history.get_script_stats()
+        most_used_paths = sorted(script_stats.keys(), key=lambda p: script_stats[p][spp.lk.runs], reverse=True)
+        for script_path in most_used_paths[:PREFETCH_MOST_USED_COUNT]:
+            if script_path not in script_paths:
+                script_paths.append(script_path)
+
+        return script_paths
+
     def config_refresh(self):
         self.config_data.refresh_config()
+        self.default_expand_depth = self.config_data.default_expand_depth
         self.refresh_scripts()
 
+    def config_changed(self, changed_keys):
+        """
+        Only rebuild the parts of the panel affected by the changed config keys
+        """
+        self.config_data.refresh_config()
+        self.default_expand_depth = self.config_data.default_expand_depth
+
+        if spu.lk.paths in changed_keys or spu.lk.extension_handlers in changed_keys:
+            self.refresh_scripts()
+        elif spu.lk.default_indent in changed_keys:
+            self.filter_scripts()
+
+        if spu.lk.snippet_shortcut in changed_keys:
+            self.register_snippet_shortcut()
+
     def refresh_scripts(self):
         self.model.clear()
         self.model.setHorizontalHeaderLabels(["Name"])
         self._model_folders = {}
+        self._model_script_paths = set()
 
-        # then add normal scripts
-        for script_path, path_info in spu.get_scripts(config_data=self.config_data).items():
+        # each root fills in the tree as soon as it's been scanned
+        self._script_scan_id = self.script_scanner.start(self.config_data.path_data)
+
+    def _root_scripts_scanned(self, scan_id, script_paths):
+        if scan_id != self._script_scan_id:
+            return
+
+        for script_path, path_info in script_paths.items():
+            if script_path in self._model_script_paths:
+                continue  # overlapping roots, the script is already listed
+            self._model_script_paths.add(script_path)
             self.add_script_to_model(script_path, path_info)
+        self.update_script_tree()
+
+    def _script_scan_finished(self, scan_id):
+        if scan_id != self._script_scan_id:
+            return
 
+        # roots that timed out during this scan are only marked as unavailable once it's done
+        for path_data, root_status in spu.get_unavailable_roots(self.config_data):
+            self.add_unavailable_root_to_model(path_data, root_status)
+        self.update_script_tree()
+
+    def update_script_tree(self):
         self.ui.scripts_TV.expandToDepth(self.default_expand_depth)
         self.ui.scripts_TV.sortByColumn(0, QtCore.Qt.AscendingOrder)
         header = self.ui.scripts_TV.header()
@@ -308,9 +589,29 @@ class ScriptPanelWidget(QtWidgets.QWidget):
 
         parent_item.appendRow(item)
 
+    def add_unavailable_root_to_model(self, path_data, root_status):
+        root_dir = os.path.abspath(path_data.get(spu.lk.path_root_dir))
+        root_type = path_data.get(spu.lk.root_type)
+        display_name = path_data.get(spu.lk.folder_display_prefix) or os.path.basename(root_dir)
+
+        root_item = QtGui.QStandardItem("{} (unavailable)".format(display_name))
+        root_item.setIcon(icons.get_root_folder_icon_for_type(root_type))
+        root_item.setToolTip("{}\n{}".format(root_dir, root_status.get_display_text()))
+        root_item.setForeground(QtGui.QBrush(QtGui.QColor(UNAVAILABLE_ROOT_COLOR)))
+        root_item.setData(folder_model.PathData(relative_path="",
+                                                full_path=root_dir,
+                                                is_folder=True,
+                                                root_type=root_type,
+                                                ), QtCore.Qt.UserRole)
+        self.model.appendRow(root_item)
+
     def save_favorites_layout(self):
         current_layout = self.ui.palette_chooser.currentText()
-        self.settings.update_layout(current_layout, self._get_current_layout_settings())
+
+        # goes through the autosave worker, so it can't be overwritten by an older autosave still being written
+        self.layout_autosaver.schedule(current_layout)
+        self.layout_autosaver.flush()
+        self.settings.record_layout_version(current_layout, self._get_current_layout_settings())
         self.ui.display_layout_save_required(False)
         self.save_settings()
         print("Command Palette - layout: '{}' saved".format(current_layout))
@@ -318,19 +619,42 @@ class ScriptPanelWidget(QtWidgets.QWidget):
     def _get_current_layout_settings(self):
         ui_info = dict()
         ui_info[sps.sk.meta_data] = {
-            "version": 2,
+            "version": sps.sk.layout_version,
             "user": os.getenv("USERNAME"),
         }
         ui_info[sps.sk.palette_layout] = self.ui.command_palette_widget.get_scene_layout()
         ui_info[sps.sk.palette_display] = self.ui.command_palette_widget.get_ui_settings()
         return ui_info
 
+    def _palette_layout_changed(self):
+        """
+        Sent for every move while items are dragged, so this has to stay cheap
+        """
+        self.ui.display_layout_save_required(True)
+        if self.layout_autosave_enabled:
+            self.layout_autosaver.schedule(self.ui.palette_chooser.currentText())
+
+    def _layout_save_required_changed(self, needs_save):
+        if needs_save and self.layout_autosave_enabled:
+            self.layout_autosaver.schedule(self.ui.palette_chooser.currentText())
+
+    def _layout_autosaved(self, layout_name):
+        if layout_name == self.ui.palette_chooser.currentText():
+            self.ui.display_layout_save_required(False)
+
+    def _layout_autosave_failed(self, layout_name, error):
+        logging.error("Command Palette - autosave of layout: '{}' failed\n{}".format(layout_name, error))
+
     def _palette_chooser_index_change(self):
+        # the palette still shows the previous layout, save its pending edits before it's cleared
+        self.layout_autosaver.save_pending()
+
         current_layout = self.ui.palette_chooser.currentText()
         self.settings.set_active_layout(current_layout)
         self.load_layout_settings(current_layout)
 
     def load_current_layout(self):
+        self.layout_autosaver.cancel()  # reloading throws away unsaved edits
         self.settings.sync()  # sync from disk
         current_layout = self.ui.palette_chooser.currentText()
         self.load_layout_settings(current_layout)
@@ -338,44 +662,77 @@ class ScriptPanelWidget(QtWidgets.QWidget):
         self.ui.display_layout_save_required(False)
 
     def load_layout_settings(self, layout_key=None):
-        self.ui.command_palette_widget.clear()
-        layout_info = self.settings.get_layout(layout_key)
+        with self.ui.command_palette_widget.blocked_layout_signals():
+            self.populate_palette(self.settings.get_layout(layout_key))
 
-        layout_info = upgrade_layout_settings_to_latest(layout_info)
+    def populate_palette(self, layout_info):
+        self.ui.command_palette_widget.clear()
 
         palette_layout = layout_info.get(sps.sk.palette_layout, dict())
         palette_display = layout_info.get(sps.sk.palette_display, dict())
 
+        # placeholders, the buttons are created once they come into view
         for script_path, palette_item_info in palette_layout.items():
-            self.add_script_to_layout(
-                script_path=script_path,
+            self.ui.command_palette_widget.add_widget(
+                internal_id=script_path,
+                display_name=os.path.basename(script_path),
                 display_info=palette_item_info.get("display_info"),
             )
 
         self.ui.command_palette_widget.set_ui_settings(palette_display)
         self.ui.command_palette_widget.set_scene_layout(palette_layout)
+        spu.script_checker.request(self.ui.command_palette_widget.get_palette_ids())
 
     def open_favorites_script_in_editor(self):
         for item in self.ui.command_palette_widget.get_selected_items():  # type: command_palette.PaletteRectItem
-            script_widget = item.wrapped_widget  # type: ScriptWidget
-            self.open_script_in_editor(script_widget.script_path)
-
-    def add_script_to_layout(self, script_path, display_info=None):
-        script_widget = ScriptWidget(script_path)
-        script_widget.script_clicked.connect(self.activate_script)
-        if display_info:
-            script_widget.set_display_from_info(display_info)
+            script_path = item.get_palette_info()[0]
+            self.open_script_in_editor(script_path)
 
+    def add_script_to_layout(self, script_path, display_info=None, find_free_space=True):
         script_name = os.path.basename(script_path)
         self.ui.command_palette_widget.add_widget(
             internal_id=script_path,
             display_name=script_name,
-            widget=script_widget,
+            widget=self.create_palette_widget(script_path, display_info),
             pos=self.ui.command_palette_widget.get_mouse_pos(),
+            find_free_space=find_free_space,
         )
 
-        if not os.path.exists(script_path):
+    def create_palette_widget(self, script_path, display_info=None, recycled_widget=None):
+        """
+        Widget factory of the palette, reuses the recycled widget if it's of the current button type
+        """
+        button_cls = self.get_palette_button_cls()
+        if type(recycled_widget) is button_cls:
+            script_widget = recycled_widget
+            script_widget.set_script(script_path)
+            script_widget.set_display_from_info(display_info or dict())
+        else:
+            script_widget = button_cls(script_path)
+            script_widget.script_clicked.connect(self.activate_script)
+            if display_info:
+                script_widget.set_display_from_info(display_info)
+
+        # unchecked paths show as available until the checker says otherwise
+        script_exists = spu.script_checker.get_known(script_path)
+        if script_exists is None:
+            spu.script_checker.request([script_path])
+        elif not script_exists:
             script_widget.set_is_missing_script(True)
+        return script_widget
+
+    def revalidate_palette_scripts(self):
+        spu.script_checker.request(self.ui.command_palette_widget.get_palette_ids(), recheck=True)
+
+    def _script_checks_received(self, results):
+        self.script_checks_received.emit(results)
+
+    def _script_checks_done(self, results):
+        # placeholders pick up their state when their widget is created
+        for script_widget in self.ui.command_palette_widget.scene_widgets:  # type: ScriptDisplayMixin
+            script_exists = results.get(script_widget.script_path)
+            if script_exists is not None and script_widget.is_missing_script == script_exists:
+                script_widget.set_is_missing_script(not script_exists)
 
     def add_palette_layout(self):
         new_layout_name, ok = QtWidgets.QInputDialog.getText(
@@ -415,12 +772,86 @@ class ScriptPanelWidget(QtWidgets.QWidget):
             if not script_path:
                 return
 
-        if sp_skyhook:
-            if self.ui.skyhook_blender_BTN.isChecked():
-                sp_skyhook.run_script_in_blender(script_path)
+        trigger_func = self.get_script_trigger_func()
+        trigger_func(script_path)
+
+    def start_live_mode(self, script_path=None):
+        if not script_path:
+            script_path = self.get_selected_script_path()
+            if not script_path:
                 return
 
-        spu.file_triggered(script_path)
+        self.ui.set_live_status("LIVE - watching {}".format(os.path.basename(script_path)))
+        self.live_runner.start(script_path)
+
+    def stop_live_mode(self):
+        self.live_runner.stop()
+        self.ui.set_live_status(None)
+
+    def _live_run_finished(self, script_path, run_time):
+        self.ui.set_live_status("LIVE - {} ran in {:.1f} ms".format(os.path.basename(script_path), run_time * 1000))
+
+    def _live_run_failed(self, script_path, error):
+        sys.stderr.write(error)
+        error_line = error.strip().splitlines()[-1] if error.strip() else ""
+        self.ui.set_live_status("LIVE - {} failed: {}".format(os.path.basename(script_path), error_line), is_error=True)
+
+    def _live_compile_failed(self, script_path, error):
+        self.ui.set_live_status("LIVE - {} does not compile: {}".format(os.path.basename(script_path), error),
+                                is_error=True)
+
+    def run_scripts_batch(self, script_paths):
+        """
+        Run scripts in order, scripts marked as independent run concurrently when they run out of process
+        """
+        if self._batch_runner:
+            logging.warning("A batch run is already in progress")
+            return
+
+        missing_paths = [p for p in script_paths if not os.path.exists(p)]
+        if missing_paths:
+            show_warning_path_does_not_exist(missing_paths[0])
+            return
+
+        # scripts running in process have to stay on the UI thread,
+        # so the batch is stepped from a timer and the event loop runs between scripts, never during one
+        self._batch_runner = spb.BatchRunner(script_paths, trigger_func=self.get_script_trigger_func())
+        self._batch_timer.start(0)
+
+    def _run_batch_step(self):
+        batch_runner = self._batch_runner
+        if batch_runner is None:
+            return
+
+        try:
+            is_running = batch_runner.step()
+        except Exception:
+            is_running = False
+            logging.exception("Batch run stopped")
+
+        if is_running:
+            self._batch_timer.start(BATCH_POLL_INTERVAL_MS if batch_runner.is_waiting() else 0)
+            return
+
+        self._batch_runner = None
+        spb.print_batch_report(batch_runner.report)
+        show_batch_report(batch_runner.report)
+
+    def get_script_trigger_func(self):
+        if sp_skyhook and self.ui.skyhook_blender_BTN.isChecked():
+            return sp_skyhook.run_script_in_blender
+        return spu.file_triggered
+
+    def save_pipeline(self, script_paths):
+        pipeline_name, ok = QtWidgets.QInputDialog.getText(
+            self,
+            "Pipeline Name",
+            "Enter a name for this pipeline of {} scripts".format(len(script_paths)),
+            QtWidgets.QLineEdit.Normal,
+        )
+        if not ok or not pipeline_name:
+            return
+        self.settings.save_pipeline(pipeline_name, script_paths)
 
     def open_script_in_editor(self, script_path=None):
         if not script_path:
@@ -514,33 +945,54 @@ class ScriptPanelWidget(QtWidgets.QWidget):
         return selected_scripts_data[0]  # type: folder_model.PathData
 
 
-class ScriptWidget(QtWidgets.QWidget):
-    script_clicked = QtCore.Signal(str)
-
-    def __init__(self, script_path="ExampleScript.py", *args, **kwargs):
-        super(ScriptWidget, self).__init__(*args, **kwargs)
+class ScriptDisplayMixin(object):
+    """
+    Display settings of a script in the palette, shared by the widget and painted button types.
+    Subclasses show the state in their apply_ methods, the defaults here don't display anything.
+    """
 
+    def init_script_display(self, script_path):
         self.palette_id = script_path  # very important for saving and loading layouts
 
         self.script_path = script_path
         self.script_name = os.path.basename(script_path)
         self.display_color = None
         self.icon_path = None
+        self.requested_icon_path = None  # same as icon_path, or the icon being loaded in the background
         self.display_label = self.script_name
+        self.is_missing_script = False
+        self.default_icon = icons.get_script_icon_for_type(script_path)
 
-        self.trigger_btn = ui_utils.ScaledContentPushButton(parent=self)
-        self.trigger_btn.setSizePolicy(QtWidgets.QSizePolicy.Ignored, QtWidgets.QSizePolicy.Ignored)
-        self.trigger_btn.setText(self.display_label)
-        self.trigger_btn.clicked.connect(self.activate_script)
-        self.trigger_btn.setToolTip(self.script_name)
+    def set_script(self, script_path):
+        """
+        Point the button at another script, used when it's recycled by the palette
+        """
+        self.init_script_display(script_path)
+        self.apply_tooltip(self.script_name)
 
-        self.default_icon = icons.get_script_icon_for_type(script_path)
-        self.trigger_btn.setIcon(self.default_icon)
+    def apply_display_label(self, text):
+        """
+        Show the text on the button
+        """
+        pass
 
-        main_layout = QtWidgets.QHBoxLayout()
-        main_layout.addWidget(self.trigger_btn)
-        main_layout.setContentsMargins(0, 0, 0, 0)
-        self.setLayout(main_layout)
+    def apply_tooltip(self, text):
+        """
+        Show the text when hovering over the button
+        """
+        pass
+
+    def apply_display_color(self, color):
+        """
+        :param color: (r, g, b) or None for the default color
+        """
+        pass
+
+    def apply_icon(self, q_icon):
+        """
+        Show the icon on the button, an empty QIcon clears it
+        """
+        pass
 
     def activate_script(self):
         self.script_clicked.emit(self.script_path)
@@ -549,7 +1001,7 @@ class ScriptWidget(QtWidgets.QWidget):
         return {
             "label": self.display_label,
             "color": self.display_color,
-            "icon_path": self.icon_path,
+            "icon_path": self.requested_icon_path,  # a save while the icon is loading keeps it
         }
 
     def set_display_from_info(self, display_info):
@@ -572,20 +1024,18 @@ class ScriptWidget(QtWidgets.QWidget):
     #########################################
     # Display utility functions
     def open_label_editor(self):
-        current_text = self.trigger_btn.text()
         new_text, ok = QtWidgets.QInputDialog.getText(
             ui_utils.get_app_window(),
             "New Display Label",
             "Enter new display label for: {}".format(self.script_name),
-            text=current_text,
+            text=self.display_label,
         )
         if ok:
             self.set_display_label(new_text)
 
     def set_display_label(self, text):
         self.display_label = text
-        self.trigger_btn.setText(text)
-        self.trigger_btn.update_content_size()
+        self.apply_display_label(text)
 
     def update_script_path(self):
         selected_file, _ = QtWidgets.QFileDialog.getOpenFileName(
@@ -597,6 +1047,7 @@ class ScriptWidget(QtWidgets.QWidget):
             self.script_path = selected_file
             self.script_name = os.path.basename(selected_file)
             self.palette_id = selected_file  # very important for saving and loading layouts
+            self.apply_tooltip(self.script_name)
             self.set_is_missing_script(False)
 
     def open_display_color_picker(self):
@@ -614,14 +1065,9 @@ class ScriptWidget(QtWidgets.QWidget):
 
     def update_display_color(self, color):
         """Change the display of the background color"""
-        if not color:
-            self.trigger_btn.setStyleSheet("")
-            return
-
         if isinstance(color, QtGui.QColor):
             color = color.getRgb()[:3]
-
-        self.trigger_btn.setStyleSheet(BACKGROUND_COLOR_FORM.format(*color))
+        self.apply_display_color(color)
 
     def open_icon_browser(self):
         selected_file, _ = QtWidgets.QFileDialog.getOpenFileName(
@@ -641,34 +1087,105 @@ class ScriptWidget(QtWidgets.QWidget):
         self.set_icon_from_path("EMPTY")
 
     def set_icon_from_path(self, icon_path):
+        self.requested_icon_path = icon_path
+
         if icon_path == "EMPTY":
             self.icon_path = icon_path
-            self.trigger_btn.setIcon(QtGui.QIcon())
+            self.apply_icon(QtGui.QIcon())
             return
 
         if not icon_path:
             self.icon_path = icon_path
-            self.trigger_btn.setIcon(self.default_icon)
+            self.apply_icon(self.default_icon)
             return
 
-        try:
-            q_icon = ui_utils.create_qicon(icon_path)
-            if q_icon:
-                self.trigger_btn.setIcon(q_icon)
-                self.icon_path = icon_path
-        except Exception as e:
-            logging.warning("Unable to set icon: ", e)
+        # read in the background, buttons using the same icon share it.
+        # icon_path only changes once it has loaded, a broken path goes back to the icon that's showing
+        ui_utils.icon_cache.request_icon(ui_utils.resolve_icon_path(icon_path), partial(self._icon_loaded, icon_path))
+
+    def _icon_loaded(self, icon_path, resolved_icon_path, q_icon):
+        if not ui_utils.isValid(self) or icon_path != self.requested_icon_path:
+            return  # deleted, or another icon was asked for since
+        if q_icon is None:
+            logging.warning("Unable to set icon: {}".format(icon_path))
+            self.requested_icon_path = self.icon_path
+            return
+        self.icon_path = icon_path
+        self.apply_icon(q_icon)
 
     def set_is_missing_script(self, missing_script):
+        self.is_missing_script = missing_script
         if missing_script:
-            self.trigger_btn.setText(self.display_label + "\nMISSING SCRIPT PATH")
-            self.trigger_btn.setStyleSheet(BACKGROUND_COLOR_WARNING_RED)
+            self.apply_display_label(self.display_label + "\nMISSING SCRIPT PATH")
+            self.apply_display_color(MISSING_SCRIPT_COLOR)
         else:
-            self.trigger_btn.setText(self.display_label)
-            self.set_display_color(self.display_color)
+            self.apply_display_label(self.display_label)
+            self.apply_display_color(self.display_color)
 
+
+class ScriptWidget(ScriptDisplayMixin, QtWidgets.QWidget):
+    script_clicked = QtCore.Signal(str)
+
+    def __init__(self, script_path="ExampleScript.py", *args, **kwargs):
+        super(ScriptWidget, self).__init__(*args, **kwargs)
+        self.init_script_display(script_path)
+
+        self.trigger_btn = ui_utils.ScaledContentPushButton(parent=self)
+        self.trigger_btn.setSizePolicy(QtWidgets.QSizePolicy.Ignored, QtWidgets.QSizePolicy.Ignored)
+        self.trigger_btn.setText(self.display_label)
+        self.trigger_btn.clicked.connect(self.activate_script)
+        self.trigger_btn.setToolTip(self.script_name)
+        self.trigger_btn.setIcon(self.default_icon)
+
+        main_layout = QtWidgets.QHBoxLayout()
+        main_layout.addWidget(self.trigger_btn)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(main_layout)
+
+    def apply_display_label(self, text):
+        self.trigger_btn.setText(text)
         self.trigger_btn.update_content_size()
 
+    def apply_tooltip(self, text):
+        self.trigger_btn.setToolTip(text)
+
+    def apply_display_color(self, color):
+        if not color:
+            self.trigger_btn.setStyleSheet("")
+            return
+        self.trigger_btn.setStyleSheet(BACKGROUND_COLOR_FORM.format(*color))
+
+    def apply_icon(self, q_icon):
+        self.trigger_btn.setIcon(q_icon)
+
+
+class ScriptButtonItem(ScriptDisplayMixin, command_palette.PaletteButtonItem):
+    """
+    Painted palette button, no QWidget or stylesheet involved
+    """
+    script_clicked = QtCore.Signal(str)
+
+    def __init__(self, script_path="ExampleScript.py", parent=None):
+        super(ScriptButtonItem, self).__init__(parent)
+        self.init_script_display(script_path)
+
+        self.set_text(self.display_label)
+        self.set_icon(self.default_icon)
+        self.setToolTip(self.script_name)
+        self.clicked.connect(self.activate_script)
+
+    def apply_display_label(self, text):
+        self.set_text(text)
+
+    def apply_tooltip(self, text):
+        self.setToolTip(text)
+
+    def apply_display_color(self, color):
+        self.set_background_color(color)
+
+    def apply_icon(self, q_icon):
+        self.set_icon(q_icon)
+
 
 class ScriptModelItem(QtGui.QStandardItem):
     def __init__(self, script_path=None):
@@ -683,19 +1200,28 @@ class ScriptModelItem(QtGui.QStandardItem):
 # General UI
 
 class Icons(object):
-    def __init__(self):
-        self.script_panel_icon = ui_utils.create_qicon("script_panel_icon")
-
-        self.python_icon = ui_utils.create_qicon("python_icon")
-        self.mel_icon = ui_utils.create_qicon("mel_icon")
-        self.unknown_type_icon = ui_utils.create_qicon("unknown_icon")
-        self.folder_icon = ui_utils.create_qicon("folder_icon")
-
-        self.network_folder_icon = ui_utils.create_qicon("network_folder_icon")
-
-        self.p4_icon = ui_utils.create_qicon("p4_icon")
-        self.p4_folder_icon = ui_utils.create_qicon("p4_folder_icon")
-        self.p4_python_icon = ui_utils.create_qicon("p4_python_icon")
+    """
+    Icons are read on first use, through the shared icon cache
+    """
+    icon_names = {
+        "script_panel_icon": "script_panel_icon",
+        "python_icon": "python_icon",
+        "mel_icon": "mel_icon",
+        "unknown_type_icon": "unknown_icon",
+        "folder_icon": "folder_icon",
+        "network_folder_icon": "network_folder_icon",
+        "p4_icon": "p4_icon",
+        "p4_folder_icon": "p4_folder_icon",
+        "p4_python_icon": "p4_python_icon",
+    }
+
+    def __getattr__(self, name):
+        icon_name = self.icon_names.get(name)
+        if icon_name is None:
+            raise AttributeError(name)
+        q_icon = ui_utils.create_qicon(icon_name)
+        setattr(self, name, q_icon)
+        return q_icon
 
     def get_folder_icon_for_type(self, folder_type):
         """Get Icon for normal folders"""
@@ -744,16 +1270,17 @@ class ScriptPanelWindow(ui_utils.ToolWindow):
         self.resize(1000, 1000)
 
     def on_close(self):
-        self.main_widget.save_settings()
+        self.main_widget.shutdown()
 
     def closeEvent(self, event):
-        self.main_widget.save_settings()
+        self.main_widget.shutdown()
         super(ScriptPanelWindow, self).closeEvent(event)
 
 
 class ScriptPanelUI(QtWidgets.QWidget):
     script_double_clicked = QtCore.Signal(str)
     script_dropped_in_layout = QtCore.Signal(str)
+    layout_save_required_changed = QtCore.Signal(bool)
 
     def __init__(self, *args, **kwargs):
         super(ScriptPanelUI, self).__init__(*args, **kwargs)
@@ -827,16 +1354,36 @@ class ScriptPanelUI(QtWidgets.QWidget):
         scripts_and_search_widget = QtWidgets.QWidget()
         scripts_and_search_widget.setLayout(scripts_and_search_layout)
 
+        self.run_stats_widget = run_stats.RunStatsWidget()
+
+        self.bottom_tab_widget = QtWidgets.QTabWidget()
+        self.bottom_tab_widget.addTab(scripts_and_search_widget, "Scripts")
+        self.bottom_tab_widget.addTab(self.run_stats_widget, "Run Stats")
+
         self.main_splitter = QtWidgets.QSplitter()
         self.main_splitter.setOrientation(QtCore.Qt.Orientation.Vertical)
         self.main_splitter.setHandleWidth(10)
         self.main_splitter.addWidget(palette_widget)
-        self.main_splitter.addWidget(scripts_and_search_widget)
+        self.main_splitter.addWidget(self.bottom_tab_widget)
+
+        self.live_status_LBL = QtWidgets.QLabel()
+        self.live_status_LBL.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
+        self.live_stop_BTN = QtWidgets.QPushButton(text="Stop")
+        self.live_stop_BTN.setToolTip("Stop watching the live script")
+        live_status_layout = QtWidgets.QHBoxLayout()
+        live_status_layout.setContentsMargins(0, 0, 0, 0)
+        live_status_layout.addWidget(self.live_status_LBL, stretch=1)
+        live_status_layout.addWidget(self.live_stop_BTN)
+        self.live_status_widget = QtWidgets.QWidget()
+        self.live_status_widget.setLayout(live_status_layout)
 
         main_layout.addWidget(self.main_splitter)
+        main_layout.addWidget(self.live_status_widget)
         self.setLayout(main_layout)
 
+        self._layout_save_required = None
         self.display_layout_save_required(False)
+        self.set_live_status(None)
 
     def action_script_double_clicked(self, index):
         proxy = self.scripts_TV.model()  # type: QtCore.QSortFilterProxyModel
@@ -852,15 +1399,30 @@ class ScriptPanelUI(QtWidgets.QWidget):
         """
         if isinstance(event.source(), ScriptTreeView):
             selected_scripts = self.scripts_TV.get_selected_script_paths()
+            for script_path in selected_scripts:
+                self.script_dropped_in_layout.emit(script_path)  # each one goes into the closest free spot
             if selected_scripts:
-                self.script_dropped_in_layout.emit(selected_scripts[0])
                 self.display_layout_save_required()
 
     def display_layout_save_required(self, needs_save=True):
+        if needs_save == self._layout_save_required:
+            return  # restyling re-polishes the button, only do it when the state flips
+        self._layout_save_required = needs_save
+
         if needs_save:
             self.save_palette_BTN.setStyleSheet(BACKGROUND_COLOR_RED)
         else:
             self.save_palette_BTN.setStyleSheet(BACKGROUND_COLOR_GREEN)
+        self.layout_save_required_changed.emit(needs_save)
+
+    def set_live_status(self, text, is_error=False):
+        if not text:
+            self.live_status_widget.hide()
+            return
+
+        self.live_status_LBL.setText(text)
+        self.live_status_LBL.setStyleSheet(BACKGROUND_COLOR_RED if is_error else BACKGROUND_COLOR_GREEN)
+        self.live_status_widget.show()
 
 
 # class FavoritesTextOverlay(QtWidgets.QWidget):
@@ -950,27 +1512,30 @@ def show_warning_path_does_not_exist(file_path):
         subprocess.Popen(r'explorer "{}"'.format(folder_path))
 
 
-def upgrade_layout_settings_to_latest(layout_info):
-    layout_metadata = layout_info.get(sps.sk.meta_data, {})
-
-    if layout_metadata.get("version") == 0:
-        # combine scripts_display and palette_layout
-        scripts_display = layout_info.get(sps.sk.scripts_display)
-        palette_layout = layout_info.get(sps.sk.palette_layout, dict())
-
-        path_file_mapping = {}
-        for script_path, display_info in scripts_display.items():
-            path_file_mapping[os.path.basename(script_path)] = script_path
+def show_batch_report(report):
+    """
+    :type report: spb.BatchReport
+    """
+    failed_results = report.get_failed_results()
 
-        upgraded_palette_layout = {}
-        for script_name, palette_item_info in palette_layout.items():
-            script_path = path_file_mapping.get(script_name)
-            palette_item_info["display_info"] = scripts_display.get(script_path)
-            upgraded_palette_layout[script_path] = palette_item_info
+    msgbox = QtWidgets.QMessageBox(ui_utils.get_app_window())
+    msgbox.setIcon(QtWidgets.QMessageBox.Warning if failed_results else QtWidgets.QMessageBox.Information)
+    msgbox.setWindowTitle("Batch Run Report")
+    msgbox.setText("{} scripts ran in {:.2f}s, {} failed".format(
+        len(report.results),
+        report.total_time,
+        len(failed_results),
+    ))
+    msgbox.setDetailedText(report.get_summary_text())
+    msgbox.exec_()
 
-        layout_info[sps.sk.palette_layout] = upgraded_palette_layout
 
-    return layout_info
+def upgrade_layout_settings_to_latest(layout_info):
+    """
+    Layouts are upgraded and saved back when they're read with ScriptPanelSettings.get_layout(),
+    kept for anything still passing layouts through here
+    """
+    return sps.upgrade_layout_to_latest(layout_info)[0]
 
 
 def main(reload=False):
@@ -4,9 +4,18 @@ import os
 import runpy
 import subprocess
 import sys
+import types
 from collections import OrderedDict
+from functools import partial
 
 from script_panel import dcc
+from script_panel import script_panel_analysis
+from script_panel import script_panel_config
+from script_panel import script_panel_extensions
+from script_panel import script_panel_mirror
+from script_panel import script_panel_path_checks
+from script_panel import script_panel_profiling
+from script_panel import script_panel_roots
 from script_panel import script_panel_settings as sps
 
 dcc_interface = dcc.DCCInterface()
@@ -29,12 +38,19 @@ class LocalConstants:
     snippets = "snippets"
     snippet_shortcut = "snippet_shortcut"
     default_snippet_shortcut = "F9"
+    prefetch_time_budget = "prefetch_time_budget"
+    extension_handlers = "extension_handlers"
 
     # paths config keys
     path_root_dir = "root_dir"
     root_type = "root_type"
     folder_display_prefix = "folder_prefix"
     p4_enabled = "P4_ENABLED"
+    scan_timeout = "scan_timeout"  # seconds before a root that isn't responding is skipped
+    mirror_enabled = "mirror"  # set to true to scan and run a network root from a local copy of its scripts
+
+    # seconds added to every call on network shares, to test the mirror against a local folder
+    mirror_latency_env_key = "SCRIPT_PANEL_MIRROR_TEST_LATENCY"
 
 
 class FolderTypes:
@@ -57,21 +73,56 @@ def run_python_script(script_path):
     runpy.run_path(script_path, init_globals=globals(), run_name="__main__")
 
 
-EXTENSION_MAP = {
-    ".py": run_python_script,
-}
+def run_python_code(script_code, script_path):
+    """
+    Run an already compiled script the way run_python_script does,
+    in a temporary __main__ module that starts out with the globals of this module
+    """
+    main_module = types.ModuleType("__main__")
+    main_globals = main_module.__dict__
+    main_globals.update(globals())
+    main_globals.update(
+        __name__="__main__",
+        __file__=script_path,
+        __cached__=None,
+        __doc__=None,
+        __loader__=None,
+        __package__=None,
+        __spec__=None,
+    )
+
+    previous_main = sys.modules.get("__main__")
+    previous_argv0 = sys.argv[0] if sys.argv else None
+    sys.modules["__main__"] = main_module
+    if sys.argv:
+        sys.argv[0] = script_path
+    try:
+        exec(script_code, main_globals)
+    finally:
+        if previous_main is not None:
+            sys.modules["__main__"] = previous_main
+        if sys.argv:
+            sys.argv[0] = previous_argv0
+
+
+extension_registry = script_panel_extensions.ExtensionRegistry()
+extension_registry.register(".py", run_python_script)
 
 # add DCC specific extensions
-EXTENSION_MAP.update(dcc_interface.get_dcc_extension_map())
+for dcc_extension, dcc_extension_func in dcc_interface.get_dcc_extension_map().items():
+    extension_registry.register(dcc_extension, dcc_extension_func)
 
+# kept for code that registers handlers through the dictionary, forwards to extension_registry
+EXTENSION_MAP = script_panel_extensions.ExtensionMap(extension_registry)
 
-def add_extension_func_to_map(extension, func):
-    EXTENSION_MAP[extension] = func
+undefined_extension_func = script_panel_extensions.undefined_extension_func
 
 
-def undefined_extension_func(file_path):
-    file_ext = os.path.splitext(file_path)[-1]
-    print("Action needed for extension: {}".format(file_ext))
+def add_extension_func_to_map(extension, func):
+    """
+    :param func: function taking the script path, or a "module.path:function_name" string to import on first use
+    """
+    extension_registry.register(extension, func)
 
 
 def get_file_triggered_func(file_path):
@@ -80,13 +131,56 @@ def get_file_triggered_func(file_path):
     """
 
     file_ext = os.path.splitext(file_path)[-1]
-    file_type_func = EXTENSION_MAP.get(file_ext, undefined_extension_func)
-    return file_type_func
+    return extension_registry.get_handler(file_ext)
+
+
+def has_valid_script_extension(script_name):
+    return os.path.splitext(script_name)[-1] in extension_registry.suffixes
+
+
+store = sps.get_store()
+if store:
+    run_history = script_panel_profiling.StoreRunHistory(store)
+    script_panel_analysis.set_persistent_cache(store)
+else:
+    run_history = script_panel_profiling.RunHistory(sps.sk.run_history_path)
+
+run_tracker = script_panel_profiling.RunTracker(
+    history=run_history,
+    profiles_folder=sps.sk.run_profiles_folder,
+)
+
+
+root_breaker = script_panel_roots.RootCircuitBreaker()
+
+# palette scripts are checked in the background, paths on roots that aren't responding are left alone
+script_checker = script_panel_path_checks.ScriptExistenceChecker(
+    is_path_skipped=root_breaker.is_path_on_unavailable_root,
+    run_with_deadline=root_breaker.run_with_deadline,
+)
+
+network_mirrors = script_panel_mirror.MirrorManager(
+    sps.sk.network_mirrors_folder,
+    share_latency=float(os.environ.get(lk.mirror_latency_env_key, 0)),
+)
 
 
 def file_triggered(file_path):
     trigger_func = get_file_triggered_func(file_path)
-    trigger_func(file_path)
+
+    # history is recorded under the path shown in the panel, even when running a mirrored copy
+    return run_tracker.run(lambda script_path: trigger_func(network_mirrors.get_run_path(script_path)), file_path)
+
+
+config_service = script_panel_config.ConfigService()
+
+
+def check_for_config_changes():
+    """
+    Re-read the config (cheap if nothing changed on disk) and notify config_service listeners about changed keys
+    """
+    config_data = ConfigurationData()
+    return config_service.notify_if_changed(dict(config_data.raw_data))
 
 
 class ConfigurationData(object):
@@ -103,37 +197,47 @@ class ConfigurationData(object):
         self.refresh_config()
 
     def refresh_config(self):
-        raw_data = collections.OrderedDict()
-
+        """
+        Merge the config layers, from lowest to highest precedence:
+        the config files listed in the environment variable (and their includes), then the user config
+        """
         user_data = self.get_user_data()
 
+        layers = []
         if self.use_environment:
-            raw_data.update(self.get_env_data(user_data_exists=any(user_data.get(lk.paths, list()))))
-
+            layers.append(self.get_env_data(user_data_exists=any(user_data.get(lk.paths, list()))))
         if self.use_user:
-            # merge in user defined path data
-            all_path_data = raw_data.get(lk.paths, [])
-            for path_data in user_data.get(lk.paths, []):
-                all_path_data.append(path_data)
-            raw_data[lk.paths] = all_path_data
+            layers.append(user_data)
+
+        # merging builds new containers, so the cached layers aren't modified
+        raw_data = script_panel_config.merge_config_layers(layers, merged_list_keys={lk.paths: lk.path_root_dir})
 
         self.raw_data = raw_data
         self.path_data = raw_data.get(lk.paths, [])
         self.default_expand_depth = raw_data.get(lk.default_indent, 0)
         self.user_snippets = user_data.get(lk.snippets, dict())
 
-    def get_user_data(self):
-        user_data = {}
-        if os.path.exists(sps.sk.user_config_json_path):
-            with open(sps.sk.user_config_json_path, "r") as fp:
-                user_data = json.load(fp, object_pairs_hook=collections.OrderedDict)
+        # {".ext": "module.path:function_name"} handlers, imported when a file with that extension is first triggered
+        extension_registry.set_config_handlers(raw_data.get(lk.extension_handlers))
+        self.prefetch_time_budget = raw_data.get(
+            lk.prefetch_time_budget,
+            script_panel_analysis.lk.default_prefetch_time_budget,
+        )
 
-        return user_data
+    def get_user_data(self):
+        """
+        Cached contents of the user config, don't modify the returned data
+        """
+        user_data = config_service.read_json(sps.sk.user_config_json_path)
+        return user_data if user_data is not None else collections.OrderedDict()
 
     def get_env_data(self, user_data_exists=False):
         """
         find info about root paths from the environment variable
 
+        The variable can hold inline json data, or a ";" separated list of root folders and .json config files.
+        Config files are layered in the order they're listed, later files override earlier ones.
+
         :return:
         """
         env_str = os.environ.get(lk.env_key, "")
@@ -145,27 +249,32 @@ class ConfigurationData(object):
                 return {}
             env_str = os.path.join(os.path.dirname(__file__), "example_config", "example_script_panel_config.json")
 
-        # if env_str is a path to a json config, read the contents from that file
-        if env_str.endswith(".json") and os.path.exists(env_str):
-            config_path = env_str
-            with open(config_path, "r") as fp:
-                env_data = json.load(fp)
+        # json data directly in the environment variable
+        if env_str.startswith('{'):
+            return config_service.get_cached_value(env_str, partial(get_data_from_string, env_str))
 
-            # replace "local file token" with full file path of config
-            modified_data = json.dumps(env_data).replace("__THIS_FILE__", config_path.replace("\\", "\\\\"))
-            env_data = json.loads(modified_data)
+        env_entries = [entry for entry in env_str.split(";") if entry]
+        config_paths = [entry for entry in env_entries if entry.endswith(".json")]
+        root_folders = [entry for entry in env_entries if not entry.endswith(".json")]
 
-        # or parse data directly from environment variable
-        else:
-            env_data = get_data_from_string(env_str)
+        env_layers = []
+        if root_folders:
+            root_folders_str = ";".join(root_folders)
+            env_layers.append(config_service.get_cached_value(
+                root_folders_str, partial(get_data_from_string, root_folders_str)
+            ))
+        if config_paths:
+            env_layers.append(config_service.read_config_layers(config_paths))
 
-        return env_data
+        if len(env_layers) == 1:
+            return env_layers[0]
+        return script_panel_config.merge_config_layers(env_layers, merged_list_keys={lk.paths: lk.path_root_dir})
 
 
 def get_data_from_string(env_str):
     # if json data is in the env string, load info from that
     if env_str.startswith('{'):
-        env_data = json.loads(env_str)
+        env_data = json.loads(env_str, object_pairs_hook=collections.OrderedDict)
     else:
         # only folders specified in environment variable. extract the rest of the data from that
         root_folders = env_str.split(";")
@@ -182,11 +291,27 @@ def get_data_from_string(env_str):
     return env_data
 
 
-def has_valid_script_extension(script_name):
-    for ext in EXTENSION_MAP.keys():
-        if script_name.endswith(ext):
-            return True
-    return False
+def scan_root_folder(root_folder, path_data):
+    """
+    Everything that touches the root on disk, run with a deadline by get_scripts()
+    """
+    if path_data.get(lk.root_type) == FolderTypes.perforce and path_data.get(lk.p4_enabled, True):
+        os.makedirs(os.path.dirname(root_folder), exist_ok=True)
+        subprocess.Popen(["p4", "sync", root_folder + r"\..."], cwd=os.path.dirname(root_folder), shell=True)
+
+    return list(walk_func(root_folder))
+
+
+def get_unavailable_roots(config_data):
+    """
+    :return: [(path_data, RootStatus)] for roots currently skipped by the scan
+    """
+    unavailable_roots = []
+    for path_data in config_data.path_data:
+        root_status = root_breaker.get_status(os.path.abspath(path_data.get(lk.path_root_dir)))
+        if root_status:
+            unavailable_roots.append((path_data, root_status))
+    return unavailable_roots
 
 
 def get_scripts(config_data=None):
@@ -195,29 +320,65 @@ def get_scripts(config_data=None):
 
     script_paths = OrderedDict()
     for path_data in config_data.path_data:
-        root_folder = os.path.abspath(path_data.get(lk.path_root_dir))
-        if not root_folder:
+        if not path_data.get(lk.path_root_dir):
             print("ROOT FOLDER NOT DEFINED: {}".format(config_data.raw_data))
             continue
+        script_paths.update(get_root_scripts(path_data))
+
+    return script_paths
+
+
+def get_root_scripts(path_data):
+    """
+    Scripts in a single script root, empty if the root is being skipped.
+    Waits for up to the root's scan_timeout when it isn't responding, the panel calls this from a worker thread.
 
-        root_type = path_data.get(lk.root_type)
-        if root_type == FolderTypes.perforce and path_data.get(lk.p4_enabled, True):
-            os.makedirs(os.path.dirname(root_folder), exist_ok=True)
-            subprocess.Popen(["p4", "sync", root_folder + r"\..."], cwd=os.path.dirname(root_folder), shell=True)
-
-        display_prefix = path_data.get(lk.folder_display_prefix)
-        for folder, __, script_names in walk_func(root_folder):
-            for script_name in script_names:
-                if not has_valid_script_extension(script_name):
-                    continue
-                full_script_path = os.path.join(folder, script_name)
-                full_script_path = full_script_path.replace("/", "\\")
-
-                script_paths[full_script_path] = {
-                    PathInfoKeys.root_dir: root_folder,
-                    PathInfoKeys.root_type: root_type,
-                    PathInfoKeys.folder_prefix: display_prefix,
-                }
+    :return: OrderedDict {script path: path info}
+    """
+    script_paths = OrderedDict()
+    root_folder = os.path.abspath(path_data.get(lk.path_root_dir))
+    root_type = path_data.get(lk.root_type)
+
+    # scan the local copy of network roots, the share is only walked until the first sync is done
+    root_mirror = None
+    if root_type == FolderTypes.network and path_data.get(lk.mirror_enabled, False):
+        root_mirror = network_mirrors.get_mirror(root_folder)
+        network_mirrors.start()
+        network_mirrors.request_sync()
+        if not root_mirror.is_usable():
+            root_mirror = None
+
+    if root_mirror:
+        walk_results = walk_func(root_mirror.mirror_root)
+    else:
+        # a dead mount can block any file system call, so skip roots that recently stopped responding
+        if not root_breaker.is_available(root_folder):
+            return script_paths
+        try:
+            walk_results = root_breaker.run_with_deadline(
+                root_folder,
+                partial(scan_root_folder, root_folder, path_data),
+                timeout=path_data.get(lk.scan_timeout, script_panel_roots.lk.scan_timeout),
+            )
+        except script_panel_roots.RootScanTimeout:
+            print("Script root is not responding, skipping it for now: {}".format(root_folder))
+            return script_paths
+
+    display_prefix = path_data.get(lk.folder_display_prefix)
+    for folder, __, script_names in walk_results:
+        for script_name in script_names:
+            if not has_valid_script_extension(script_name):
+                continue
+            full_script_path = os.path.join(folder, script_name)
+            if root_mirror:
+                full_script_path = root_mirror.get_share_path(full_script_path)
+            full_script_path = full_script_path.replace("/", "\\")
+
+            script_paths[full_script_path] = {
+                PathInfoKeys.root_dir: root_folder,
+                PathInfoKeys.root_type: root_type,
+                PathInfoKeys.folder_prefix: display_prefix,
+            }
 
     return script_paths
 
@@ -1,3 +1,5 @@
+import collections
+import contextlib
 import math
 import sys
 
@@ -8,47 +10,211 @@ from script_panel.ui.ui_utils import QtCore, QtGui, QtWidgets, BaseSettings
 class LocalConstants:
     default_grid_size = 20
     default_grid_color = QtGui.QColor(50, 50, 50)
+    grid_line_color = QtGui.QColor(100, 100, 100)
     header_height = 15
 
+    # small grids get several cells per background tile, so the tile isn't filled a few pixels at a time
+    min_grid_tile_size = 64
+
+    full_quality_render_hints = (
+        QtGui.QPainter.Antialiasing
+        | QtGui.QPainter.HighQualityAntialiasing
+        | QtGui.QPainter.SmoothPixmapTransform
+    )
+    interactive_render_hints = QtGui.QPainter.RenderHints()
+    restore_quality_delay_ms = 200  # full quality comes back once the view has been still for this long
+
+    grid_cells_per_index_bucket = 8  # spatial index buckets are about the size of a default item
+    max_free_space_rings = 40  # how many grid steps away from the drop position to look for free space
+
+    # widgets are only created for items within this many scene units of the visible rect,
+    # and recycled once they're twice as far out of view
+    virtualization_margin = 200
+    max_recycled_widgets = 100
+
 
 lk = LocalConstants
 
 
+def iter_ring_offsets(ring):
+    """
+    Grid offsets at exactly ring steps from the center, closest ones first
+    """
+    if ring == 0:
+        return [(0, 0)]
+    offsets = []
+    for d in range(-ring, ring + 1):
+        offsets.extend([(d, -ring), (d, ring)])
+    for d in range(-ring + 1, ring):
+        offsets.extend([(-ring, d), (ring, d)])
+    offsets.sort(key=lambda offset: offset[0] * offset[0] + offset[1] * offset[1])
+    return offsets
+
+
+class PaletteSpatialIndex(object):
+    """
+    Palette items bucketed by the grid cells they cover, for hit testing and finding free space
+    without looking at every item
+    """
+
+    def __init__(self, bucket_size):
+        self.bucket_size = bucket_size
+        self._buckets = collections.defaultdict(set)  # {(column, row): {items}}
+        self._item_rects = {}  # {item: scene rect}
+        self._item_buckets = {}  # {item: [bucket keys]}
+
+    def _get_bucket_keys(self, rect):
+        first_column = int(math.floor(rect.left() / self.bucket_size))
+        last_column = int(math.floor(rect.right() / self.bucket_size))
+        first_row = int(math.floor(rect.top() / self.bucket_size))
+        last_row = int(math.floor(rect.bottom() / self.bucket_size))
+        return [(column, row)
+                for column in range(first_column, last_column + 1)
+                for row in range(first_row, last_row + 1)]
+
+    def update(self, item):
+        """
+        Add the item, or move it to where it is now
+
+        :type item: PaletteRectItem
+        """
+        self.remove(item)
+        rect = QtCore.QRectF(item.pos(), item.rect().size())
+        bucket_keys = self._get_bucket_keys(rect)
+        for bucket_key in bucket_keys:
+            self._buckets[bucket_key].add(item)
+        self._item_rects[item] = rect
+        self._item_buckets[item] = bucket_keys
+
+    def remove(self, item):
+        for bucket_key in self._item_buckets.pop(item, []):
+            bucket = self._buckets[bucket_key]
+            bucket.discard(item)
+            if not bucket:
+                del self._buckets[bucket_key]
+        self._item_rects.pop(item, None)
+
+    def set_bucket_size(self, bucket_size):
+        if bucket_size == self.bucket_size:
+            return
+        self.bucket_size = bucket_size
+        items = list(self._item_rects.keys())
+        self._buckets.clear()
+        self._item_rects.clear()
+        self._item_buckets.clear()
+        for item in items:
+            self.update(item)
+
+    def get_items_in_rect(self, rect):
+        found_items = set()
+        for bucket_key in self._get_bucket_keys(rect):
+            for item in self._buckets.get(bucket_key, ()):
+                if self._item_rects[item].intersects(rect):
+                    found_items.add(item)
+        return found_items
+
+    def get_item_at(self, scene_pos):
+        """
+        :rtype: PaletteRectItem
+        """
+        bucket_key = (int(math.floor(scene_pos.x() / self.bucket_size)),
+                      int(math.floor(scene_pos.y() / self.bucket_size)))
+        hit_items = [item for item in self._buckets.get(bucket_key, ()) if self._item_rects[item].contains(scene_pos)]
+        if not hit_items:
+            return None
+        return max(hit_items, key=lambda item: item.zValue())
+
+    def is_free(self, rect, ignored_item=None):
+        """
+        :param ignored_item: the item being placed, it can't be in its own way
+        """
+        return not [item for item in self.get_items_in_rect(rect) if item is not ignored_item]
+
+    def find_free_pos(self, rect, step, max_rings=lk.max_free_space_rings, ignored_item=None):
+        """
+        :return: the closest position to rect's top left, in steps, where rect doesn't overlap any item.
+                 rect's top left if there isn't one close enough
+        """
+        for ring in range(max_rings + 1):
+            for column_offset, row_offset in iter_ring_offsets(ring):
+                candidate = rect.translated(column_offset * step, row_offset * step)
+                if candidate.left() < 0 or candidate.top() < 0:
+                    continue
+                if self.is_free(candidate, ignored_item):
+                    return candidate.topLeft()
+        return rect.topLeft()
+
+
 class PaletteScene(QtWidgets.QGraphicsScene):
+    layout_changed = QtCore.Signal()
+
     def __init__(self, *args, **kwargs):
         super(PaletteScene, self).__init__(*args, **kwargs)
+        self.layout_signals_blocked = 0
         self._background_color = lk.default_grid_color
-        self._background_color_light = QtGui.QColor(100, 100, 100)
+        self._background_color_light = lk.grid_line_color
 
-        self.grid_size = lk.default_grid_size
+        self._grid_size = lk.default_grid_size
+        self._grid_brush = None  # tiled background + grid lines, rebuilt when the grid size or colors change
+        self.item_index = PaletteSpatialIndex(self._grid_size * lk.grid_cells_per_index_bucket)
         self.grid_pen = QtGui.QPen(self._background_color_light)
         self.grid_pen.setWidth(1)
 
         self.setBackgroundBrush(self._background_color)
 
-    def drawBackground(self, painter, rect):
-        super(PaletteScene, self).drawBackground(painter, rect)
-        left = int(math.floor(rect.left()))
-        right = int(math.ceil(rect.right()))
-        top = int(math.floor(rect.top()))
-        bottom = int(math.ceil(rect.bottom()))
+    @property
+    def grid_size(self):
+        return self._grid_size
+
+    @grid_size.setter
+    def grid_size(self, new_size):
+        self._grid_size = new_size
+        self._grid_brush = None
+        self.item_index.set_bucket_size(new_size * lk.grid_cells_per_index_bucket)
+        self.update()
+
+    def setBackgroundBrush(self, brush):
+        super(PaletteScene, self).setBackgroundBrush(brush)
+        self._grid_brush = None
+
+    def set_grid_line_color(self, color):
+        self.grid_pen.setColor(color)
+        self._grid_brush = None
+        self.update()
+
+    def notify_layout_changed(self):
+        if not self.layout_signals_blocked:
+            self.layout_changed.emit()
 
-        first_left = left - (left % self.grid_size)
-        first_top = top - (top % self.grid_size)
+    def get_grid_brush(self):
+        if self._grid_brush is None:
+            self._grid_brush = self._create_grid_brush()
+        return self._grid_brush
 
-        grid_lines = []
-        for i in range(first_left, right, self.grid_size):
-            grid_lines.append(QtCore.QLine(i, top, i, bottom))
+    def _create_grid_brush(self):
+        cells_per_tile = max(1, int(math.ceil(lk.min_grid_tile_size / float(self._grid_size))))
+        tile_size = self._grid_size * cells_per_tile
 
-        for i in range(first_top, bottom, self.grid_size):
-            grid_lines.append(QtCore.QLine(left, i, right, i))
+        tile = QtGui.QPixmap(tile_size, tile_size)
+        tile.fill(self.backgroundBrush().color())
 
+        painter = QtGui.QPainter(tile)
         painter.setPen(self.grid_pen)
-        painter.drawLines(grid_lines)
+        for i in range(0, tile_size, self._grid_size):
+            painter.drawLine(i, 0, i, tile_size)
+            painter.drawLine(0, i, tile_size, i)
+        painter.end()
+
+        return QtGui.QBrush(tile)
+
+    def drawBackground(self, painter, rect):
+        # the brush texture is anchored to the scene origin, so the tiles line up with the grid when panning
+        painter.fillRect(rect, self.get_grid_brush())
 
 
 class PaletteGraphicsView(QtWidgets.QGraphicsView):
     item_dropped = QtCore.Signal(object)
+    visible_rect_changed = QtCore.Signal()  # scrolled, zoomed or resized
 
     def __init__(self, scene, *args, **kwargs):
         super(PaletteGraphicsView, self).__init__(*args, **kwargs)
@@ -64,14 +230,59 @@ class PaletteGraphicsView(QtWidgets.QGraphicsView):
         self.setAcceptDrops(True)
         self.setAlignment(QtCore.Qt.AlignTop | QtCore.Qt.AlignLeft)
         self.setTransformationAnchor(self.AnchorUnderMouse)
-        self.setRenderHints(
-            QtGui.QPainter.Antialiasing
-            | QtGui.QPainter.HighQualityAntialiasing
-            | QtGui.QPainter.SmoothPixmapTransform
-        )
+        self.setRenderHints(lk.full_quality_render_hints)
         self.setViewportUpdateMode(self.FullViewportUpdate)
         self.setDragMode(self.RubberBandDrag)
 
+        # adaptive render quality, drops the expensive render hints while panning, zooming or dragging
+        self.adaptive_quality = False
+        self._restore_quality_timer = QtCore.QTimer(self)
+        self._restore_quality_timer.setSingleShot(True)
+        self._restore_quality_timer.setInterval(lk.restore_quality_delay_ms)
+        self._restore_quality_timer.timeout.connect(self.restore_render_quality)
+
+    def set_adaptive_quality(self, state):
+        self.adaptive_quality = state
+        if state:
+            # only repaint what changed, scrolling then moves the existing pixels and paints the exposed strip
+            self.setViewportUpdateMode(self.BoundingRectViewportUpdate)
+        else:
+            self.setViewportUpdateMode(self.FullViewportUpdate)
+        self.restore_render_quality()
+
+    def lower_render_quality(self):
+        if not self.adaptive_quality:
+            return
+        if self.renderHints() != lk.interactive_render_hints:
+            self.setRenderHints(lk.interactive_render_hints)
+        self._restore_quality_timer.start()
+
+    def restore_render_quality(self):
+        if QtWidgets.QApplication.mouseButtons() != QtCore.Qt.NoButton and self.adaptive_quality:
+            self._restore_quality_timer.start()  # still dragging
+            return
+        self._restore_quality_timer.stop()
+        if self.renderHints() != lk.full_quality_render_hints:
+            self.setRenderHints(lk.full_quality_render_hints)
+
+    def scrollContentsBy(self, dx, dy):
+        self.lower_render_quality()
+        super(PaletteGraphicsView, self).scrollContentsBy(dx, dy)
+        self.visible_rect_changed.emit()
+
+    def resizeEvent(self, event):
+        super(PaletteGraphicsView, self).resizeEvent(event)
+        self.visible_rect_changed.emit()
+
+    def get_visible_scene_rect(self, margin=0):
+        visible_rect = self.mapToScene(self.viewport().rect()).boundingRect()
+        return visible_rect.adjusted(-margin, -margin, margin, margin)
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() != QtCore.Qt.NoButton:
+            self.lower_render_quality()
+        super(PaletteGraphicsView, self).mouseMoveEvent(event)
+
     def keyPressEvent(self, event):
         if not event.isAutoRepeat() and event.key() == QtCore.Qt.Key_Space:
             self.toggle_drag_mode(True)
@@ -124,16 +335,10 @@ class PaletteGraphicsView(QtWidgets.QGraphicsView):
         return scene_pos
 
     def get_item_under_cursor(self):
-        scene_pos = self.get_cursor_scene_pos()
-        item_under_cursor = self.scene().itemAt(scene_pos, QtGui.QTransform())
-        if not item_under_cursor:
-            return
-
-        # if child item_selected, go up to parent rect item
-        if item_under_cursor.parentItem():
-            item_under_cursor = item_under_cursor.parentItem()  # type: PaletteRectItem
-
-        return item_under_cursor
+        """
+        :rtype: PaletteRectItem
+        """
+        return self.scene().item_index.get_item_at(self.get_cursor_scene_pos())
 
     def wheelEvent(self, event):
         """
@@ -151,7 +356,9 @@ class PaletteGraphicsView(QtWidgets.QGraphicsView):
             zoom_factor = zoom_out_factor
             self.zoom -= self.zoom_step
 
+        self.lower_render_quality()
         self.scale(zoom_factor, zoom_factor)
+        self.visible_rect_changed.emit()
 
     def toggle_drag_mode(self, state=False):
         if state:
@@ -247,11 +454,15 @@ class PaletteRectItem(QtWidgets.QGraphicsRectItem):
         super(PaletteRectItem, self).__init__(*args, **kwargs)
 
         self.internal_id = internal_id
+        # id and display info of the wrapped widget, kept on the item while it's a placeholder without one
+        self.palette_id = internal_id
+        self.display_info = None
         self.header_height = lk.header_height
         self.show_header = True
         self.resize_handle_size = lk.default_grid_size
         self._being_resized = False
         self.wrapped_widget = None
+        self.proxy_widget = None  # only needed for QWidgets, painted items are parented directly
         self.is_selected = False
 
         self.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable, True)
@@ -260,7 +471,6 @@ class PaletteRectItem(QtWidgets.QGraphicsRectItem):
         self.setBrush(QtCore.Qt.darkGray)
         self.setCursor(QtCore.Qt.SizeAllCursor)
 
-        self.proxy_widget = QtWidgets.QGraphicsProxyWidget(self)
         self.resize_button = ResizeHandle()
         self.resize_button.setParentItem(self)
         self.resize_button.setBrush(QtCore.Qt.lightGray)
@@ -281,21 +491,87 @@ class PaletteRectItem(QtWidgets.QGraphicsRectItem):
         else:
             self.text_item.hide()
 
-        self.wrapped_widget.setGeometry(0, 0, box_width, box_height - header_height)
-        self.proxy_widget.setPos(0, header_height)
+        if self.proxy_widget is not None:
+            self.wrapped_widget.setGeometry(0, 0, box_width, box_height - header_height)
+            self.proxy_widget.setPos(0, header_height)
+        elif self.wrapped_widget is not None:
+            self.wrapped_widget.set_size(box_width, box_height - header_height)
+            self.wrapped_widget.setPos(0, header_height)
         self.resize_button.setPos(box_width - self.resize_handle_size, box_height - self.resize_handle_size)
 
+    def set_cache_mode(self, cache_mode):
+        """
+        DeviceCoordinateCache keeps a rendered pixmap of the item and its widget, so panning doesn't repaint them
+        """
+        self.setCacheMode(cache_mode)
+        content_item = self.get_content_item()
+        if content_item is not None:
+            content_item.setCacheMode(cache_mode)
+
+    def get_content_item(self):
+        """
+        The graphics item showing the wrapped widget
+        """
+        return self.proxy_widget if self.proxy_widget is not None else self.wrapped_widget
+
     def update_brush(self):
         if self.is_selected:
             self.setBrush(QtCore.Qt.white)
         else:
             self.setBrush(QtCore.Qt.darkGray)
 
-    def wrap_widget(self, widget):
+    def wrap_widget(self, widget, proxy_widget=None):
+        """
+        :param widget: QWidget, or a QGraphicsItem with a set_size(width, height) method like PaletteButtonItem
+        :param proxy_widget: recycled proxy that already holds the widget
+        """
         self.wrapped_widget = widget
-        self.proxy_widget.setWidget(widget)
+        if isinstance(widget, QtWidgets.QGraphicsItem):
+            widget.setParentItem(self)
+        else:
+            if proxy_widget is None:
+                proxy_widget = QtWidgets.QGraphicsProxyWidget()
+                proxy_widget.setWidget(widget)
+            proxy_widget.setParentItem(self)
+            self.proxy_widget = proxy_widget
         self.set_widget_geometry()
 
+    def release_widget(self):
+        """
+        Take the wrapped widget out of the item, its id and display info are kept on the item
+
+        :return: (widget, proxy widget holding it or None)
+        """
+        widget = self.wrapped_widget
+        if widget is None:
+            return None, None
+
+        self.palette_id, self.display_info = self.get_palette_info()
+        content_item = self.get_content_item()
+        content_item.setParentItem(None)
+        if content_item.scene():
+            content_item.scene().removeItem(content_item)
+
+        proxy_widget = self.proxy_widget
+        self.wrapped_widget = None
+        self.proxy_widget = None
+        return widget, proxy_widget
+
+    def get_palette_info(self):
+        """
+        :return: (palette id, display info) of the wrapped widget, or the ones kept while there's no widget
+        """
+        widget = self.wrapped_widget
+        if widget is None:
+            return self.palette_id, self.display_info
+
+        # if the wrapped widget has a custom id, use that instead
+        palette_id = getattr(widget, "palette_id", self.internal_id)
+
+        # if get_display_info has been implemented, bring it along
+        display_info = widget.get_display_info() if hasattr(widget, "get_display_info") else None
+        return palette_id, display_info
+
     def set_size(self, size, snap_to_grid=False):
         if snap_to_grid:
             resized_pos = QtCore.QPoint(*size)
@@ -307,15 +583,19 @@ class PaletteRectItem(QtWidgets.QGraphicsRectItem):
         rect.setHeight(size[1])
         self.setRect(rect)
         self.set_widget_geometry()
+        if self.scene():
+            self.scene().item_index.update(self)
+            self.scene().notify_layout_changed()
 
     def set_pos(self, pos):
         self.setPos(*pos)  # will automatically trigger itemChange
 
-    def snap_pos_to_grid(self, pos):
+    def snap_pos_to_grid(self, pos, grid_size=None):
         """
         :type pos:  QtCore.QPointF
+        :param grid_size: for items that aren't in a scene yet
         """
-        grid_size = self.scene().grid_size
+        grid_size = grid_size or self.scene().grid_size
         snapped_x = max(round(pos.x() / grid_size) * grid_size, 0)
         snapped_y = max(round(pos.y() / grid_size) * grid_size, 0)
         pos.setX(snapped_x)
@@ -328,28 +608,218 @@ class PaletteRectItem(QtWidgets.QGraphicsRectItem):
         if change == self.ItemSelectedChange and self.scene():
             self.is_selected = bool(value)
             self.update_brush()
+        if change == self.ItemPositionHasChanged and self.scene():
+            self.scene().item_index.update(self)
+            self.scene().notify_layout_changed()
+        if change == self.ItemSceneChange and self.scene():
+            self.scene().item_index.remove(self)  # leaving the scene
+        if change == self.ItemSceneHasChanged and self.scene():
+            self.scene().item_index.update(self)
         return super(PaletteRectItem, self).itemChange(change, value)
 
 
+class PaletteButtonItem(QtWidgets.QGraphicsObject):
+    """
+    Button painted straight into the scene, a lot lighter than a QPushButton in a QGraphicsProxyWidget
+    """
+    clicked = QtCore.Signal()
+
+    def __init__(self, parent=None):
+        super(PaletteButtonItem, self).__init__(parent)
+        self.text_padding_multiplier = 0.8
+        self.icon_padding_multiplier = 0.5
+
+        self._size = QtCore.QSizeF(0, 0)
+        self._text = ""
+        self._icon = QtGui.QIcon()
+        self._max_icon_size = 0
+        self._background_color = None  # (r, g, b), None for the default button color
+        self._font = QtGui.QFont()
+        self._is_pressed = False
+        self._is_hovered = False
+
+        self.setAcceptHoverEvents(True)
+        self.setCursor(QtCore.Qt.ArrowCursor)
+
+    def boundingRect(self):
+        return QtCore.QRectF(QtCore.QPointF(0, 0), self._size)
+
+    def set_size(self, width, height):
+        self.prepareGeometryChange()
+        self._size = QtCore.QSizeF(width, height)
+        self.update_content_size()
+
+    def text(self):
+        return self._text
+
+    def set_text(self, text):
+        self._text = text
+        self.update_content_size()
+
+    def set_icon(self, q_icon):
+        biggest_size = ui_utils.get_biggest_icon_size(q_icon)
+        if biggest_size:
+            self._max_icon_size = min(biggest_size.width(), biggest_size.height())
+        self._icon = q_icon
+        self.update_content_size()
+
+    def set_background_color(self, color):
+        self._background_color = color
+        self.update()
+
+    def get_icon_size(self):
+        min_size = min(self._size.width(), self._size.height())
+        if self._text:
+            return int(min_size * self.icon_padding_multiplier)
+        return int(min_size)
+
+    def update_content_size(self):
+        icon_width = 0
+        if not self._icon.isNull():
+            icon_width = min(self.get_icon_size(), self._max_icon_size)
+
+        self._font = ui_utils.get_fitted_font(self._text, self._size.width(), self._size.height(), icon_width,
+                                              self.text_padding_multiplier)
+        self.update()
+
+    def paint(self, painter, option, widget=None):
+        app_palette = QtWidgets.QApplication.palette()
+        button_rect = self.boundingRect().adjusted(0.5, 0.5, -0.5, -0.5)
+
+        if self._background_color:
+            button_color = QtGui.QColor(*self._background_color)
+        else:
+            button_color = app_palette.button().color()
+        if self._is_pressed:
+            button_color = button_color.darker(120)
+        elif self._is_hovered:
+            button_color = button_color.lighter(115)
+
+        # the text and icon can be wider than a small button, keep them from drawing over the neighbours
+        painter.save()
+        painter.setClipRect(self.boundingRect())
+
+        painter.setPen(app_palette.mid().color())
+        painter.setBrush(button_color)
+        painter.drawRoundedRect(button_rect, 2, 2)
+
+        # icon and text, centered next to each other
+        icon_size = 0 if self._icon.isNull() else self.get_icon_size()
+        text_size = QtCore.QSize()
+        if self._text:
+            font_metrics = QtGui.QFontMetrics(self._font)
+            text_size = font_metrics.boundingRect(QtCore.QRect(), QtCore.Qt.AlignCenter, self._text).size()
+        spacing = 4 if icon_size and self._text else 0
+
+        content_left = button_rect.center().x() - (icon_size + spacing + text_size.width()) / 2.0
+        if icon_size:
+            icon_top = button_rect.center().y() - icon_size / 2.0
+            self._icon.paint(painter, QtCore.QRect(int(content_left), int(icon_top), icon_size, icon_size))
+        if self._text:
+            text_rect = QtCore.QRectF(content_left + icon_size + spacing, button_rect.top(),
+                                      text_size.width(), button_rect.height())
+            painter.setFont(self._font)
+            painter.setPen(app_palette.buttonText().color())
+            painter.drawText(text_rect, QtCore.Qt.AlignCenter, self._text)
+
+        painter.restore()
+
+    def mousePressEvent(self, event):
+        if event.button() != QtCore.Qt.LeftButton:
+            event.ignore()  # let the palette item handle selection
+            return
+        self._is_pressed = True
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        was_pressed = self._is_pressed
+        self._is_pressed = False
+        self.update()
+        if was_pressed and event.button() == QtCore.Qt.LeftButton and self.boundingRect().contains(event.pos()):
+            self.clicked.emit()
+
+    def hoverEnterEvent(self, event):
+        self._is_hovered = True
+        self.update()
+
+    def hoverLeaveEvent(self, event):
+        self._is_hovered = False
+        self.update()
+
+
 class CommandPaletteWidget(QtWidgets.QWidget):
+    layout_changed = QtCore.Signal()  # items were moved, resized, added or removed, or the display changed
+
     def __init__(self, *args, **kwargs):
         super(CommandPaletteWidget, self).__init__(*args, **kwargs)
 
         self._display_headers = True
+        self.item_cache_mode = QtWidgets.QGraphicsItem.NoCache
 
-        self._scene_items = []
-        self.scene_widgets = []
+        self._items_by_id = collections.OrderedDict()  # {internal id: PaletteRectItem}
+
+        # virtualization, widgets are only created for items near the visible part of the palette
+        self.widget_factory = None  # func(palette_id, display_info, recycled_widget) -> widget
+        self._realized_items = set()
+        self._recycled_widgets = []  # [(widget, proxy widget)]
+        self._visible_items_timer = QtCore.QTimer(self)
+        self._visible_items_timer.setSingleShot(True)
+        self._visible_items_timer.setInterval(0)
+        self._visible_items_timer.timeout.connect(self.update_visible_items)
 
         self.main_layout = QtWidgets.QVBoxLayout()
         self.main_layout.setContentsMargins(0, 0, 0, 0)
 
         self.scene = PaletteScene()
+        self.scene.layout_changed.connect(self.layout_changed)
         self.graphics_view = PaletteGraphicsView(self.scene, self)
+        self.graphics_view.visible_rect_changed.connect(self.schedule_visible_items_update)
 
         # set ui
         self.main_layout.addWidget(self.graphics_view)
         self.setLayout(self.main_layout)
 
+    @contextlib.contextmanager
+    def blocked_layout_signals(self):
+        """
+        Don't send layout_changed while a layout is being loaded
+        """
+        self.scene.layout_signals_blocked += 1
+        try:
+            yield
+        finally:
+            self.scene.layout_signals_blocked -= 1
+
+    def set_render_settings(self, adaptive_quality=False, cache_items=False):
+        self.graphics_view.set_adaptive_quality(adaptive_quality)
+
+        if cache_items:
+            self.item_cache_mode = QtWidgets.QGraphicsItem.DeviceCoordinateCache
+        else:
+            self.item_cache_mode = QtWidgets.QGraphicsItem.NoCache
+        for rect_item in self._items_by_id.values():
+            rect_item.set_cache_mode(self.item_cache_mode)
+
+    @property
+    def scene_widgets(self):
+        """
+        Widgets that currently exist, placeholder items don't have one
+        """
+        return [rect_item.wrapped_widget for rect_item in self._items_by_id.values()
+                if rect_item.wrapped_widget is not None]
+
+    def get_palette_ids(self):
+        return [rect_item.get_palette_info()[0] for rect_item in self._items_by_id.values()]
+
+    def get_items(self):
+        return list(self._items_by_id.values())
+
+    def get_item(self, internal_id):
+        """
+        :rtype: PaletteRectItem
+        """
+        return self._items_by_id.get(internal_id)
+
     def get_ui_settings(self):
         ui_settings = dict()
         ui_settings["show_headers"] = self._display_headers
@@ -372,48 +842,64 @@ class CommandPaletteWidget(QtWidgets.QWidget):
         # if view_transform:
         #     self.graphics_view.setTransform(QtGui.QTransform(*view_transform))
 
-    def add_widget(self, internal_id, display_name, widget, pos=None):
+    def add_widget(self, internal_id, display_name, widget=None, pos=None, find_free_space=False, display_info=None):
+        """
+        An item already in the palette with the same id is replaced
+
+        :param widget: without one the item is a placeholder, widget_factory creates its widget once it comes into view
+        :param find_free_space: move the item to the closest spot near pos where it doesn't overlap other items
+        :param display_info: passed on to widget_factory for placeholders
+        """
+        existing_item = self._items_by_id.pop(internal_id, None)
+        if existing_item:
+            self._realized_items.discard(existing_item)
+            self.scene.removeItem(existing_item)
+
         rect_item = PaletteRectItem(internal_id, display_name, 0, 0, self.scene.grid_size * 8, self.scene.grid_size * 4)
-        rect_item.wrap_widget(widget)
-        self.scene.addItem(rect_item)
+        if widget is not None:
+            rect_item.wrap_widget(widget)
+            if self.widget_factory:
+                self._realized_items.add(rect_item)
+        else:
+            rect_item.display_info = display_info
+            self.schedule_visible_items_update()
+        rect_item.set_cache_mode(self.item_cache_mode)
+
+        # placed before it's added to the scene, so it isn't indexed at (0, 0) in its own way
         if pos:
-            rect_item.setPos(rect_item.snap_pos_to_grid(QtCore.QPoint(*pos)))
-        self._scene_items.append(rect_item)
-        self.scene_widgets.append(widget)
+            item_pos = rect_item.snap_pos_to_grid(QtCore.QPointF(*pos), self.scene.grid_size)
+            if find_free_space:
+                item_pos = self.scene.item_index.find_free_pos(
+                    QtCore.QRectF(item_pos, rect_item.rect().size()),
+                    self.scene.grid_size,
+                    ignored_item=rect_item,
+                )
+            rect_item.setPos(item_pos)
+        self.scene.addItem(rect_item)
+        self._items_by_id[internal_id] = rect_item
+        self.scene.notify_layout_changed()
         return rect_item
 
     def get_scene_layout(self):
         user_layout = {}
-        for scene_item in self._scene_items:  # type: PaletteRectItem
+        for scene_item in self._items_by_id.values():  # type: PaletteRectItem
             scene_info = {
                 "pos": scene_item.pos().toTuple(),
                 "size": [scene_item.rect().width(), scene_item.rect().height()],
             }
 
-            item_widget = scene_item.wrapped_widget
-
-            # noinspection PyUnreachableCode
-            if 0:
-                import script_panel.script_panel_ui
-                item_widget = script_panel.script_panel_ui.ScriptWidget()  # example widget
-
-            # if the wrapped widget has a custom id, use that instead
-            palette_id = scene_item.internal_id
-            if item_widget and hasattr(item_widget, "palette_id"):
-                palette_id = item_widget.palette_id
-
-            # if get_display_info has been implemented, bring it along
-            if item_widget and hasattr(item_widget, "get_display_info"):
-                scene_info["display_info"] = item_widget.get_display_info()
+            palette_id, display_info = scene_item.get_palette_info()
+            if display_info is not None:
+                scene_info["display_info"] = display_info
 
             user_layout[palette_id] = scene_info
 
         return user_layout
 
     def set_scene_layout(self, user_layout):
-        for scene_item in self._scene_items:  # type: PaletteRectItem
-            layout_info = user_layout.get(scene_item.internal_id)  # type: dict
-            if not layout_info:
+        for internal_id, layout_info in user_layout.items():
+            scene_item = self._items_by_id.get(internal_id)  # type: PaletteRectItem
+            if not scene_item or not layout_info:
                 continue
 
             user_pos = layout_info.get("pos")
@@ -424,17 +910,71 @@ class CommandPaletteWidget(QtWidgets.QWidget):
             if user_size:
                 scene_item.set_size(user_size)
 
+        self.schedule_visible_items_update()
+
     def clear(self):
-        for item in self._scene_items:
+        # the widgets can be reused by the next layout
+        for rect_item in list(self._realized_items):
+            self._release_item_widget(rect_item)
+
+        for item in self._items_by_id.values():
             self.scene.removeItem(item)
-        self._scene_items = []
-        self.scene_widgets = []
+        self._items_by_id.clear()
 
     def remove_selected_items(self):
         for scene_item in self.get_selected_items():  # type: PaletteRectItem
             self.scene.removeItem(scene_item)
-            self.scene_widgets.remove(scene_item.wrapped_widget)
-            self._scene_items.remove(scene_item)
+            self._items_by_id.pop(scene_item.internal_id, None)
+            self._realized_items.discard(scene_item)
+        self.scene.notify_layout_changed()
+
+    ###########################################################################
+    # virtualization
+    def schedule_visible_items_update(self):
+        if self.widget_factory:
+            self._visible_items_timer.start()
+
+    def update_visible_items(self):
+        """
+        Create widgets for the items coming into view, and recycle the ones that went far enough out of it
+        """
+        if not self.widget_factory:
+            return
+
+        keep_rect = self.graphics_view.get_visible_scene_rect(lk.virtualization_margin * 2)
+        for rect_item in list(self._realized_items):
+            if not keep_rect.intersects(rect_item.sceneBoundingRect()):
+                self._release_item_widget(rect_item)
+
+        realize_rect = self.graphics_view.get_visible_scene_rect(lk.virtualization_margin)
+        for rect_item in self.scene.item_index.get_items_in_rect(realize_rect):
+            if rect_item.wrapped_widget is None:
+                self._realize_item_widget(rect_item)
+
+    def _realize_item_widget(self, rect_item):
+        recycled_widget, recycled_proxy = self._recycled_widgets.pop() if self._recycled_widgets else (None, None)
+        widget = self.widget_factory(rect_item.palette_id, rect_item.display_info, recycled_widget)
+        if widget is not recycled_widget:
+            recycled_proxy = None  # the factory couldn't reuse it
+
+        rect_item.wrap_widget(widget, recycled_proxy)
+        rect_item.set_cache_mode(self.item_cache_mode)
+        self._realized_items.add(rect_item)
+
+    def _release_item_widget(self, rect_item):
+        self._realized_items.discard(rect_item)
+        widget, proxy_widget = rect_item.release_widget()
+        if widget is not None and len(self._recycled_widgets) < lk.max_recycled_widgets:
+            self._recycled_widgets.append((widget, proxy_widget))
+
+    def recreate_widgets(self):
+        """
+        Replace all widgets with new ones from widget_factory, like after the kind of widget changed
+        """
+        for rect_item in list(self._realized_items):
+            self._release_item_widget(rect_item)
+        del self._recycled_widgets[:]
+        self.update_visible_items()
 
     def hide_headers(self):
         self.display_headers(False)
@@ -444,9 +984,10 @@ class CommandPaletteWidget(QtWidgets.QWidget):
 
     def display_headers(self, state):
         self._display_headers = state
-        for scene_item in self._scene_items:  # type: PaletteRectItem
+        for scene_item in self._items_by_id.values():  # type: PaletteRectItem
             scene_item.show_header = state
             scene_item.set_widget_geometry()
+        self.scene.notify_layout_changed()
 
     def open_grid_size_setter(self):
         new_size, ok = QtWidgets.QInputDialog.getInt(
@@ -467,10 +1008,11 @@ class CommandPaletteWidget(QtWidgets.QWidget):
         if new_size is None:
             return
         self.scene.grid_size = new_size
-        for scene_item in self._scene_items:  # type: PaletteRectItem
+        for scene_item in self._items_by_id.values():  # type: PaletteRectItem
             scene_item.resize_button.update_size(new_size)
             scene_item.resize_handle_size = new_size
             scene_item.set_widget_geometry()
+        self.scene.notify_layout_changed()
 
     def open_grid_background_color_setter(self):
         brush = self.scene.backgroundBrush()  # type: QtGui.QBrush
@@ -493,6 +1035,7 @@ class CommandPaletteWidget(QtWidgets.QWidget):
             color = QtGui.QColor.fromRgb(*color)
 
         self.scene.setBackgroundBrush(color)
+        self.scene.notify_layout_changed()
 
     def reset_grid_display(self):
         self.reset_grid_size()
@@ -508,7 +1051,8 @@ class CommandPaletteWidget(QtWidgets.QWidget):
         return self.graphics_view.get_cursor_scene_pos().toTuple()
 
     def get_selected_items(self):
-        return [item for item in self._scene_items if item.is_selected]
+        # the scene keeps track of the selection, only palette items are selectable
+        return [item for item in self.scene.selectedItems() if isinstance(item, PaletteRectItem)]
 
 
 class CommandPanelSettings(BaseSettings):
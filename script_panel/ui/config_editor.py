@@ -76,22 +76,24 @@ class ConfigEditorWindow(ui_utils.ToolWindow):
     def save_user_config(self):
         snippet_key = self.ui.snippet_shortcut_LE.text() if self.ui.snippet_shortcut_LE.text() else None
 
-        user_config_data = collections.OrderedDict()
+        # only the keys edited here are replaced, anything else in the user config is kept as it is
+        user_config_data = collections.OrderedDict(self.user_config_data.get_user_data())
         user_config_data[spu.lk.paths] = self.get_user_config_paths_from_ui()
         user_config_data[spu.lk.snippets] = self.get_snippets_from_ui()
         user_config_data[spu.lk.snippet_shortcut] = snippet_key
         with open(sps.sk.user_config_json_path, "w") as fp:
             json.dump(user_config_data, fp, indent=2)
 
+        # the panel listens for config changes and rebuilds whatever parts changed
+        spu.check_for_config_changes()
+
         try:
             # noinspection PyUnreachableCode
             if 0:
                 import script_panel.script_panel_ui
                 self.parent_window = script_panel.script_panel_ui.ScriptPanelWidget()
 
-            self.parent_window.config_refresh()
             self.parent_window.save_settings()
-            self.parent_window.register_snippet_shortcut()
 
         except Exception as e:
             print(e)
@@ -0,0 +1,136 @@
+"""
+Save palette layouts in the background while they're being edited.
+
+Edits are coalesced until the palette has been left alone for a moment, then the layout is gathered on the UI thread
+and handed to a single worker thread, which serializes it and writes it to disk.
+Scheduling is cheap enough to do for every mouse move of a drag, the timer isn't restarted for each edit.
+"""
+import sys
+import threading
+import time
+import traceback
+
+if sys.version_info.major < 3:
+    import Queue as queue
+else:
+    import queue
+
+from .ui_utils import QtCore
+
+
+class LocalConstants:
+    debounce_ms = 1500
+
+
+lk = LocalConstants
+
+
+class LayoutAutosaver(QtCore.QObject):
+    layout_saved = QtCore.Signal(str)  # layout name, only sent if nothing changed while it was being written
+    save_failed = QtCore.Signal(str, str)  # layout name, traceback
+
+    def __init__(self, save_func, get_layout_func, parent=None, debounce_ms=lk.debounce_ms):
+        """
+        :param save_func: func(layout_name, layout_info) writing the layout, called from the worker thread
+        :param get_layout_func: func() gathering the current layout info, called from the UI thread
+        """
+        super(LayoutAutosaver, self).__init__(parent)
+        self.save_func = save_func
+        self.get_layout_func = get_layout_func
+
+        self.debounce_ms = debounce_ms
+
+        self._pending_layout_name = None
+        self._last_change_time = 0.0
+        self._change_count = 0
+        self._change_lock = threading.Lock()
+
+        # a single worker keeps the writes in order, started again if it's used after a shutdown
+        self._write_queue = queue.Queue()
+        self._write_thread = None
+
+        self.debounce_timer = QtCore.QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(debounce_ms)
+        self.debounce_timer.timeout.connect(self._debounce_elapsed)
+
+    def has_pending_save(self):
+        return self._pending_layout_name is not None
+
+    def schedule(self, layout_name):
+        """
+        Save the layout once there haven't been any edits for the debounce interval
+        """
+        if self._pending_layout_name not in (None, layout_name):
+            self.save_pending()  # edits to another layout shouldn't wait on this one
+
+        with self._change_lock:
+            self._change_count += 1
+        self._pending_layout_name = layout_name
+        self._last_change_time = time.time()
+        if not self.debounce_timer.isActive():
+            self.debounce_timer.start(self.debounce_ms)
+
+    def _debounce_elapsed(self):
+        remaining_ms = int(self.debounce_ms - (time.time() - self._last_change_time) * 1000)
+        if remaining_ms > 0:
+            self.debounce_timer.start(remaining_ms)  # edited again since the timer started
+            return
+        self.save_pending()
+
+    def cancel(self):
+        self.debounce_timer.stop()
+        self._pending_layout_name = None
+
+    def save_pending(self):
+        self.debounce_timer.stop()
+        layout_name = self._pending_layout_name
+        if layout_name is None:
+            return
+        self._pending_layout_name = None
+
+        layout_info = self.get_layout_func()
+        with self._change_lock:
+            change_count = self._change_count
+
+        if self._write_thread is None:
+            self._write_thread = threading.Thread(target=self._write_loop, name="script_panel_layout_autosave")
+            self._write_thread.daemon = True
+            self._write_thread.start()
+        self._write_queue.put((layout_name, layout_info, change_count))
+
+    def flush(self):
+        """
+        Save anything pending and wait for all writes to be done
+        """
+        self.save_pending()
+        self._write_queue.join()
+
+    def _write_loop(self):
+        while True:
+            write_args = self._write_queue.get()
+            try:
+                if write_args is None:
+                    return
+                self._write_layout(*write_args)
+            finally:
+                self._write_queue.task_done()
+
+    def _write_layout(self, layout_name, layout_info, change_count):
+        try:
+            self.save_func(layout_name, layout_info)
+        except Exception:
+            self.save_failed.emit(layout_name, traceback.format_exc())
+            return
+
+        with self._change_lock:
+            is_up_to_date = change_count == self._change_count
+        if is_up_to_date:
+            self.layout_saved.emit(layout_name)
+
+    def shutdown(self):
+        self.flush()
+        if self._write_thread is not None:
+            self._write_queue.put(None)
+            self._write_thread.join()
+            self._write_thread = None
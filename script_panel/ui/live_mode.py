@@ -0,0 +1,124 @@
+"""
+Watch a script while it's being edited, and rerun it every time it's saved
+"""
+import os
+import time
+import traceback
+
+import script_panel.script_panel_analysis as spa
+import script_panel.script_panel_utils as spu
+from .ui_utils import QtCore
+
+
+class LocalConstants:
+    debounce_ms = 300
+
+
+lk = LocalConstants
+
+
+def get_live_run_func(script_path):
+    """
+    Run the script the way a click would, but python scripts reuse their compiled code until they're saved again.
+    Edited files are copied to the network mirror first, the next background sync could be minutes away.
+
+    :return: func(script_path) for run_tracker.run()
+    """
+    run_path = spu.network_mirrors.get_updated_run_path(script_path)
+    trigger_func = spu.get_file_triggered_func(script_path)
+
+    if trigger_func is spu.run_python_script:
+        script_code = spa.compile_script(run_path)  # raises SyntaxError before anything runs
+        return lambda __: spu.run_python_code(script_code, run_path)
+
+    return lambda __: trigger_func(run_path)
+
+
+class LiveScriptRunner(QtCore.QObject):
+    run_finished = QtCore.Signal(str, float)  # script path, run time in seconds
+    run_failed = QtCore.Signal(str, str)  # script path, traceback
+    compile_failed = QtCore.Signal(str, str)  # script path, error message
+
+    # out of process runs finish on a pool thread, this hands them over to the UI thread
+    _out_of_process_run_finished = QtCore.Signal(str, float, object)  # script path, run time in seconds, run
+
+    def __init__(self, parent=None, debounce_ms=lk.debounce_ms):
+        super(LiveScriptRunner, self).__init__(parent)
+        self.script_path = None
+
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._script_changed)
+
+        # editors tend to write a file several times per save, wait for them to settle down
+        self.debounce_timer = QtCore.QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(debounce_ms)
+        self.debounce_timer.timeout.connect(self.rerun)
+
+        self._out_of_process_run_finished.connect(self._emit_out_of_process_result)
+
+    def is_active(self):
+        return self.script_path is not None
+
+    def start(self, script_path):
+        self.stop()
+        self.script_path = script_path
+        self.watcher.addPath(script_path)
+        self.rerun()
+
+    def stop(self):
+        self.debounce_timer.stop()
+        if self.watcher.files():
+            self.watcher.removePaths(self.watcher.files())
+        self.script_path = None
+
+    def _script_changed(self, changed_path):
+        self.debounce_timer.start()
+
+    def rerun(self):
+        script_path = self.script_path
+        if not script_path or not os.path.exists(script_path):
+            return  # mid-save, the next change will trigger it again
+
+        # files saved via a rename drop out of the watcher
+        if script_path not in self.watcher.files():
+            self.watcher.addPath(script_path)
+
+        try:
+            run_func = get_live_run_func(script_path)
+        except SyntaxError as e:
+            self.compile_failed.emit(script_path, "{} (line {})".format(e.msg, e.lineno))
+            return
+        except (IOError, OSError):
+            return  # mid-save, the next change will trigger it again
+
+        start_time = time.time()
+        try:
+            run_output = spu.run_tracker.run(run_func, script_path)
+        except SystemExit as e:
+            if e.code:
+                self.run_failed.emit(script_path, "Exited with status {}\n".format(e.code))
+                return
+        except Exception:
+            self.run_failed.emit(script_path, traceback.format_exc())
+            return
+
+        # worker pool and skyhook runs hand back straight away, report them once they're done
+        if hasattr(run_output, "add_done_callback"):
+            run_output.add_done_callback(
+                lambda finished_run: self._out_of_process_run_finished.emit(
+                    script_path, time.time() - start_time, finished_run
+                )
+            )
+            return
+
+        self.run_finished.emit(script_path, time.time() - start_time)
+
+    def _emit_out_of_process_result(self, script_path, run_time, finished_run):
+        exit_code = getattr(finished_run, "exit_code", None)
+        if finished_run.error:
+            self.run_failed.emit(script_path, str(finished_run.error))
+        elif exit_code:
+            self.run_failed.emit(script_path, "Exited with status {}\n".format(exit_code))
+        else:
+            self.run_finished.emit(script_path, run_time)
@@ -0,0 +1,163 @@
+"""
+Frame time benchmark for panning around a command palette.
+
+Runs on the offscreen Qt platform, so it doesn't need a display:
+
+    python -m script_panel.ui.palette_benchmark --items 200 --frames 300
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from script_panel.ui import command_palette
+from script_panel.ui.ui_utils import QtCore, QtWidgets
+
+
+class LocalConstants:
+    view_size = (1200, 800)
+    scene_size = 20000
+    pan_step = 37  # not a multiple of the grid size, so the grid lines land somewhere new every frame
+
+
+lk = LocalConstants
+
+get_frame_clock = getattr(time, "perf_counter", time.time)
+
+
+class LineGridScene(command_palette.PaletteScene):
+    """
+    The grid as it used to be drawn, one line per grid cell on every paint
+    """
+
+    def drawBackground(self, painter, rect):
+        painter.fillRect(rect, self.backgroundBrush())
+        left = int(math.floor(rect.left()))
+        right = int(math.ceil(rect.right()))
+        top = int(math.floor(rect.top()))
+        bottom = int(math.ceil(rect.bottom()))
+
+        first_left = left - (left % self.grid_size)
+        first_top = top - (top % self.grid_size)
+
+        grid_lines = []
+        for i in range(first_left, right, self.grid_size):
+            grid_lines.append(QtCore.QLine(i, top, i, bottom))
+
+        for i in range(first_top, bottom, self.grid_size):
+            grid_lines.append(QtCore.QLine(left, i, right, i))
+
+        painter.setPen(self.grid_pen)
+        painter.drawLines(grid_lines)
+
+
+def create_tool_button(text):
+    btn = QtWidgets.QToolButton()
+    btn.setText(text)
+    return btn
+
+
+def create_painted_button(text):
+    btn = command_palette.PaletteButtonItem()
+    btn.set_text(text)
+    return btn
+
+
+# (variant name, scene class, render settings, button factory)
+VARIANTS = (
+    ("line_grid", LineGridScene, {}, create_tool_button),
+    ("tiled_grid", None, {}, create_tool_button),
+    ("adaptive", None, {"adaptive_quality": True}, create_tool_button),
+    ("adaptive_cached", None, {"adaptive_quality": True, "cache_items": True}, create_tool_button),
+    ("painted_buttons", None, {"adaptive_quality": True}, create_painted_button),
+)
+
+
+def create_palette(item_count, scene_cls=None, render_settings=None, button_factory=create_tool_button):
+    palette = command_palette.CommandPaletteWidget()
+    if scene_cls:
+        palette.scene = scene_cls()
+        palette.graphics_view.setScene(palette.scene)
+    if render_settings:
+        palette.set_render_settings(**render_settings)
+
+    columns = max(1, int(math.sqrt(item_count)))
+    for i in range(item_count):
+        palette.add_widget(
+            internal_id="COMMAND_{:05d}".format(i),
+            display_name="Script {}".format(i),
+            widget=button_factory("Script {}".format(i)),
+            pos=[(i % columns) * 200, (i // columns) * 100],
+        )
+
+    palette.scene.setSceneRect(0, 0, lk.scene_size, lk.scene_size)
+    palette.resize(*lk.view_size)
+    palette.show()
+    return palette
+
+
+def measure_panning(palette, frame_count):
+    """
+    :return: [seconds per frame]
+    """
+    view = palette.graphics_view
+    app = QtWidgets.QApplication.instance()
+    app.processEvents()
+
+    frame_times = []
+    for i in range(frame_count):
+        view.horizontalScrollBar().setValue((i * lk.pan_step) % lk.scene_size)
+        view.verticalScrollBar().setValue((i * lk.pan_step // 2) % lk.scene_size)
+        start_time = get_frame_clock()
+        view.viewport().repaint()
+        frame_times.append(get_frame_clock() - start_time)
+    return frame_times
+
+
+def get_frame_stats(frame_times):
+    sorted_times = sorted(frame_times)
+    p95_index = min(len(sorted_times) - 1, int(len(sorted_times) * 0.95))
+    return {
+        "mean_ms": sum(sorted_times) / len(sorted_times) * 1000.0,
+        "p95_ms": sorted_times[p95_index] * 1000.0,
+        "max_ms": sorted_times[-1] * 1000.0,
+    }
+
+
+def run_benchmark(item_count=200, frame_count=300, grid_size=None):
+    """
+    :return: {variant name: frame stats}
+    """
+    results = {}
+    for variant_name, scene_cls, render_settings, button_factory in VARIANTS:
+        palette = create_palette(item_count, scene_cls, render_settings, button_factory)
+        if grid_size:
+            palette.set_grid_size(grid_size)
+        results[variant_name] = get_frame_stats(measure_panning(palette, frame_count))
+        palette.close()
+        palette.deleteLater()
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Measure palette frame times while panning")
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--grid-size", type=int, default=None)
+    parsed_args = parser.parse_args(args)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    results = run_benchmark(parsed_args.items, parsed_args.frames, parsed_args.grid_size)
+    for variant_name, __, __, __ in VARIANTS:
+        stats = results[variant_name]
+        print("{:<16} mean {mean_ms:7.3f} ms   p95 {p95_ms:7.3f} ms   max {max_ms:7.3f} ms".format(
+            variant_name, **stats))
+    return app
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import os
+
+import script_panel.script_panel_profiling as spp
+import script_panel.script_panel_utils as spu
+from .ui_utils import QtWidgets, QtCore
+
+
+class LocalConstants:
+    column_names = ["Script", "Runs", "p50 (ms)", "p95 (ms)", "Mean CPU (ms)", "Peak Memory (KB)"]
+
+
+lk = LocalConstants
+
+
+class RunStatsWidget(QtWidgets.QWidget):
+    """
+    Latency and resource usage per script, read from the run history
+    """
+    capture_profiles_toggled = QtCore.Signal(bool)
+    track_memory_toggled = QtCore.Signal(bool)
+
+    def __init__(self, *args, **kwargs):
+        super(RunStatsWidget, self).__init__(*args, **kwargs)
+
+        self.stats_TW = QtWidgets.QTreeWidget()
+        self.stats_TW.setHeaderLabels(lk.column_names)
+        self.stats_TW.setRootIsDecorated(False)
+        self.stats_TW.setSortingEnabled(True)
+        self.stats_TW.setAlternatingRowColors(True)
+
+        self.capture_profiles_CHK = QtWidgets.QCheckBox("Capture cProfile")
+        self.capture_profiles_CHK.setToolTip("Save a .pstats file for each run in:\n{}".format(
+            spu.run_tracker.profiles_folder))
+        self.capture_profiles_CHK.toggled.connect(self.capture_profiles_toggled)
+
+        self.track_memory_CHK = QtWidgets.QCheckBox("Track Memory")
+        self.track_memory_CHK.setToolTip("Measure peak memory with tracemalloc, slows down scripts while they run")
+        self.track_memory_CHK.toggled.connect(self.track_memory_toggled)
+
+        self.refresh_BTN = QtWidgets.QPushButton("Refresh")
+        self.refresh_BTN.clicked.connect(self.refresh)
+
+        buttons_layout = QtWidgets.QHBoxLayout()
+        buttons_layout.addWidget(self.capture_profiles_CHK)
+        buttons_layout.addWidget(self.track_memory_CHK)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.refresh_BTN)
+
+        main_layout = QtWidgets.QVBoxLayout()
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.setSpacing(2)
+        main_layout.addLayout(buttons_layout)
+        main_layout.addWidget(self.stats_TW)
+        self.setLayout(main_layout)
+
+    def refresh(self):
+        self.stats_TW.setSortingEnabled(False)
+        self.stats_TW.clear()
+
+        for script_path, script_stats in spu.run_tracker.history.get_script_stats().items():
+            twi = QtWidgets.QTreeWidgetItem()
+            twi.setText(0, os.path.basename(script_path))
+            twi.setToolTip(0, script_path)
+            twi.setData(1, QtCore.Qt.DisplayRole, script_stats.get(spp.lk.runs))
+            twi.setData(2, QtCore.Qt.DisplayRole, round(script_stats.get(spp.lk.p50) * 1000, 1))
+            twi.setData(3, QtCore.Qt.DisplayRole, round(script_stats.get(spp.lk.p95) * 1000, 1))
+            twi.setData(4, QtCore.Qt.DisplayRole, round(script_stats.get(spp.lk.mean_cpu_time) * 1000, 1))
+            twi.setData(5, QtCore.Qt.DisplayRole, round(script_stats.get(spp.lk.max_peak_memory) / 1024.0, 1))
+            self.stats_TW.addTopLevelItem(twi)
+
+        self.stats_TW.setSortingEnabled(True)
+        self.stats_TW.sortByColumn(3, QtCore.Qt.DescendingOrder)
+        for i in range(len(lk.column_names)):
+            self.stats_TW.resizeColumnToContents(i)
+
+    def set_capture_profiles(self, state):
+        self.capture_profiles_CHK.setChecked(state)
+
+    def set_track_memory(self, state):
+        self.track_memory_CHK.setChecked(state)
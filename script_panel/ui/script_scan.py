@@ -0,0 +1,59 @@
+"""
+Scan the script roots in the background, so a root that isn't responding doesn't hold up the panel.
+
+Every root gets its own worker thread and is handed to the UI thread as soon as it's done,
+a dead network mount only delays its own scripts, for up to the root's scan_timeout.
+"""
+import itertools
+import threading
+import traceback
+
+import script_panel.script_panel_utils as spu
+from .ui_utils import QtCore
+
+
+class ScriptScanner(QtCore.QObject):
+    root_scanned = QtCore.Signal(int, object)  # scan id, {script path: path info}
+    scan_finished = QtCore.Signal(int)  # scan id, sent once every root of the scan is done
+
+    def __init__(self, parent=None):
+        super(ScriptScanner, self).__init__(parent)
+        self._scan_ids = itertools.count(1)
+
+    def start(self, path_data_list):
+        """
+        Scan the roots on worker threads, results come in through the signals
+
+        :return: id of this scan, scans that have been started since don't cancel it
+        """
+        scan_id = next(self._scan_ids)
+        path_data_list = [path_data for path_data in path_data_list if path_data.get(spu.lk.path_root_dir)]
+        if not path_data_list:
+            self.scan_finished.emit(scan_id)
+            return scan_id
+
+        remaining = [len(path_data_list)]
+        remaining_lock = threading.Lock()
+
+        for path_data in path_data_list:
+            thread = threading.Thread(
+                target=self._scan_root,
+                args=(scan_id, path_data, remaining, remaining_lock),
+                name="script_panel_script_scan",
+            )
+            thread.daemon = True
+            thread.start()
+
+        return scan_id
+
+    def _scan_root(self, scan_id, path_data, remaining, remaining_lock):
+        try:
+            self.root_scanned.emit(scan_id, spu.get_root_scripts(path_data))
+        except Exception:
+            traceback.print_exc()
+
+        with remaining_lock:
+            remaining[0] -= 1
+            is_last_root = remaining[0] == 0
+        if is_last_root:
+            self.scan_finished.emit(scan_id)
@@ -1,7 +1,11 @@
 # Standard
+import collections
 import functools
 import os
 import sys
+import threading
+import time
+import traceback
 from functools import partial
 
 # Not even going to pretend to have Maya 2016 support
@@ -9,14 +13,27 @@ from PySide2 import QtCore
 from PySide2 import QtGui
 from PySide2 import QtUiTools
 from PySide2 import QtWidgets
+from shiboken2 import isValid
 from shiboken2 import wrapInstance
 
 if sys.version_info.major >= 3:
     long = int
+    import queue
+else:
+    import Queue as queue
 
 UI_FILES_FOLDER = os.path.dirname(__file__)
 ICON_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "icons")
 
+FONT_FIT_CACHE_SIZE = 4096
+CONTENT_UPDATE_DELAY_MS = 30  # button content is resized once resizing has paused for this long
+
+ICON_READ_THREADS = 2
+ICON_CACHE_SIZE = 256
+ICON_CACHE_SIZES = (16, 24, 32, 48, 64, 128)  # icons are decoded once and pre-scaled down to these button sizes
+SCALABLE_ICON_EXTENSIONS = (".svg", ".svgz")  # rendered by QIcon at whatever size is asked for, never pre-scaled
+ICON_RECHECK_SECONDS = 10  # cached icons are checked for changes on disk at most this often
+
 active_dcc_is_maya = "maya" in os.path.basename(sys.executable).lower()
 active_dcc_is_houdini = "houdini" in os.path.basename(sys.executable).lower()
 
@@ -92,21 +109,199 @@ def load_ui_file(ui_file_name):
     return window
 
 
-def create_qicon(icon_path):
+def resolve_icon_path(icon_path):
     icon_path = icon_path.replace("\\", "/")
+    if not icon_path.startswith(":") and "/" not in icon_path:
+        icon_path = os.path.join(ICON_FOLDER, icon_path + ".png")  # find in icons folder if not full path
+    return icon_path
+
+
+def create_qicon(icon_path):
+    """
+    :return: QIcon from the shared icon cache, None if the file doesn't exist
+    """
+    return icon_cache.get_icon(resolve_icon_path(icon_path))
+
+
+def get_icon_mtime(icon_path):
+    """
+    :return: modification time of the icon file, 0 for Qt resources, None if it doesn't exist
+    """
     if icon_path.startswith(":"):
-        if icon_path.endswith(".svg"):
-            return QtGui.QIcon(QtGui.QPixmap(icon_path))
+        return 0 if QtCore.QFile.exists(icon_path) else None
+    try:
+        return os.stat(icon_path).st_mtime
+    except OSError:
+        return None
+
+
+def is_scalable_icon(icon_path):
+    return icon_path.lower().endswith(SCALABLE_ICON_EXTENSIONS)
+
+
+def read_icon_images(icon_path, sizes=ICON_CACHE_SIZES):
+    """
+    Decode the image once, and scale it down to each of the sizes smaller than it. Safe to call off the UI thread.
+
+    :return: [QImage] from the source resolution to the smallest, empty if it couldn't be read
+    """
+    image = QtGui.QImageReader(icon_path).read()
+    if image.isNull():
+        return []
+
+    images = [image]
+    for size in sorted(sizes, reverse=True):
+        if size < max(image.width(), image.height()):
+            images.append(image.scaled(size, size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation))
+    return images
+
+
+def create_qicon_from_images(images):
+    """
+    Needs to run on the UI thread, QPixmaps can't be made anywhere else
+    """
+    if not images:
+        return None
+    q_icon = QtGui.QIcon()
+    for image in images:
+        q_icon.addPixmap(QtGui.QPixmap.fromImage(image))
+    return q_icon
+
+
+def get_biggest_icon_size(q_icon):
+    """
+    :return: the largest of the available sizes, the order they're listed in depends on how the icon was built
+    :rtype: QtCore.QSize
+    """
+    sizes = q_icon.availableSizes()
+    if not sizes:
+        return None
+    return max(sizes, key=lambda size: size.width() * size.height())
+
+
+class IconCache(QtCore.QObject):
+    """
+    Decoded icons shared by the whole process, by path and modification time.
+    The least recently used icons are dropped once there are more than max_size.
+    """
+    _icon_read = QtCore.Signal(str, object, object)  # icon path, mtime, [QImage] or None if unchanged
+
+    def __init__(self, max_size=ICON_CACHE_SIZE, sizes=ICON_CACHE_SIZES):
+        super(IconCache, self).__init__()
+        self.max_size = max_size
+        self.sizes = sizes
+
+        self._icons = collections.OrderedDict()  # {icon path: (mtime, time checked, QIcon)}
+        self._pending_callbacks = {}  # {icon path: [callbacks]}, for icons being read in the background
+        self._read_queue = queue.Queue()
+        self._read_threads = []
+
+        # sent from the worker threads, handled on the UI thread
+        self._icon_read.connect(self._store_read_icon)
+
+    def _get_cached(self, icon_path):
+        cached = self._icons.pop(icon_path, None)
+        if cached:
+            self._icons[icon_path] = cached  # move to the most recently used end
+        return cached
+
+    def _set_cached(self, icon_path, mtime, q_icon):
+        self._icons.pop(icon_path, None)
+        if q_icon is None:
+            return
+        self._icons[icon_path] = (mtime, time.time(), q_icon)
+        while len(self._icons) > self.max_size:
+            self._icons.popitem(last=False)
+
+    def get_icon(self, icon_path):
+        """
+        Read the icon right away if it isn't cached, or changed on disk since
+
+        :rtype: QtGui.QIcon
+        """
+        mtime = get_icon_mtime(icon_path)
+        if mtime is None:
+            self._set_cached(icon_path, None, None)
+            return None
+
+        cached = self._get_cached(icon_path)
+        if cached and cached[0] == mtime:
+            return cached[2]
+
+        if is_scalable_icon(icon_path):
+            q_icon = QtGui.QIcon(icon_path)
         else:
-            return QtGui.QIcon(icon_path)
+            q_icon = create_qicon_from_images(read_icon_images(icon_path, self.sizes))
+        self._set_cached(icon_path, mtime, q_icon)
+        return q_icon
+
+    def request_icon(self, icon_path, callback):
+        """
+        Read the icon on a worker thread, callback(icon_path, QIcon or None) is called on the UI thread once it's done.
+        Cached icons are handed over straight away and checked for changes in the background.
+        """
+        cached = self._get_cached(icon_path)
+        if cached:
+            callback(icon_path, cached[2])
+            if time.time() - cached[1] < ICON_RECHECK_SECONDS:
+                return
+            callback = None  # refresh the cache only, the caller already has its icon
+
+        elif is_scalable_icon(icon_path):
+            callback(icon_path, self.get_icon(icon_path))  # nothing to decode up front
+            return
+
+        is_pending = icon_path in self._pending_callbacks
+        callbacks = self._pending_callbacks.setdefault(icon_path, [])
+        if callback:
+            callbacks.append(callback)
+        if is_pending:
+            return
+
+        if not self._read_threads:
+            for i in range(ICON_READ_THREADS):
+                read_thread = threading.Thread(target=self._read_loop, name="script_panel_icon_read_{}".format(i))
+                read_thread.daemon = True
+                read_thread.start()
+                self._read_threads.append(read_thread)
+        self._read_queue.put((icon_path, cached[0] if cached else None))
+
+    def _read_loop(self):
+        while True:
+            icon_path, cached_mtime = self._read_queue.get()
+            try:
+                self._read_icon(icon_path, cached_mtime)
+            except Exception:
+                traceback.print_exc()
+                self._icon_read.emit(icon_path, None, [])  # handled like a missing file, so callbacks still run
+
+    def _read_icon(self, icon_path, cached_mtime):
+        mtime = get_icon_mtime(icon_path)
+        if mtime is not None and mtime == cached_mtime:
+            self._icon_read.emit(icon_path, mtime, None)
+            return
+
+        images = read_icon_images(icon_path, self.sizes) if mtime is not None else []
+        self._icon_read.emit(icon_path, mtime, images)
+
+    def _store_read_icon(self, icon_path, mtime, images):
+        if images is None:
+            # unchanged on disk
+            cached = self._icons.get(icon_path)
+            q_icon = cached[2] if cached else None
+            self._set_cached(icon_path, mtime, q_icon)
+        else:
+            q_icon = create_qicon_from_images(images)
+            self._set_cached(icon_path, mtime, q_icon)
 
-    if "/" not in icon_path:
-        icon_path = os.path.join(ICON_FOLDER, icon_path + ".png")  # find in icons folder if not full path
+        for callback in self._pending_callbacks.pop(icon_path, []):
+            callback(icon_path, q_icon)
+
+    def clear(self):
+        self._icons.clear()
 
-    if not os.path.exists(icon_path):
-        return
 
-    return QtGui.QIcon(icon_path)
+icon_cache = IconCache()
 
 
 class CoreToolWindow(QtWidgets.QMainWindow):
@@ -321,14 +516,13 @@ class ScaledContentPushButton(QtWidgets.QPushButton):
         self.icon_padding_multiplier = 0.5
 
     def setIcon(self, q_icon):
-        biggest_sizes = q_icon.availableSizes()
-        if biggest_sizes:
-            biggest_size = biggest_sizes[-1]  # type: QtCore.QSize
+        biggest_size = get_biggest_icon_size(q_icon)
+        if biggest_size:
             self.max_icon_size = min(biggest_size.width(), biggest_size.height())
         super(ScaledContentPushButton, self).setIcon(q_icon)
 
     def resizeEvent(self, event):
-        self.update_content_size()
+        content_size_updater.schedule(self)
         super(ScaledContentPushButton, self).resizeEvent(event)
 
     ###############################################################################
@@ -349,24 +543,91 @@ class ScaledContentPushButton(QtWidgets.QPushButton):
         self.setIconSize(icon_size)
 
     def update_button_text_size(self):
-        # reset font size so .fontMetrics() make sense
-        font = QtGui.QFont('Serif', 8, QtGui.QFont.Normal)
-        self.setFont(font)
-
         # resize text to scale with widget
         size = self.size()
         icon_width = 0
         if self.icon():
             icon_width = min(self.iconSize().width(), self.max_icon_size)
 
-        h_factor = float(size.height()) / self.fontMetrics().height()
-        w_factor = float(size.width()) / max((self.fontMetrics().width(self.text()) + icon_width), 0.0001)
+        self.setFont(get_fitted_font(self.text(), size.width(), size.height(), icon_width,
+                                     self.text_padding_multiplier))
+
+
+class ContentSizeUpdater(object):
+    """
+    Collects resized buttons and updates their content in one go, once the resizing has paused
+    """
+
+    def __init__(self, delay_ms=CONTENT_UPDATE_DELAY_MS):
+        self.delay_ms = delay_ms
+        self._pending_buttons = {}  # {id: button}
+        self._timer = None
+
+    def schedule(self, button):
+        self._pending_buttons[id(button)] = button
+        if self._timer is None:
+            # created on first use, there's no QApplication yet when this module is imported
+            self._timer = QtCore.QTimer()
+            self._timer.setSingleShot(True)
+            self._timer.timeout.connect(self.flush)
+        self._timer.start(self.delay_ms)
+
+    def flush(self):
+        pending_buttons = self._pending_buttons
+        self._pending_buttons = {}
+        for button in pending_buttons.values():
+            if isValid(button):
+                button.update_content_size()
+
+
+content_size_updater = ContentSizeUpdater()
+
+
+class FontFitCache(object):
+    """
+    Fitted fonts by (text, size, icon width), so buttons of the same size and text only measure it once
+    """
+
+    def __init__(self, max_size=FONT_FIT_CACHE_SIZE):
+        self.max_size = max_size
+        self._fonts = collections.OrderedDict()
+
+    def get(self, text, width, height, icon_width, text_padding_multiplier):
+        fit_key = (text, int(width), int(height), int(icon_width), text_padding_multiplier)
+        font = self._fonts.pop(fit_key, None)
+        if font is None:
+            font = _create_fitted_font(*fit_key)
+
+        self._fonts[fit_key] = font  # move to the most recently used end
+        while len(self._fonts) > self.max_size:
+            self._fonts.popitem(last=False)
+        return font
+
+    def clear(self):
+        self._fonts.clear()
+
+
+font_fit_cache = FontFitCache()
+
+
+def get_fitted_font(text, width, height, icon_width=0, text_padding_multiplier=0.8):
+    """
+    Font scaled so the text fills the given size, next to an icon of icon_width
+    """
+    return font_fit_cache.get(text, width, height, icon_width, text_padding_multiplier)
+
+
+def _create_fitted_font(text, width, height, icon_width, text_padding_multiplier):
+    font = QtGui.QFont('Serif', 8, QtGui.QFont.Normal)
+    font_metrics = QtGui.QFontMetrics(font)
 
-        # the smaller value determines max text size
-        factor = min(h_factor, w_factor) * self.text_padding_multiplier
+    h_factor = float(height) / font_metrics.height()
+    w_factor = float(width) / max((font_metrics.width(text) + icon_width), 0.0001)
 
-        # clamp output to a min size
-        final_point_size = max(font.pointSizeF() * factor, 8.0)
-        font.setPointSizeF(final_point_size)
+    # the smaller value determines max text size
+    factor = min(h_factor, w_factor) * text_padding_multiplier
 
-        self.setFont(font)
+    # clamp output to a min size
+    final_point_size = max(font.pointSizeF() * factor, 8.0)
+    font.setPointSizeF(final_point_size)
+    return font